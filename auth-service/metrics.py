@@ -0,0 +1,80 @@
+# metrics.py
+# Login-path Prometheus metrics for auth-service (request metrics come from prometheus_flask_exporter).
+# Labels are kept to small fixed sets (no usernames or user ids).
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+_ENABLED = True
+
+# Password hashes are deliberately slow, so these go well past the usual request buckets
+HASH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1, 2, 5)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# success | bad_password | unknown_user | invalid_request | throttled
+# (there is no login throttling yet; the label is pre-created so dashboards don't change when it lands)
+LOGIN_OUTCOMES = ("success", "bad_password", "unknown_user", "invalid_request", "throttled")
+
+LOGIN_ATTEMPTS = Counter("auth_login_attempts", "Login attempts by outcome", ["outcome"])
+LOGIN_SECONDS = Histogram("auth_login_seconds", "Total time handling a login", ["outcome"], buckets=HASH_BUCKETS)
+PASSWORD_VERIFY_SECONDS = Histogram("auth_password_verify_seconds", "Password hash verification time", buckets=HASH_BUCKETS)
+TOKEN_SIGN_SECONDS = Histogram("auth_token_sign_seconds", "JWT signing time", ["algorithm"], buckets=FAST_BUCKETS)
+DB_LOOKUP_SECONDS = Histogram("auth_db_lookup_seconds", "User lookup time during login", buckets=FAST_BUCKETS)
+# Outbox deliveries to other services (see outbox.py):
+# delivered | continued (more work, e.g. a large purge) | failed (retried with backoff)
+OUTBOX_DELIVERIES = Counter("auth_outbox_deliveries", "Outbox delivery attempts by outcome", ["outcome"])
+
+for _outcome in LOGIN_OUTCOMES:
+    LOGIN_ATTEMPTS.labels(outcome=_outcome)
+for _outcome in ("delivered", "continued", "failed"):
+    OUTBOX_DELIVERIES.labels(outcome=_outcome)
+
+
+def set_enabled(enabled: bool) -> None:
+    global _ENABLED
+    _ENABLED = enabled
+
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+
+def inc(metric, amount=1, **labels) -> None:
+    if not _ENABLED:
+        return
+    (metric.labels(**labels) if labels else metric).inc(amount)
+
+
+def observe(metric, value, **labels) -> None:
+    if not _ENABLED:
+        return
+    (metric.labels(**labels) if labels else metric).observe(value)
+
+
+@contextmanager
+def timed(metric, **labels):
+    if not _ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        (metric.labels(**labels) if labels else metric).observe(time.perf_counter() - start)
+
+
+# ===== Multiprocess mode (several gunicorn workers) =====
+
+def multiprocess_dir():
+    """PROMETHEUS_MULTIPROC_DIR if set: metrics are written to shared mmap files there."""
+    return os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+def multiprocess_registry() -> CollectorRegistry:
+    """Registry that aggregates every worker's metric files (served by the gunicorn master)."""
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=multiprocess_dir())
+    return registry
@@ -21,3 +21,20 @@ class User(db.Model):
         nullable=False
     )
 
+
+
+class OutboxMessage(db.Model):
+    """
+    Work for other services, written in the same transaction as the change
+    that caused it and delivered by the outbox worker (see outbox.py).
+    Rows are deleted once delivered.
+    """
+    __tablename__ = "outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
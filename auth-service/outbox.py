@@ -0,0 +1,189 @@
+# outbox.py
+# Transactional outbox: a change that other services must react to (a user
+# was deleted, so file-service has to purge their files) writes an `outbox`
+# row in the same transaction. The request stays fast, and because the row
+# is durable the work is retried until delivered, across restarts.
+#
+# A daemon thread in each worker delivers due rows every OUTBOX_POLL_SECONDS.
+# A row is claimed by pushing its next_attempt_at past the HTTP call (a lease)
+# in a short transaction; the call itself runs outside any transaction, so no
+# row lock is held while file-service works. Failures back off exponentially
+# (capped at OUTBOX_MAX_BACKOFF_SECONDS).
+# Handlers must be idempotent: a row is delivered again if a worker dies
+# between the call and recording its outcome (once the lease runs out).
+import json
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta, UTC
+import click
+import jwt
+from flask.cli import AppGroup
+from sqlalchemy import select, update
+from db import db
+from models import OutboxMessage
+from metrics import inc, OUTBOX_DELIVERIES
+from workers import PeriodicWorker, run_in_each_worker
+
+USER_DELETED = "user.deleted"
+
+
+def enqueue(topic: str, payload: dict) -> OutboxMessage:
+    """Adds a message to the current session; it is sent once the caller commits."""
+    message = OutboxMessage(topic=topic, payload=json.dumps(payload), attempts=0, next_attempt_at=datetime.utcnow())
+    db.session.add(message)
+    return message
+
+
+class Delivery:
+    """Sends outbox messages to file-service with a short-lived service token."""
+
+    def __init__(self, file_service_url: str, private_key, algorithm: str, timeout_s: float = 30):
+        self.file_service_url = file_service_url.rstrip("/")
+        self.private_key = private_key
+        self.algorithm = algorithm
+        self.timeout_s = timeout_s
+
+    def service_token(self) -> str:
+        payload = {
+            "sub": "auth-service",
+            "role": "service",
+            "exp": datetime.now(UTC) + timedelta(minutes=5),
+        }
+        return jwt.encode(payload, self.private_key, algorithm=self.algorithm)
+
+    def post(self, path: str) -> dict:
+        request = urllib.request.Request(
+            self.file_service_url + path,
+            data=b"{}",
+            method="POST",
+            headers={"Authorization": f"Bearer {self.service_token()}", "Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout_s) as response:
+            return json.loads(response.read() or b"{}")
+
+    def send(self, topic: str, payload: dict) -> bool:
+        """True when the work is finished, False to be called again right away."""
+        if topic == USER_DELETED:
+            # file-service purges in time-boxed chunks
+            return bool(self.post(f"/internal/owners/{int(payload['user_id'])}/purge").get("done"))
+        raise ValueError(f"unknown outbox topic: {topic}")
+
+
+def backoff_seconds(attempts: int, max_backoff_s: float) -> float:
+    return min(2 ** attempts, max_backoff_s)
+
+
+def _claim(message_id: int, lease_s: float):
+    """
+    Leases a due message to this worker and commits. Returns (topic, payload),
+    or None when another worker claimed it first.
+    """
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id == message_id, OutboxMessage.next_attempt_at <= now)
+        .values(next_attempt_at=now + timedelta(seconds=lease_s))
+    ).rowcount == 1
+    row = db.session.execute(
+        select(OutboxMessage.topic, OutboxMessage.payload).where(OutboxMessage.id == message_id)
+    ).first() if claimed else None
+    db.session.commit()
+    return (row.topic, json.loads(row.payload)) if row else None
+
+
+def deliver_due(delivery: Delivery, limit: int = 20, max_backoff_s: float = 3600, lease_s: float = None) -> dict:
+    """
+    Delivers up to `limit` due messages (needs an app context). Each message is
+    claimed for lease_s (default twice the HTTP timeout) before its call, and
+    its outcome is recorded in a transaction of its own.
+    """
+    lease_s = delivery.timeout_s * 2 if lease_s is None else lease_s
+    due = db.session.execute(
+        select(OutboxMessage.id)
+        .where(OutboxMessage.next_attempt_at <= datetime.utcnow())
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+    ).scalars().all()
+    db.session.commit()
+
+    stats = {"delivered": 0, "continued": 0, "failed": 0}
+    for message_id in due:
+        claimed = _claim(message_id, lease_s)
+        if claimed is None:
+            continue
+        error = None
+        try:
+            done = delivery.send(*claimed)
+        except (OSError, ValueError, KeyError, urllib.error.URLError) as e:
+            error = str(e)[:1000]
+
+        message = db.session.get(OutboxMessage, message_id)
+        if message is None:
+            # delivered by another worker after our lease ran out
+            db.session.rollback()
+            continue
+        if error is not None:
+            message.attempts += 1
+            message.last_error = error
+            message.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(message.attempts, max_backoff_s))
+            outcome = "failed"
+        elif done:
+            db.session.delete(message)
+            outcome = "delivered"
+        else:
+            # due again right away: the next poll continues the work
+            message.last_error = None
+            message.next_attempt_at = datetime.utcnow()
+            outcome = "continued"
+        db.session.commit()
+        stats[outcome] += 1
+        inc(OUTBOX_DELIVERIES, outcome=outcome)
+    return stats
+
+
+def register_cli(app, delivery) -> None:
+    """`flask outbox status|deliver`"""
+    group = AppGroup("outbox", help="Messages for other services.")
+
+    @group.command("status")
+    def status_cmd():
+        rows = OutboxMessage.query.order_by(OutboxMessage.id).all()
+        click.echo(json.dumps([
+            {
+                "id": m.id, "topic": m.topic, "payload": json.loads(m.payload), "attempts": m.attempts,
+                "next_attempt_at": m.next_attempt_at.isoformat(), "last_error": m.last_error,
+            }
+            for m in rows
+        ], indent=2))
+
+    @group.command("deliver")
+    def deliver_cmd():
+        """Deliver due messages now."""
+        if delivery is None:
+            raise click.ClickException("FILE_SERVICE_URL is not set")
+        click.echo(json.dumps(deliver_due(delivery, max_backoff_s=app.config["OUTBOX_MAX_BACKOFF_SECONDS"])))
+
+    app.cli.add_command(group)
+
+
+def init_outbox(app, private_key, algorithm: str) -> None:
+    """
+    Registers the CLI and, when FILE_SERVICE_URL is set, the delivery thread in
+    each worker. Without it messages are kept until it is configured.
+    """
+    delivery = None
+    if app.config["FILE_SERVICE_URL"]:
+        delivery = Delivery(app.config["FILE_SERVICE_URL"], private_key, algorithm, app.config["OUTBOX_HTTP_TIMEOUT_SECONDS"])
+        app.extensions["outbox_delivery"] = delivery
+    register_cli(app, delivery)
+    if delivery is None or app.config["OUTBOX_POLL_SECONDS"] <= 0:
+        return
+
+    max_backoff_s = app.config["OUTBOX_MAX_BACKOFF_SECONDS"]
+
+    def deliver_all():
+        # keep going while there is work, e.g. a large purge in several chunks
+        while sum(deliver_due(delivery, max_backoff_s=max_backoff_s).values()):
+            pass
+
+    run_in_each_worker(app, PeriodicWorker("outbox", app.config["OUTBOX_POLL_SECONDS"], deliver_all, app=app))
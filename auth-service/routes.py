@@ -1,6 +1,7 @@
 # ===== Imports =====
 from functools import wraps
 import os
+import time
 import jwt
 from datetime import datetime, timedelta, UTC
 from flask import Blueprint, request, jsonify
@@ -8,7 +9,14 @@ from werkzeug.security import check_password_hash
 from werkzeug.security import generate_password_hash
 from db import db
 from models import User
+from outbox import enqueue, USER_DELETED
 from pathlib import Path
+from utils.jwt_utils import get_configured_algorithm, load_signing_keys
+from metrics import (
+    inc, observe, timed,
+    LOGIN_ATTEMPTS, LOGIN_SECONDS, PASSWORD_VERIFY_SECONDS, TOKEN_SIGN_SECONDS, DB_LOOKUP_SECONDS,
+)
+from tracing import start_span
 
 # Blueprint
 auth_routes = Blueprint("auth_routes", __name__)
@@ -25,37 +33,45 @@ IS_TEST = (
 if IS_TEST:
     # CI / pytest
     JWT_ALGORITHM = "HS256"
-    PRIVATE_KEY = os.getenv("JWT_SECRET", "unit-test-secret")
-    PUBLIC_KEY = PRIVATE_KEY
 else:
-    # Local dev / production
-    JWT_ALGORITHM = "ES256"
+    # Local dev / production (JWT_ALGORITHM: ES256 | RS256 | EdDSA | HS256)
+    JWT_ALGORITHM = get_configured_algorithm()
+
+PRIVATE_KEY, PUBLIC_KEY = load_signing_keys(JWT_ALGORITHM, BASE_DIR, "unit-test-secret")
 
-    with open(BASE_DIR / "ec_private.pem", "r") as f:
-        PRIVATE_KEY = f.read()
 
-    with open(BASE_DIR / "ec_public.pem", "r") as f:
-        PUBLIC_KEY = f.read()
+def _login_response(start, outcome, body, status):
+    inc(LOGIN_ATTEMPTS, outcome=outcome)
+    observe(LOGIN_SECONDS, time.perf_counter() - start, outcome=outcome)
+    return jsonify(body), status
 
 
 # LOGIN API (Authentication)
 @auth_routes.route("/login", methods=["POST"])
 def login():
+    start = time.perf_counter()
     data = request.get_json()
 
     if not data:
-        return jsonify({"message": "Invalid JSON body"}), 400
+        return _login_response(start, "invalid_request", {"message": "Invalid JSON body"}, 400)
 
     username = data.get("username")
     password = data.get("password")
 
     if not username or not password:
-        return jsonify({"message": "Missing credentials"}), 400
+        return _login_response(start, "invalid_request", {"message": "Missing credentials"}, 400)
+
+    with timed(DB_LOOKUP_SECONDS):
+        user = User.query.filter_by(username=username).first()
 
-    user = User.query.filter_by(username=username).first()
+    if not user:
+        return _login_response(start, "unknown_user", {"message": "Invalid credentials"}, 401)
+
+    with start_span("password.verify"), timed(PASSWORD_VERIFY_SECONDS):
+        password_ok = check_password_hash(user.password_hash, password)
 
-    if not user or not check_password_hash(user.password_hash, password):
-        return jsonify({"message": "Invalid credentials"}), 401
+    if not password_ok:
+        return _login_response(start, "bad_password", {"message": "Invalid credentials"}, 401)
 
     payload = {
         "sub": str(user.id),   
@@ -63,13 +79,14 @@ def login():
         "exp": datetime.now(UTC) + timedelta(hours=JWT_EXPIRY_HOURS)
     }
 
-    token = jwt.encode(payload, PRIVATE_KEY, algorithm=JWT_ALGORITHM)
+    with start_span("jwt.sign", algorithm=JWT_ALGORITHM), timed(TOKEN_SIGN_SECONDS, algorithm=JWT_ALGORITHM):
+        token = jwt.encode(payload, PRIVATE_KEY, algorithm=JWT_ALGORITHM)
 
-    return jsonify({
+    return _login_response(start, "success", {
         "access_token": token,
         "token_type": "Bearer",
         "role": user.role
-    }), 200
+    }, 200)
 
 # AUTH MIDDLEWARE
 def token_required(f):
@@ -83,7 +100,8 @@ def token_required(f):
         token = auth_header.split(" ")[1]
 
         try:
-            decoded = jwt.decode(token, PUBLIC_KEY, algorithms=[JWT_ALGORITHM])
+            with start_span("jwt.decode", algorithm=JWT_ALGORITHM):
+                decoded = jwt.decode(token, PUBLIC_KEY, algorithms=[JWT_ALGORITHM])
             request.user = decoded
         except jwt.ExpiredSignatureError:
             return jsonify({"message": "Token expired"}), 401
@@ -182,6 +200,8 @@ def delete_user(user_id):
     if str(user.id) == request.user["sub"]:
         return jsonify({"message": "Cannot delete your own account"}), 403
 
+    # file-service purges the user's files asynchronously (outbox.py); same transaction as the delete
+    enqueue(USER_DELETED, {"user_id": user.id})
     db.session.delete(user)
     db.session.commit()
 
@@ -0,0 +1,60 @@
+import pytest
+from prometheus_client import REGISTRY
+import metrics
+
+def _sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+def test_metrics_endpoint_exists(client):
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    body = res.data.decode()
+    assert "flask_http_request_duration_seconds" in body
+    assert "auth_login_attempts_total" in body
+
+@pytest.mark.parametrize("username,password,outcome", [
+    ("admin", "admin123", "success"),
+    ("admin", "wrong", "bad_password"),
+    ("nobody", "admin123", "unknown_user"),
+    ("admin", "", "invalid_request"),
+])
+def test_login_outcomes_are_counted(client, test_user, username, password, outcome):
+    before = _sample("auth_login_attempts_total", {"outcome": outcome})
+    client.post("/api/login", json={"username": username, "password": password})
+    assert _sample("auth_login_attempts_total", {"outcome": outcome}) - before == 1
+
+def test_login_phases_are_timed(client, test_user):
+    before = {
+        "lookup": _sample("auth_db_lookup_seconds_count"),
+        "verify": _sample("auth_password_verify_seconds_count"),
+        "sign": _sample("auth_token_sign_seconds_count", {"algorithm": "HS256"}),
+        "login": _sample("auth_login_seconds_count", {"outcome": "success"}),
+    }
+
+    res = client.post("/api/login", json={"username": "user1", "password": "user123"})
+    assert res.status_code == 200
+
+    assert _sample("auth_db_lookup_seconds_count") - before["lookup"] == 1
+    assert _sample("auth_password_verify_seconds_count") - before["verify"] == 1
+    assert _sample("auth_token_sign_seconds_count", {"algorithm": "HS256"}) - before["sign"] == 1
+    assert _sample("auth_login_seconds_count", {"outcome": "success"}) - before["login"] == 1
+
+def test_unknown_user_skips_password_verify(client, test_user):
+    before = _sample("auth_password_verify_seconds_count")
+    client.post("/api/login", json={"username": "ghost", "password": "x"})
+    assert _sample("auth_password_verify_seconds_count") == before
+
+def test_metrics_body_has_no_usernames(client, test_user):
+    client.post("/api/login", json={"username": "user1", "password": "user123"})
+    body = client.get("/metrics").data.decode()
+    assert "user1" not in body
+
+def test_disabled_metrics_are_not_recorded():
+    metrics.set_enabled(False)
+    try:
+        before = _sample("auth_token_sign_seconds_count", {"algorithm": "HS256"})
+        with metrics.timed(metrics.TOKEN_SIGN_SECONDS, algorithm="HS256"):
+            pass
+        assert _sample("auth_token_sign_seconds_count", {"algorithm": "HS256"}) == before
+    finally:
+        metrics.set_enabled(True)
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime, timedelta
+import jwt
+from db import db
+from models import OutboxMessage
+from outbox import Delivery, USER_DELETED, deliver_due, enqueue
+
+
+class FakeFileService(Delivery):
+    """Delivery whose HTTP calls return scripted responses (or raise)."""
+
+    def __init__(self, responses):
+        super().__init__("http://file-service", "unit-test-secret", "HS256")
+        self.responses = list(responses)
+        self.calls = []
+
+    def post(self, path):
+        self.calls.append(path)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _admin_headers(client):
+    token = client.post("/api/login", json={"username": "admin", "password": "admin123"}).get_json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_deleting_a_user_queues_a_purge(client, test_user):
+    headers = _admin_headers(client)
+    users = client.get("/api/admin/users", headers=headers).get_json()
+    user_id = next(u["id"] for u in users if u["username"] == "user1")
+
+    assert client.delete(f"/api/admin/users/{user_id}", headers=headers).status_code == 200
+
+    (message,) = OutboxMessage.query.all()
+    assert message.topic == USER_DELETED
+    assert json.loads(message.payload) == {"user_id": user_id}
+
+
+def test_delivered_messages_are_removed(client):
+    enqueue(USER_DELETED, {"user_id": 7})
+    db.session.commit()
+    delivery = FakeFileService([{"done": False}, {"done": True}])
+
+    # a large purge takes several calls; the message stays due until file-service is done
+    assert deliver_due(delivery) == {"delivered": 0, "continued": 1, "failed": 0}
+    assert deliver_due(delivery) == {"delivered": 1, "continued": 0, "failed": 0}
+    assert delivery.calls == ["/internal/owners/7/purge"] * 2
+    assert OutboxMessage.query.count() == 0
+
+
+def test_failures_back_off_and_are_retried(client):
+    enqueue(USER_DELETED, {"user_id": 7})
+    db.session.commit()
+    delivery = FakeFileService([ConnectionRefusedError("file-service down"), {"done": True}])
+
+    assert deliver_due(delivery)["failed"] == 1
+    message = OutboxMessage.query.one()
+    assert message.attempts == 1 and "file-service down" in message.last_error
+    assert message.next_attempt_at > datetime.utcnow()
+
+    assert deliver_due(delivery) == {"delivered": 0, "continued": 0, "failed": 0}  # not due yet
+    message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert deliver_due(delivery)["delivered"] == 1
+
+
+def test_http_call_runs_outside_a_transaction_and_holds_a_lease(client):
+    enqueue(USER_DELETED, {"user_id": 7})
+    db.session.commit()
+    seen = {}
+
+    class Observing(FakeFileService):
+        def post(self, path):
+            seen["in_transaction"] = db.session().in_transaction()
+            # another worker polling meanwhile finds nothing due
+            seen["other_worker"] = deliver_due(FakeFileService([]))
+            return super().post(path)
+
+    assert deliver_due(Observing([{"done": True}]))["delivered"] == 1
+    assert seen == {"in_transaction": False, "other_worker": {"delivered": 0, "continued": 0, "failed": 0}}
+
+
+def test_an_expired_lease_makes_the_message_due_again(client):
+    enqueue(USER_DELETED, {"user_id": 7})
+    db.session.commit()
+
+    class WorkerDiesMidCall(FakeFileService):
+        def post(self, path):
+            raise SystemExit
+
+    try:
+        deliver_due(WorkerDiesMidCall([]), lease_s=0)
+    except SystemExit:
+        pass
+    assert deliver_due(FakeFileService([{"done": True}]))["delivered"] == 1
+
+
+def test_service_token_has_the_service_role():
+    token = Delivery("http://file-service", "unit-test-secret", "HS256").service_token()
+    claims = jwt.decode(token, "unit-test-secret", algorithms=["HS256"])
+    assert claims["role"] == "service" and claims["sub"] == "auth-service"
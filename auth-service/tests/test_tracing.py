@@ -0,0 +1,36 @@
+import pytest
+import tracing
+
+class ListExporter:
+    def __init__(self, service_name="auth-service"):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+@pytest.fixture
+def exporter():
+    exp = ListExporter()
+    tracing.configure("auth-service", exporter=exp, sample_ratio=1.0)
+    yield exp
+    tracing.configure("auth-service", exporter=None, sample_ratio=0.0)
+
+def test_login_phases_are_child_spans(client, test_user, exporter):
+    with tracing.start_span("caller", new_trace=True) as caller:
+        res = client.post("/api/login", json={"username": "user1", "password": "user123"})
+    assert res.status_code == 200
+    assert tracing.flush(5)
+
+    spans = {s.name: s for s in exporter.spans}
+    assert {"password.verify", "jwt.sign"} <= set(spans)
+    assert spans["jwt.sign"].attributes == {"algorithm": "HS256"}
+    assert all(s.trace_id == caller.trace_id for s in exporter.spans)
+
+def test_token_check_is_traced(client, test_user, exporter):
+    token = client.post("/api/login", json={"username": "admin", "password": "admin123"}).get_json()["access_token"]
+
+    with tracing.start_span("caller", new_trace=True):
+        res = client.get("/api/profile", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+    assert tracing.flush(5)
+    assert "jwt.decode" in {s.name for s in exporter.spans}
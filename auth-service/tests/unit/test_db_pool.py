@@ -0,0 +1,29 @@
+from sqlalchemy import create_engine, text
+from prometheus_client import REGISTRY
+from db_pool import TimedQueuePool, engine_options_from_env, track_engine_pool
+
+def test_pool_settings_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "12")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "2000")
+
+    opts = engine_options_from_env("postgresql+psycopg2://u:p@localhost/auth_db")
+
+    assert opts["pool_size"] == 12
+    assert opts["pool_pre_ping"] is False
+    assert opts["connect_args"]["options"] == "-c statement_timeout=2000"
+
+def test_sqlite_is_left_alone():
+    assert engine_options_from_env("sqlite:///:memory:") == {}
+
+def test_pool_checkouts_are_tracked(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=2)
+    track_engine_pool(engine, "auth-test")
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert REGISTRY.get_sample_value("db_pool_checked_out", {"pool": "auth-test"}) == 1
+
+    assert REGISTRY.get_sample_value("db_pool_checked_out", {"pool": "auth-test"}) == 0
+    assert REGISTRY.get_sample_value("db_pool_size", {"pool": "auth-test"}) == 2
+    assert REGISTRY.get_sample_value("db_pool_checkout_seconds_count", {"pool": "auth-test"}) == 1
@@ -0,0 +1,48 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from utils.jwt_utils import get_configured_algorithm, load_signing_keys
+
+def _write_ed25519_keys(base_dir):
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    (base_dir / "ed25519_private.pem").write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    (base_dir / "ed25519_public.pem").write_bytes(private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ))
+
+def test_eddsa_keys_sign_and_verify(tmp_path):
+    _write_ed25519_keys(tmp_path)
+
+    private_key, public_key = load_signing_keys("EdDSA", tmp_path, "unused")
+    token = jwt.encode({"sub": "1"}, private_key, algorithm="EdDSA")
+
+    assert jwt.decode(token, public_key, algorithms=["EdDSA"])["sub"] == "1"
+
+def test_missing_key_files_raise(tmp_path):
+    with pytest.raises(RuntimeError):
+        load_signing_keys("RS256", tmp_path, "unused")
+
+def test_hs256_uses_secret(monkeypatch, tmp_path):
+    monkeypatch.setenv("JWT_SECRET", "s3cret")
+    assert load_signing_keys("HS256", tmp_path, "unused") == ("s3cret", "s3cret")
+
+def test_hs256_without_secret_fails_outside_tests(monkeypatch, tmp_path):
+    monkeypatch.delenv("JWT_SECRET", raising=False)
+    monkeypatch.setenv("TESTING", "false")
+    with pytest.raises(RuntimeError):
+        load_signing_keys("HS256", tmp_path, "unit-test-secret")
+
+    monkeypatch.setenv("TESTING", "true")
+    assert load_signing_keys("HS256", tmp_path, "unit-test-secret") == ("unit-test-secret", "unit-test-secret")
+
+def test_unsupported_algorithm_rejected(monkeypatch):
+    monkeypatch.setenv("JWT_ALGORITHM", "none")
+    with pytest.raises(RuntimeError):
+        get_configured_algorithm()
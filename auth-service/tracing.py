@@ -0,0 +1,492 @@
+# tracing.py
+# Request tracing with W3C Trace Context propagation (the `traceparent` header).
+# The same module is used by auth-service, file-service and ui-gateway so a trace
+# started in the UI can be followed through login and the file calls.
+#
+# Spans are batched on a background thread and handed to an exporter:
+# stdout / JSON-lines file (offline use) or an OTLP/HTTP collector (JSON encoding).
+# With TRACING_EXPORTER=none (default) nothing is recorded and every helper is a no-op.
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import secrets
+import importlib
+import threading
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from workers import ProcessThread
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+STATEMENT_MAX_CHARS = 500
+
+_current_span = ContextVar("current_span", default=None)
+
+
+def _env_int(name: str, default: str) -> int:
+    return int(os.getenv(name, default))
+
+def _env_float(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+# ===== traceparent =====
+
+def parse_traceparent(value):
+    """
+    Parses a W3C traceparent header ("00-<trace_id>-<span_id>-<flags>").
+    Returns (trace_id, span_id, sampled), or None if missing / malformed.
+    """
+    if not value:
+        return None
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4:
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    if len(version) != 2 or version == "ff" or (version == "00" and len(parts) != 4):
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        int(version, 16)
+        int(trace_id, 16)
+        int(span_id, 16)
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, sampled
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+# ===== Spans =====
+
+class Span:
+    """
+    One timed operation. Unsampled spans still carry ids (so the trace can be
+    propagated) but never collect attributes or get exported.
+    """
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+                 "start_ns", "end_ns", "attributes", "status", "_tracer")
+
+    def __init__(self, tracer, name, trace_id, parent_id, sampled, kind="internal", attributes=None):
+        self._tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes) if (sampled and attributes) else {}
+        self.status = "unset"
+
+    @property
+    def traceparent(self) -> str:
+        return format_traceparent(self.trace_id, self.span_id, self.sampled)
+
+    def set_attribute(self, key: str, value) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def record_error(self, exc) -> None:
+        self.status = "error"
+        self.set_attribute("error.type", type(exc).__name__)
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.sampled:
+            self._tracer.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": self._tracer.service_name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+class _NoopSpan:
+    sampled = False
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, exc):
+        pass
+
+    def end(self):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+# ===== Exporters =====
+
+class StdoutExporter:
+    """One JSON object per span on stdout (docker logs / local debugging)."""
+
+    def __init__(self, service_name: str):
+        self.service_name = service_name
+
+    def export(self, spans) -> None:
+        for span in spans:
+            print(json.dumps(span.to_dict()), flush=True)
+
+class FileExporter:
+    """Appends one JSON object per span to a file (offline analysis)."""
+
+    def __init__(self, service_name: str, path: str = None):
+        self.service_name = service_name
+        self.path = path or os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+
+    def export(self, spans) -> None:
+        lines = "".join(json.dumps(span.to_dict()) + "\n" for span in spans)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_payload(spans, service_name: str) -> dict:
+    """OTLP/HTTP JSON body (ExportTraceServiceRequest) for a batch of spans."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "tracing"},
+                "spans": [
+                    {
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent_id or "",
+                        "name": span.name,
+                        "kind": SPAN_KINDS[span.kind],
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                        "status": {"code": 2} if span.status == "error" else {},
+                    }
+                    for span in spans
+                ],
+            }],
+        }]
+    }
+
+class OTLPHttpExporter:
+    """POSTs batches to an OTLP/HTTP collector (e.g. the OpenTelemetry Collector or Jaeger on :4318)."""
+
+    def __init__(self, service_name: str, endpoint: str = None, timeout_s: float = None):
+        self.service_name = service_name
+        self.endpoint = endpoint or os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self.timeout_s = timeout_s if timeout_s is not None else _env_float("TRACING_OTLP_TIMEOUT_SECONDS", "5")
+
+    def export(self, spans) -> None:
+        body = json.dumps(otlp_payload(spans, self.service_name)).encode()
+        req = urllib.request.Request(
+            self.endpoint, data=body, method="POST", headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout_s) as resp:
+            resp.read()
+
+EXPORTERS = {
+    "stdout": StdoutExporter,
+    "file": FileExporter,
+    "otlp": OTLPHttpExporter,
+}
+
+def create_exporter(name: str, service_name: str):
+    """
+    TRACING_EXPORTER value -> exporter instance (None = tracing off).
+    Besides the built-in names, "package.module:factory" loads a custom exporter;
+    the factory gets the service name and must return an object with export(spans).
+    """
+    name = (name or "none").strip()
+    if name.lower() in ("", "none", "off"):
+        return None
+    if name.lower() in EXPORTERS:
+        return EXPORTERS[name.lower()](service_name)
+    if ":" in name:
+        module_name, attr = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), attr)(service_name)
+    raise RuntimeError(f"Unknown TRACING_EXPORTER: {name}")
+
+# ===== Tracer =====
+
+class Tracer:
+    """
+    Creates spans and exports finished, sampled ones in batches from a daemon thread.
+    - sampling is decided once per trace from the trace id, so every service
+      keeps or drops the same traces; an incoming sampled flag is honoured only
+      when the caller is trusted (TRACING_TRUST_UPSTREAM, see init_tracing)
+    - export never blocks a request; when the queue is full spans are dropped and counted
+    """
+
+    def __init__(self, service_name, exporter=None, sample_ratio=0.05,
+                 max_queue=2048, batch_size=256, flush_interval_s=1.0):
+        self.service_name = service_name
+        self.exporter = exporter
+        self.sample_ratio = max(0.0, min(1.0, sample_ratio))
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = ProcessThread("trace-exporter", self._run)
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def should_sample(self, trace_id: str) -> bool:
+        # low 64 bits of the (random) trace id, compared to the ratio
+        return int(trace_id[16:], 16) < self.sample_ratio * (1 << 64)
+
+    def start_span(self, name, kind="internal", parent=None, remote=None, attributes=None) -> Span:
+        """
+        parent: local parent Span; remote: (trace_id, span_id, sampled) from traceparent.
+        With neither, a new trace is started.
+        """
+        if parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        elif remote is not None:
+            trace_id, parent_id, sampled = remote
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+            sampled = self.should_sample(trace_id)
+        return Span(self, name, trace_id, parent_id, sampled and self.enabled, kind, attributes)
+
+    def export(self, span) -> None:
+        self._thread.ensure_running()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every finished span has been exported. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval_s)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                print("Trace export failed:", e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+_TRACER = None
+_TRACER_LOCK = threading.Lock()
+
+def configure(service_name: str = None, exporter=None, sample_ratio: float = None) -> Tracer:
+    """
+    (Re)builds the process tracer. Anything not passed comes from env:
+    - SERVICE_NAME
+    - TRACING_EXPORTER: none (default) | stdout | file | otlp | package.module:factory
+    - TRACING_SAMPLE_RATIO: share of new traces to record (default 0.05)
+    - TRACING_FILE_PATH / TRACING_OTLP_ENDPOINT for the file / otlp exporters
+    """
+    global _TRACER
+    service_name = service_name or os.getenv("SERVICE_NAME", "unknown-service")
+    if exporter is None:
+        exporter = create_exporter(os.getenv("TRACING_EXPORTER", "none"), service_name)
+    if sample_ratio is None:
+        sample_ratio = _env_float("TRACING_SAMPLE_RATIO", "0.05")
+
+    with _TRACER_LOCK:
+        _TRACER = Tracer(
+            service_name,
+            exporter=exporter,
+            sample_ratio=sample_ratio,
+            max_queue=_env_int("TRACING_QUEUE_SIZE", "2048"),
+        )
+    return _TRACER
+
+def get_tracer() -> Tracer:
+    if _TRACER is None:
+        configure()
+    return _TRACER
+
+def current_span():
+    return _current_span.get()
+
+def current_traceparent():
+    """traceparent for an outgoing call (or a page that makes its own calls), if a trace is active."""
+    span = _current_span.get()
+    return span.traceparent if span is not None else None
+
+def inject(headers: dict) -> dict:
+    value = current_traceparent()
+    if value:
+        headers["traceparent"] = value
+    return headers
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", new_trace: bool = False, **attributes):
+    """
+    Child span of the active span. Outside a trace this is a no-op, unless
+    new_trace=True (background work such as the notification worker).
+    """
+    parent = _current_span.get()
+    if parent is None and not (new_trace and get_tracer().enabled):
+        yield NOOP_SPAN
+        return
+    if parent is not None and not parent.sampled:
+        yield NOOP_SPAN
+        return
+
+    span = get_tracer().start_span(name, kind=kind, parent=parent, attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+def flush(timeout: float = 5.0) -> bool:
+    if _TRACER is None or not _TRACER.enabled:
+        return True
+    return _TRACER.flush(timeout)
+
+atexit.register(flush)
+
+# ===== Flask =====
+
+def init_tracing(app, service_name: str = None, trust_upstream: bool = None) -> Tracer:
+    """
+    Server span per request, continuing an incoming traceparent.
+    Browsers reach every service directly, so by default an incoming sampled
+    flag is replaced by this tracer's own TRACING_SAMPLE_RATIO draw (the trace
+    id is kept) and clients can't force every request to be recorded.
+    trust_upstream (default: TRACING_TRUST_UPSTREAM=true|false, off) honours the
+    flag, for services only reachable through callers that set it themselves.
+    Registers nothing when tracing is off.
+    """
+    from flask import g, request
+
+    tracer = configure(service_name)
+    if not tracer.enabled:
+        return tracer
+    if trust_upstream is None:
+        trust_upstream = os.getenv("TRACING_TRUST_UPSTREAM", "false").lower() == "true"
+
+    @app.before_request
+    def _start_request_span():
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        remote = parse_traceparent(request.headers.get("traceparent"))
+        if remote is not None and not trust_upstream:
+            # random, not should_sample(): the client picks the trace id too
+            remote = (remote[0], remote[1], random.random() < get_tracer().sample_ratio)
+        span = get_tracer().start_span(
+            f"{request.method} {route}",
+            kind="server",
+            remote=remote,
+            attributes={"http.method": request.method, "http.route": route},
+        )
+        g._trace_span = span
+        g._trace_token = _current_span.set(span)
+
+    @app.after_request
+    def _record_status(response):
+        span = g.get("_trace_span")
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.status = "error"
+        return response
+
+    @app.teardown_request
+    def _end_request_span(exc):
+        span = g.pop("_trace_span", None)
+        if span is None:
+            return
+        if exc is not None:
+            span.record_error(exc)
+        _current_span.reset(g.pop("_trace_token"))
+        span.end()
+
+    return tracer
+
+# ===== SQLAlchemy =====
+
+def instrument_engine(engine) -> None:
+    """Client span per statement on this engine (only call when tracing is enabled)."""
+    from sqlalchemy import event
+
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current_span.get()
+        span = None
+        if parent is not None and parent.sampled:
+            span = get_tracer().start_span("db.query", kind="client", parent=parent, attributes={
+                "db.system": system,
+                "db.operation": statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "",
+                "db.statement": statement[:STATEMENT_MAX_CHARS],
+            })
+        conn.info.setdefault("_trace_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("_trace_spans")
+        span = spans.pop() if spans else None
+        if span is not None:
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("_trace_spans") if conn is not None else None
+        span = spans.pop() if spans else None
+        if span is not None:
+            span.record_error(exception_context.original_exception)
+            span.end()
@@ -13,24 +13,62 @@ IS_TEST = (
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# Asymmetric algorithms we can sign with, and the default PEM file names for each
+KEY_FILES = {
+    "ES256": ("ec_private.pem", "ec_public.pem"),
+    "RS256": ("rsa_private.pem", "rsa_public.pem"),
+    "EdDSA": ("ed25519_private.pem", "ed25519_public.pem"),
+}
+SUPPORTED_ALGORITHMS = {"HS256", *KEY_FILES}
+DEFAULT_ALGORITHM = "ES256"
+
+
+def get_configured_algorithm() -> str:
+    """
+    Signing algorithm from JWT_ALGORITHM (default ES256).
+    Raises RuntimeError for anything we don't support.
+    """
+    alg = os.getenv("JWT_ALGORITHM", DEFAULT_ALGORITHM).strip()
+    if alg not in SUPPORTED_ALGORITHMS:
+        raise RuntimeError(f"Unsupported JWT_ALGORITHM: {alg}")
+    return alg
+
+
+def load_signing_keys(algorithm: str, base_dir: Path, default_secret: str):
+    """
+    Returns (private_key, public_key) for the given algorithm.
+    - HS256 uses JWT_SECRET for both; default_secret only when TESTING=true
+      (it is in the repo, so anyone could forge tokens with it)
+    - Asymmetric algorithms read PEM files from base_dir
+      (override with JWT_PRIVATE_KEY_PATH / JWT_PUBLIC_KEY_PATH)
+    """
+    if algorithm == "HS256":
+        secret = os.getenv("JWT_SECRET")
+        if not secret:
+            if os.getenv("TESTING") != "true":
+                raise RuntimeError("JWT_SECRET must be set for HS256 mode")
+            secret = default_secret
+        return secret, secret
+
+    private_name, public_name = KEY_FILES[algorithm]
+    private_path = Path(os.getenv("JWT_PRIVATE_KEY_PATH") or base_dir / private_name)
+    public_path = Path(os.getenv("JWT_PUBLIC_KEY_PATH") or base_dir / public_name)
+
+    if not private_path.exists() or not public_path.exists():
+        raise RuntimeError(f"JWT key files missing for {algorithm} mode")
+
+    return private_path.read_text(), public_path.read_text()
+
+
 # ===== Key + Algorithm Selection =====
 if IS_TEST:
     # CI / pytest / unit tests
     ALGORITHM = "HS256"
-    PRIVATE_KEY = os.getenv("JWT_SECRET", "test-secret")
-    PUBLIC_KEY = PRIVATE_KEY
 else:
     # Local dev / production
-    ALGORITHM = "ES256"
-
-    PRIVATE_KEY_PATH = BASE_DIR / "ec_private.pem"
-    PUBLIC_KEY_PATH = BASE_DIR / "ec_public.pem"
-
-    if not PRIVATE_KEY_PATH.exists() or not PUBLIC_KEY_PATH.exists():
-        raise RuntimeError("JWT key files missing for ES256 mode")
+    ALGORITHM = get_configured_algorithm()
 
-    PRIVATE_KEY = PRIVATE_KEY_PATH.read_text()
-    PUBLIC_KEY = PUBLIC_KEY_PATH.read_text()
+PRIVATE_KEY, PUBLIC_KEY = load_signing_keys(ALGORITHM, BASE_DIR, "test-secret")
 
 # ===== Token Creation =====
 def generate_token(user_id: int, role: str) -> str:
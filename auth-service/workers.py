@@ -0,0 +1,92 @@
+# workers.py
+# Per-process background threads. Threads don't survive fork (e.g. gunicorn
+# preload), so a thread is started lazily and started again when the pid changes.
+# The same module is used by auth-service, file-service and ui-gateway; keep the
+# copies identical.
+#
+# - ProcessThread: one daemon thread running a loop of your own (queue consumers)
+# - PeriodicWorker: calls fn every interval_s, optionally inside an app context
+# - run_in_each_worker: starts a worker from the first request of every process
+import os
+import threading
+
+
+class ProcessThread:
+    """One daemon thread per process running target(); restarted after a fork."""
+
+    def __init__(self, name: str, target):
+        self.name = name
+        self.target = target
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def ensure_running(self) -> None:
+        if self.is_running():
+            return
+        with self._lock:
+            if self.is_running():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+
+    def join(self, timeout: float = None) -> None:
+        if self.is_running():
+            self._thread.join(timeout)
+
+
+class PeriodicWorker(ProcessThread):
+    """
+    Calls fn every interval_s in this process; errors are printed and the loop
+    goes on. With app, fn runs inside app.app_context(). delay_first=False runs
+    fn once right away (e.g. a probe whose result gates requests).
+    """
+
+    def __init__(self, name: str, interval_s: float, fn, app=None, delay_first: bool = True):
+        super().__init__(name, self._run)
+        self.interval_s = interval_s
+        self.fn = fn
+        self.app = app
+        self.delay_first = delay_first
+        self._stop = threading.Event()
+
+    def ensure_running(self) -> None:
+        if not self._stop.is_set():
+            super().ensure_running()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stops the loop after the current call; ensure_running no longer restarts it."""
+        self._stop.set()
+        self.join(timeout)
+
+    def run_once(self) -> None:
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    self.fn()
+            else:
+                self.fn()
+        except Exception as e:
+            print(f"Background task {self.name} failed:", e)
+
+    def _run(self):
+        if not self.delay_first:
+            self.run_once()
+        while not self._stop.wait(self.interval_s):
+            self.run_once()
+
+
+def run_in_each_worker(app, worker):
+    """Starts worker on the first request of every process, and keeps it in app.extensions["workers"]."""
+    app.extensions.setdefault("workers", {})[worker.name] = worker
+
+    @app.before_request
+    def _ensure_worker():
+        # started lazily so each forked worker gets its own thread
+        worker.ensure_running()
+
+    return worker
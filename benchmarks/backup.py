@@ -0,0 +1,146 @@
+"""
+Backup / restore throughput benchmark (file-service backup.py).
+
+Builds a throwaway SQLite database and upload directory with --files blobs
+(log-normal sizes around --median-kb), then measures, through the same
+functions `flask backup` uses:
+- a full backup
+- an incremental backup after --change-fraction of the files were replaced
+- verify of the resulting chain
+- restore of the chain into an empty database, once per --workers value
+
+Absolute numbers depend mostly on the disk; compare runs on the same machine.
+
+Usage:
+    python benchmarks/backup.py
+    python benchmarks/backup.py --files 20000 --median-kb 256 --workers 1 4 8 --json
+    python benchmarks/backup.py --dir /mnt/scratch   # measure a specific disk
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import uuid
+from datetime import datetime
+
+from harness import FILE_DIR
+
+sys.path.insert(0, str(FILE_DIR))
+
+
+def _make_app(workdir: str, name: str):
+    from app import create_app
+    from db import db
+
+    app = create_app(f"sqlite:///{os.path.join(workdir, name)}.db")
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _add_files(upload_dir: str, count: int, median: int, rng: random.Random) -> int:
+    from db import db
+    from models import File
+
+    total = 0
+    rows = []
+    for _ in range(count):
+        size = max(1, int(rng.lognormvariate(0, 1) * median))
+        path = os.path.join(upload_dir, uuid.uuid4().hex)
+        with open(path, "wb") as f:
+            f.write(rng.randbytes(size))
+        rows.append(File(
+            owner_user_id=rng.randrange(1, 1000), filename=f"bench-{rng.getrandbits(32):08x}.bin",
+            storage_path=path, content_type="application/octet-stream", size_bytes=size,
+            created_at=datetime.utcnow(),
+        ))
+        total += size
+    db.session.add_all(rows)
+    db.session.commit()
+    return total
+
+
+def _replace_files(upload_dir: str, fraction: float, median: int, rng: random.Random) -> int:
+    """Deletes `fraction` of the files and adds as many new ones; returns new bytes."""
+    from db import db
+    from models import File
+
+    ids = [i for (i,) in db.session.query(File.id)]
+    for f in File.query.filter(File.id.in_(rng.sample(ids, int(len(ids) * fraction)))):
+        os.remove(f.storage_path)
+        db.session.delete(f)
+    db.session.commit()
+    return _add_files(upload_dir, int(len(ids) * fraction), median, rng)
+
+
+def _rates(nbytes: int, files: int, seconds: float) -> dict:
+    seconds = max(seconds, 1e-9)
+    return {
+        "files": files,
+        "mb": round(nbytes / 1e6, 1),
+        "seconds": round(seconds, 3),
+        "mb_s": round(nbytes / seconds / 1e6, 1),
+        "files_s": round(files / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="backup / restore throughput benchmark")
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--median-kb", type=float, default=64)
+    parser.add_argument("--change-fraction", type=float, default=0.05, help="files replaced before the incremental run")
+    parser.add_argument("--chunk-mb", type=float, default=64, help="tar chunk size (restore parallelism unit)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="restore / verify worker counts")
+    parser.add_argument("--dir", help="work directory (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    from backup import create_backup, restore_backup, verify_backup
+
+    rng = random.Random(args.seed)
+    median = int(args.median_kb * 1024)
+    chunk_bytes = int(args.chunk_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory(prefix="bench-backup-", dir=args.dir) as workdir:
+        upload_dir = os.path.join(workdir, "uploads")
+        dest = os.path.join(workdir, "backups")
+        os.makedirs(upload_dir)
+        os.environ["UPLOAD_DIR"] = upload_dir
+        report = {}
+
+        source = _make_app(workdir, "source")
+        with source.app_context():
+            _add_files(upload_dir, args.files, median, rng)
+            full = create_backup(dest, chunk_bytes=chunk_bytes)
+            report["full_backup"] = _rates(full["blob_bytes"], full["rows"], full["seconds"])
+
+            _replace_files(upload_dir, args.change_fraction, median, rng)
+            incremental = create_backup(dest, chunk_bytes=chunk_bytes)
+            report["incremental_backup"] = _rates(incremental["blob_bytes"], incremental["rows"], incremental["seconds"])
+            report["incremental_backup"]["snapshot_rows"] = incremental["snapshot_rows"]
+
+        latest = os.path.join(dest, incremental["id"])
+        for workers in args.workers:
+            stats = verify_backup(latest, workers)
+            assert not stats["errors"], stats["errors"][:5]
+            report[f"verify_{workers}w"] = _rates(stats["bytes"], stats["checked"], stats["seconds"])
+
+            target = _make_app(workdir, f"restore-{workers}")
+            with target.app_context():
+                stats = restore_backup(latest, os.path.join(workdir, f"restored-{workers}"), workers)
+            report[f"restore_{workers}w"] = _rates(stats["bytes"], stats["restored"], stats["seconds"])
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'phase':<20} {'files':>8} {'MB':>9} {'seconds':>9} {'MB/s':>9} {'files/s':>9}")
+    for phase, r in report.items():
+        print(f"{phase:<20} {r['files']:>8} {r['mb']:>9.1f} {r['seconds']:>9.3f} {r['mb_s']:>9.1f} {r['files_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
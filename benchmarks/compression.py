@@ -0,0 +1,147 @@
+"""
+At-rest compression benchmark (file-service storage_codec.py).
+
+Compresses representative text with each available codec and level, through
+the same write_encoded / open_decoded calls the upload and download paths use,
+and reports ratio and compress / decompress throughput. Pick
+STORAGE_COMPRESSION and STORAGE_COMPRESSION_LEVEL from the numbers.
+
+The default corpus is generated (seeded): application logs, CSV and JSON
+lines. Pass --file to measure real uploads instead.
+
+Usage:
+    python benchmarks/compression.py
+    python benchmarks/compression.py --size-mb 32 --levels 1 3 6 9 --json
+    python benchmarks/compression.py --file /var/log/syslog --file export.csv
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from harness import FILE_DIR
+
+sys.path.insert(0, str(FILE_DIR))
+import storage_codec  # noqa: E402
+
+PATHS = ("/dashboard", "/dashboard/upload", "/dashboard/download/{id}", "/health", "/api/login")
+LEVELS = {"gzip": [1, 6, 9], "zstd": [1, 3, 9, 19]}
+
+
+def generate_corpus(kind: str, size: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    lines, total, i = [], 0, 0
+    while total < size:
+        if kind == "log":
+            line = (
+                f"2026-10-19T{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}."
+                f"{rng.randrange(1000):03d}Z {rng.choice(['INFO', 'INFO', 'INFO', 'WARN', 'ERROR'])} "
+                f"request_id={rng.getrandbits(64):016x} user_id={rng.randrange(5000)} "
+                f"method={rng.choice(['GET', 'POST'])} path={rng.choice(PATHS).format(id=rng.randrange(10**6))} "
+                f"status={rng.choice([200, 200, 200, 201, 401, 404, 500])} duration_ms={rng.lognormvariate(3, 1):.1f}\n"
+            )
+        elif kind == "csv":
+            line = (
+                f"{i},{rng.randrange(5000)},report-{rng.randrange(10000):04d}.pdf,application/pdf,"
+                f"{int(rng.lognormvariate(12, 1.5))},2026-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}\n"
+            )
+        else:
+            line = json.dumps({
+                "id": i, "event": rng.choice(["upload", "download", "delete"]),
+                "user_id": rng.randrange(5000), "bytes": int(rng.lognormvariate(12, 1.5)),
+                "ok": rng.random() > 0.05,
+            }) + "\n"
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return "".join(lines).encode()[:size]
+
+
+def _throughput(fn, nbytes: int, seconds: float) -> float:
+    """MB/s of fn() processing nbytes, repeated for at least `seconds`."""
+    runs, start = 0, time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return runs * nbytes / elapsed / 1e6
+
+
+def bench(data: bytes, codec: str, level: int, seconds: float, workdir: str) -> dict:
+    path = os.path.join(workdir, f"{codec}-{level}")
+    with open(path, "wb") as f:
+        storage_codec.write_encoded(f, data, codec, level)
+        stored_size = f.tell()
+
+    def compress():
+        storage_codec.write_encoded(io.BytesIO(), data, codec, level)
+
+    def decompress():
+        # same streaming path as a download to a client without Content-Encoding support
+        with storage_codec.open_decoded(path, codec) as f:
+            while f.read(storage_codec.CHUNK_BYTES):
+                pass
+
+    return {
+        "codec": codec,
+        "level": level,
+        "ratio": round(len(data) / stored_size, 2),
+        "compress_mb_s": round(_throughput(compress, len(data), seconds), 1),
+        "decompress_mb_s": round(_throughput(decompress, len(data), seconds), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="at-rest compression benchmark")
+    parser.add_argument("--size-mb", type=float, default=8, help="size of each generated corpus")
+    parser.add_argument("--file", action="append", default=[], help="benchmark this file (repeatable)")
+    parser.add_argument("--codecs", nargs="+", default=list(storage_codec.CODECS), choices=storage_codec.CODECS)
+    parser.add_argument("--levels", type=int, nargs="+", help="default: a few per codec")
+    parser.add_argument("--seconds", type=float, default=1.0, help="per measurement")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.file:
+        corpora = {}
+        for path in args.file:
+            with open(path, "rb") as f:
+                corpora[path] = f.read()
+    else:
+        size = int(args.size_mb * 1024 * 1024)
+        corpora = {kind: generate_corpus(kind, size, args.seed) for kind in ("log", "csv", "jsonl")}
+
+    codecs = [c for c in args.codecs if storage_codec.available(c)]
+    skipped = sorted(set(args.codecs) - set(codecs))
+
+    with tempfile.TemporaryDirectory(prefix="bench-compression-") as workdir:
+        report = {
+            name: [
+                bench(data, codec, level, args.seconds, workdir)
+                for codec in codecs for level in (args.levels or LEVELS[codec])
+            ]
+            for name, data in corpora.items()
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    if skipped:
+        print(f"skipped (not installed): {', '.join(skipped)}")
+    print(f"{'corpus':<12} {'codec':<6} {'level':>5} {'ratio':>7} {'comp MB/s':>10} {'decomp MB/s':>12}")
+    for name, rows in report.items():
+        for r in rows:
+            print(
+                f"{name[-12:]:<12} {r['codec']:<6} {r['level']:>5} {r['ratio']:>7.2f} "
+                f"{r['compress_mb_s']:>10.1f} {r['decompress_mb_s']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
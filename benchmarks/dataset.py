@@ -0,0 +1,258 @@
+"""
+Synthetic large-scale dataset for benchmarks and migration testing.
+
+Loads `users` into the auth-service database and `files` into the
+file-service database, with file ownership following a Zipf distribution
+(a few owners have most of the files, most owners have a handful).
+Optionally writes on-disk blobs for a fraction of the rows into an uploads/
+tree. Everything is derived from --seed, so the same arguments always
+produce the same rows.
+
+- Postgres: COPY ... FROM STDIN
+- SQLite: executemany, one transaction per batch
+
+Rows bypass the ORM, so file-service's storage analytics (storage_stats.py)
+are rebuilt from `files` at the end.
+
+Every generated user has the same password (--password, default "bench-pass"),
+so it is hashed once. Generated usernames start with "gen-"; --reset removes
+them and their files before loading.
+
+Usage:
+    python benchmarks/dataset.py --auth-db-url sqlite:////tmp/auth.db --file-db-url sqlite:////tmp/file.db
+    python benchmarks/dataset.py --users 5000 --files 2000000 --zipf 1.2 \\
+        --auth-db-url postgresql+psycopg2://... --file-db-url postgresql+psycopg2://... \\
+        --upload-dir /tmp/uploads --blob-fraction 0.01
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, text
+from werkzeug.security import generate_password_hash
+
+from harness import prepare_auth_db, prepare_file_db, rebuild_file_stats
+
+USERNAME_PREFIX = "gen-"
+MAX_FILE_BYTES = 5 * 1024 * 1024  # file-service upload limit
+
+# (content_type, extension, weight): only the types file-service accepts for upload
+CONTENT_TYPES = (
+    ("image/png", "png", 60),
+    ("text/plain", "txt", 40),
+)
+STEMS = ("report", "invoice", "photo", "scan", "notes", "draft", "export", "backup", "summary", "receipt")
+
+USER_COLUMNS = ("username", "password_hash", "role", "created_at")
+FILE_COLUMNS = (
+    "owner_user_id", "filename", "storage_path", "content_type", "size_bytes",
+    "storage_codec", "stored_size_bytes", "volume", "created_at",
+)
+
+
+def zipf_cum_weights(n: int, s: float):
+    """Cumulative weights for ranks 1..n with P(k) proportional to 1 / k**s."""
+    return list(itertools.accumulate(1.0 / (k ** s) for k in range(1, n + 1)))
+
+
+def _is_postgres(engine) -> bool:
+    return engine.url.get_backend_name() == "postgresql"
+
+
+def bulk_insert(engine, table: str, columns, rows) -> None:
+    """Inserts one batch of rows: COPY on Postgres, executemany elsewhere."""
+    if _is_postgres(engine):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+            raw.commit()
+        finally:
+            raw.close()
+        return
+
+    placeholders = ", ".join("?" for _ in columns)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", list(rows))
+
+
+def _tune_sqlite(engine) -> None:
+    # bulk load only: durability doesn't matter if the load is interrupted
+    if engine.url.get_backend_name() != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_conn, _record):
+        dbapi_conn.execute("PRAGMA synchronous = OFF")
+        dbapi_conn.execute("PRAGMA journal_mode = MEMORY")
+
+
+def _timestamp(end: datetime, rng: random.Random, days: int) -> str:
+    # same text format SQLAlchemy uses for SQLite DateTime; Postgres parses it too
+    return f"{end - timedelta(seconds=rng.randrange(days * 86400)):%Y-%m-%d %H:%M:%S.%f}"
+
+
+def generated_user_ids(auth_engine):
+    with auth_engine.connect() as conn:
+        return [row[0] for row in conn.execute(
+            text("SELECT id FROM users WHERE username LIKE :prefix ORDER BY id"), {"prefix": USERNAME_PREFIX + "%"}
+        )]
+
+
+def reset(auth_engine, file_engine, chunk: int = 10_000) -> None:
+    user_ids = generated_user_ids(auth_engine)
+    for start in range(0, len(user_ids), chunk):
+        ids = user_ids[start:start + chunk]
+        with file_engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM files WHERE owner_user_id IN ({', '.join(map(str, ids))})"))
+    with auth_engine.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE username LIKE :prefix"), {"prefix": USERNAME_PREFIX + "%"})
+
+
+def _progress(label: str, done: int, total: int, started: float) -> None:
+    print(f"\r  {label}: {done}/{total} ({done / max(time.monotonic() - started, 1e-9):,.0f} rows/s)",
+          end="", file=sys.stderr, flush=True)
+
+
+def load_users(auth_engine, args, rng: random.Random, end: datetime):
+    password_hash = generate_password_hash(args.password)
+    started = time.monotonic()
+    for start in range(0, args.users, args.batch_size):
+        count = min(args.batch_size, args.users - start)
+        rows = [
+            (f"{USERNAME_PREFIX}{start + i:07d}", password_hash, "user", _timestamp(end, rng, args.days))
+            for i in range(count)
+        ]
+        bulk_insert(auth_engine, "users", USER_COLUMNS, rows)
+        _progress("users", start + count, args.users, started)
+    print(file=sys.stderr)
+    return generated_user_ids(auth_engine)
+
+
+def _write_blob(path: str, size: int, rng: random.Random, dense: bool) -> None:
+    with open(path, "wb") as f:
+        if dense:
+            f.write(rng.randbytes(size))
+        else:
+            # sparse: takes no disk space but reads back as size zero bytes
+            f.truncate(size)
+
+
+def load_files(file_engine, owner_ids, args, rng: random.Random, end: datetime) -> dict:
+    # shuffle so the heaviest owner isn't simply the first generated user
+    owners = list(owner_ids)
+    rng.shuffle(owners)
+    cum_weights = zipf_cum_weights(len(owners), args.zipf)
+    types = [(ct, ext) for ct, ext, _ in CONTENT_TYPES]
+    type_weights = [w for _, _, w in CONTENT_TYPES]
+    mu = math.log(args.median_bytes)
+
+    if args.upload_dir:
+        os.makedirs(args.upload_dir, exist_ok=True)
+    upload_dir = os.path.abspath(args.upload_dir or "uploads")
+    # rows look like uncompressed uploads: no codec, stored size == size
+    volume = args.volume
+
+    # separate stream so blob contents don't shift the generated rows
+    blob_rng = random.Random(args.seed + 1)
+    per_owner = {}
+    blobs = blob_bytes = 0
+    started = time.monotonic()
+    for start in range(0, args.files, args.batch_size):
+        count = min(args.batch_size, args.files - start)
+        batch_owners = rng.choices(owners, cum_weights=cum_weights, k=count)
+        batch_types = rng.choices(types, weights=type_weights, k=count)
+        rows = []
+        for owner, (content_type, ext) in zip(batch_owners, batch_types):
+            size = max(1, min(MAX_FILE_BYTES, int(rng.lognormvariate(mu, args.size_sigma))))
+            storage_path = os.path.join(upload_dir, f"{rng.getrandbits(128):032x}")
+            filename = f"{rng.choice(STEMS)}-{rng.randrange(10000):04d}.{ext}"
+            created_at = _timestamp(end, rng, args.days)
+            rows.append((owner, filename, storage_path, content_type, size, None, size, volume, created_at))
+            per_owner[owner] = per_owner.get(owner, 0) + 1
+
+            has_blob = rng.random() < args.blob_fraction
+            if args.upload_dir and has_blob:
+                _write_blob(storage_path, size, blob_rng, args.dense_blobs)
+                blobs += 1
+                blob_bytes += size
+        bulk_insert(file_engine, "files", FILE_COLUMNS, rows)
+        _progress("files", start + count, args.files, started)
+    print(file=sys.stderr)
+
+    counts = sorted(per_owner.values(), reverse=True)
+    return {
+        "owners_with_files": len(counts),
+        "max_files_per_owner": counts[0] if counts else 0,
+        "median_files_per_owner": counts[len(counts) // 2] if counts else 0,
+        "blobs_written": blobs,
+        "blob_bytes": blob_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="synthetic users/files dataset generator")
+    parser.add_argument("--auth-db-url", required=True)
+    parser.add_argument("--file-db-url", required=True)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent for files per owner")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default="bench-pass", help="password of every generated user")
+    parser.add_argument("--median-bytes", type=int, default=200 * 1024)
+    parser.add_argument("--size-sigma", type=float, default=1.5, help="log-normal sigma of file sizes")
+    parser.add_argument("--days", type=int, default=365, help="spread created_at over this many days")
+    parser.add_argument("--end-date", default="2026-01-01", help="latest created_at (fixed, for reproducibility)")
+    parser.add_argument("--upload-dir", help="write blobs here (default: rows only, no files on disk)")
+    parser.add_argument("--volume", help="STORAGE_VOLUMES name of --upload-dir (default: none, i.e. UPLOAD_DIR)")
+    parser.add_argument("--blob-fraction", type=float, default=0.01, help="share of rows that get a blob")
+    parser.add_argument("--dense-blobs", action="store_true", help="write random bytes instead of sparse files")
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    parser.add_argument("--reset", action="store_true", help="delete previously generated users and their files first")
+    args = parser.parse_args()
+
+    # tables are created by the services' own models
+    prepare_auth_db(args.auth_db_url)
+    prepare_file_db(args.file_db_url)
+
+    auth_engine = create_engine(args.auth_db_url)
+    file_engine = create_engine(args.file_db_url)
+    for engine in (auth_engine, file_engine):
+        _tune_sqlite(engine)
+
+    if args.reset:
+        reset(auth_engine, file_engine)
+    elif generated_user_ids(auth_engine):
+        sys.exit("generated users already exist; rerun with --reset")
+
+    rng = random.Random(args.seed)
+    end = datetime.fromisoformat(args.end_date)
+    started = time.monotonic()
+    owner_ids = load_users(auth_engine, args, rng, end)
+    summary = load_files(file_engine, owner_ids, args, rng, end)
+    # rows were loaded around the ORM, so no storage analytics deltas were written
+    summary["storage_stats"] = json.loads(rebuild_file_stats(args.file_db_url))
+
+    print(json.dumps({
+        "seed": args.seed,
+        "users": len(owner_ids),
+        "files": args.files,
+        "zipf": args.zipf,
+        **summary,
+        "elapsed_s": round(time.monotonic() - started, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+End-to-end benchmark suite for the login -> dashboard -> upload -> download -> delete paths.
+
+Starts auth-service and file-service under gunicorn against throwaway SQLite
+databases (or the given DATABASE_URLs, e.g. a local Postgres) and a temp
+UPLOAD_DIR, then runs each scenario at a fixed concurrency:
+- login
+- list@<n>: GET /dashboard for a user owning n files
+- upload@<bytes>
+- download@<bytes>: a file uploaded by the matching upload scenario
+- delete: the files created by the upload scenarios
+
+The report (throughput + p50/p95/p99 per scenario) is printed or written as
+JSON and compared against a stored baseline. The exit status is 1 if any
+scenario had errors or regressed by more than --threshold, and, with --ci
+(default when $CI is set), if there is no baseline to compare against.
+
+Usage:
+    python benchmarks/e2e_suite.py
+    python benchmarks/e2e_suite.py --concurrency 32 --duration 20 --output report.json
+    python benchmarks/e2e_suite.py --file-db-url postgresql+psycopg2://... --auth-db-url postgresql+psycopg2://...
+    python benchmarks/e2e_suite.py --save-baseline   # record this machine's numbers
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from harness import (
+    AUTH_DIR, FILE_DIR, Service, http, login, prepare_auth_db, prepare_file_db,
+    run_in_service, run_load, service_env, upload,
+)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "e2e.json"
+
+# lower is worse for throughput, higher is worse for latency
+HIGHER_IS_BETTER = {"throughput_rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False}
+
+
+def _token_user_id(token: str) -> int:
+    # the suite only needs the subject; the signature is checked by file-service
+    payload = token.split(".")[1]
+    payload += "=" * (-len(payload) % 4)
+    return int(json.loads(base64.urlsafe_b64decode(payload))["sub"])
+
+
+def seed_files(file_db: str, owner_user_id: int, count: int, extra_env: dict = None) -> None:
+    """Inserts `count` file rows for one owner (rows only; the list path never touches the disk)."""
+    code = f"""
+from app import app
+from db import db
+from models import File
+with app.app_context():
+    File.query.filter_by(owner_user_id={owner_user_id}).delete()
+    db.session.add_all([
+        File(owner_user_id={owner_user_id}, filename=f"seed-{{i}}.txt", storage_path=f"/nonexistent/seed-{{i}}",
+             content_type="text/plain", size_bytes=1024)
+        for i in range({count})
+    ])
+    db.session.commit()
+"""
+    run_in_service(FILE_DIR, code, service_env(file_db, extra_env))
+
+
+def run_suite(args, workdir) -> dict:
+    auth_db = args.auth_db_url or f"sqlite:///{os.path.join(workdir, 'auth.db')}"
+    file_db = args.file_db_url or f"sqlite:///{os.path.join(workdir, 'file.db')}"
+    file_env = {"UPLOAD_DIR": os.path.join(workdir, "uploads")}
+
+    username, password = prepare_auth_db(auth_db)
+    list_users = {n: prepare_auth_db(auth_db, username=f"bench-list-{n}") for n in args.list_sizes}
+    prepare_file_db(file_db, file_env)
+
+    gunicorn_env = {"GUNICORN_WORKERS": str(args.workers)}
+    scenarios = {}
+
+    def measure(name, operation, requests=None):
+        scenarios[name] = run_load(operation, args.concurrency, args.duration, requests)
+        print(f"  {name}: {scenarios[name]['throughput_rps']} rps, p95 {scenarios[name]['p95_ms']} ms", file=sys.stderr)
+
+    with Service(AUTH_DIR, auth_db, gunicorn_env) as auth, \
+            Service(FILE_DIR, file_db, gunicorn_env, file_env) as files:
+        measure("login", lambda i, n: bool(login(auth.base_url, username, password)))
+
+        for count, (list_user, list_password) in list_users.items():
+            list_token = login(auth.base_url, list_user, list_password)
+            seed_files(file_db, _token_user_id(list_token), count, file_env)
+            list_headers = {"Authorization": f"Bearer {list_token}"}
+            measure(
+                f"list@{count}",
+                lambda i, n, h=list_headers: http("GET", files.base_url + "/dashboard", headers=h)[0] == 200,
+            )
+
+        token = login(auth.base_url, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+        created = []
+        created_lock = threading.Lock()
+
+        for size in args.upload_sizes:
+            payload = os.urandom(size)
+
+            def do_upload(i, n, payload=payload):
+                status, body = upload(files.base_url, token, payload, filename=f"bench-{i}-{n}.bin",
+                                      content_type="application/octet-stream")
+                if status != 201:
+                    return False
+                with created_lock:
+                    created.append(json.loads(body)["file"]["id"])
+                return True
+
+            measure(f"upload@{size}", do_upload)
+            if not created:
+                continue
+            file_id = created[-1]
+            measure(
+                f"download@{size}",
+                lambda i, n, u=f"{files.base_url}/dashboard/download/{file_id}": http("GET", u, headers=headers)[0] == 200,
+            )
+
+        def do_delete(i, n):
+            with created_lock:
+                if not created:
+                    return True
+                file_id = created.pop()
+            return http("POST", f"{files.base_url}/dashboard/delete/{file_id}", headers=headers)[0] == 200
+
+        measure("delete", do_delete, requests=len(created))
+
+    return scenarios
+
+
+# ===== Baseline comparison =====
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """
+    Regressions as dicts (scenario, metric, baseline, current, change).
+    change is the relative move in the bad direction, e.g. 0.3 = 30% worse.
+    Scenarios missing from either side are skipped.
+    """
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_better in HIGHER_IS_BETTER.items():
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (before - after) / before if higher_is_better else (after - before) / before
+            if change > threshold:
+                regressions.append({
+                    "scenario": name, "metric": metric,
+                    "baseline": before, "current": after, "change": round(change, 3),
+                })
+    return regressions
+
+
+def _missing_baseline_warning(path: Path, scenarios) -> None:
+    bar = "!" * 72
+    print(f"{bar}\nNO BASELINE at {path}: nothing was compared, {len(scenarios)} scenarios unchecked.\n"
+          f"Record one on the reference machine with --save-baseline.\n{bar}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="end-to-end benchmark suite")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers per service")
+    parser.add_argument("--list-sizes", type=int, nargs="+", default=[10, 100, 1000], help="files owned by the listing user")
+    parser.add_argument("--upload-sizes", type=int, nargs="+", default=[1024, 64 * 1024, 1024 * 1024],
+                        help="bytes (file-service accepts up to 5 MiB)")
+    parser.add_argument("--auth-db-url", help="default: temp SQLite file")
+    parser.add_argument("--file-db-url", help="default: temp SQLite file")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline instead of comparing")
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    parser.add_argument("--ci", action="store_true", default=bool(os.getenv("CI")),
+                        help="fail when there is no baseline (default when $CI is set)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-e2e-") as workdir:
+        scenarios = run_suite(args, workdir)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {
+            "concurrency": args.concurrency, "duration_s": args.duration, "workers": args.workers,
+            "database": "custom" if args.file_db_url or args.auth_db_url else "sqlite",
+        },
+        "scenarios": scenarios,
+    }
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        report["baseline"] = str(args.baseline)
+        report["threshold"] = args.threshold
+        report["regressions"] = compare(report, baseline, args.threshold)
+    else:
+        # a silent pass here would look exactly like "no regressions"
+        _missing_baseline_warning(args.baseline, scenarios)
+        report["baseline"] = None
+
+    errors = {name: s["errors"] for name, s in scenarios.items() if s["errors"]}
+    if errors:
+        report["errors"] = errors
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+
+    if errors or report.get("regressions"):
+        sys.exit(1)
+    if args.ci and not args.save_baseline and report.get("baseline") is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
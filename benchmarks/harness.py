@@ -0,0 +1,238 @@
+"""
+Shared helpers for the benchmark scripts:
+- start auth-service / file-service under gunicorn on a free port
+- create + seed their databases (SQLite by default, or any DATABASE_URL)
+- drive an operation at a fixed concurrency and summarise latency
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+AUTH_DIR = REPO_ROOT / "auth-service"
+FILE_DIR = REPO_ROOT / "file-service"
+
+# Both services run in TESTING mode so tokens are HS256 with a shared secret
+BENCH_JWT_SECRET = "benchmark-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def service_env(database_url: str, extra: dict = None) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": database_url,
+        "TESTING": "true",
+        "JWT_SECRET": BENCH_JWT_SECRET,
+        "ENABLE_RUNTIME_EMAILS": "false",
+    })
+    env.update(extra or {})
+    return env
+
+
+def run_in_service(service_dir: Path, code: str, env: dict) -> str:
+    """Runs a Python snippet inside a service directory (so its modules import)."""
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=service_dir, env=env, capture_output=True, text=True, check=True,
+    )
+    return result.stdout
+
+
+def prepare_auth_db(database_url: str, username: str = "bench", password: str = "bench-pass"):
+    code = f"""
+from werkzeug.security import generate_password_hash
+from app import app
+from db import db
+from models import User
+with app.app_context():
+    db.create_all()
+    if not User.query.filter_by(username={username!r}).first():
+        db.session.add(User(username={username!r}, password_hash=generate_password_hash({password!r}), role="user"))
+        db.session.commit()
+"""
+    run_in_service(AUTH_DIR, code, service_env(database_url))
+    return username, password
+
+
+def prepare_file_db(database_url: str, extra_env: dict = None):
+    code = """
+from app import app
+from db import db
+with app.app_context():
+    db.create_all()
+"""
+    run_in_service(FILE_DIR, code, service_env(database_url, extra_env))
+
+
+def rebuild_file_stats(database_url: str) -> str:
+    """Recomputes file-service's storage analytics after rows were written around the ORM."""
+    code = """
+import json
+from app import app
+from storage_stats import rebuild
+with app.app_context():
+    print(json.dumps(rebuild()))
+"""
+    return run_in_service(FILE_DIR, code, service_env(database_url)).strip()
+
+
+class Service:
+    """gunicorn process for one service; use as a context manager."""
+
+    def __init__(self, service_dir: Path, database_url: str, gunicorn_env: dict = None,
+                 extra_env: dict = None, startup_timeout: float = 30):
+        self.service_dir = service_dir
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.env = service_env(database_url, extra_env)
+        self.env.update({
+            "GUNICORN_BIND": f"127.0.0.1:{self.port}",
+            "GUNICORN_ACCESS_LOG": "",
+        })
+        self.env.update(gunicorn_env or {})
+        self.startup_timeout = startup_timeout
+        self.proc = None
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+            cwd=self.service_dir, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"{self.service_dir.name} exited during startup")
+            try:
+                with urllib.request.urlopen(self.base_url + "/health", timeout=1) as r:
+                    if r.status == 200:
+                        return self
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"{self.service_dir.name} did not become healthy")
+
+    def __exit__(self, *exc):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+# ===== HTTP helpers (stdlib only) =====
+
+def http(method: str, url: str, body: bytes = None, headers: dict = None, timeout: float = 30):
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            return r.status, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def login(auth_url: str, username: str, password: str) -> str:
+    status, body = http(
+        "POST", auth_url + "/api/login",
+        json.dumps({"username": username, "password": password}).encode(),
+        {"Content-Type": "application/json"},
+    )
+    if status != 200:
+        raise RuntimeError(f"login failed: {status}")
+    return json.loads(body)["access_token"]
+
+
+def multipart_file(filename: str, content: bytes, content_type: str = "text/plain"):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def upload(file_url: str, token: str, content: bytes, filename: str = "bench.txt",
+           content_type: str = "text/plain", extra_headers: dict = None):
+    body, headers = multipart_file(filename, content, content_type)
+    headers["Authorization"] = f"Bearer {token}"
+    headers.update(extra_headers or {})
+    return http("POST", file_url + "/dashboard/upload", body, headers)
+
+
+# ===== Load driver =====
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(operation, concurrency: int = 8, duration_s: float = 10.0, requests: int = None):
+    """
+    Calls operation(worker_index, iteration) from `concurrency` threads until
+    duration_s has passed (or `requests` calls in total have been made).
+    operation returns True on success. Returns a summary dict.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.monotonic() + duration_s
+
+    def worker(index):
+        iteration = 0
+        while time.monotonic() < deadline:
+            with lock:
+                if requests is not None and issued[0] >= requests:
+                    return
+                issued[0] += 1
+            start = time.perf_counter()
+            try:
+                ok = operation(index, iteration)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+            iteration += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    return summarize(latencies, errors[0], wall, concurrency)
+
+
+def summarize(latencies, errors: int, wall_s: float, concurrency: int) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(ordered) / wall_s, 2) if wall_s else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
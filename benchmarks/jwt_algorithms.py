@@ -0,0 +1,93 @@
+"""
+JWT sign / verify benchmark.
+
+Measures ops/sec for each algorithm auth-service can sign with, using
+freshly generated keys. Run it on the deployment machine and pick
+JWT_ALGORITHM from the numbers (file-service verifies on every request).
+
+Usage:
+    python benchmarks/jwt_algorithms.py
+    python benchmarks/jwt_algorithms.py --seconds 2 --json
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, UTC
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+ALGORITHMS = ["HS256", "ES256", "RS256", "EdDSA"]
+
+
+def make_keys(alg):
+    if alg == "HS256":
+        secret = "benchmark-secret-" + "x" * 32
+        return secret, secret
+    if alg == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    elif alg == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif alg == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Unknown algorithm: {alg}")
+    return private_key, private_key.public_key()
+
+
+def _ops_per_sec(fn, seconds):
+    # Warm up once, then run until the time budget is spent
+    fn()
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def bench_algorithm(alg, seconds):
+    private_key, public_key = make_keys(alg)
+    # Same claims shape as auth-service login tokens
+    payload = {
+        "sub": "12345",
+        "role": "user",
+        "exp": datetime.now(UTC) + timedelta(hours=1),
+    }
+    token = jwt.encode(payload, private_key, algorithm=alg)
+
+    sign = _ops_per_sec(lambda: jwt.encode(payload, private_key, algorithm=alg), seconds)
+    verify = _ops_per_sec(lambda: jwt.decode(token, public_key, algorithms=[alg]), seconds)
+
+    return {
+        "algorithm": alg,
+        "sign_ops_per_sec": round(sign, 1),
+        "verify_ops_per_sec": round(verify, 1),
+        "token_bytes": len(token),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JWT sign/verify benchmark")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per operation")
+    parser.add_argument("--algorithms", nargs="+", default=ALGORITHMS, choices=ALGORITHMS)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [bench_algorithm(alg, args.seconds) for alg in args.algorithms]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'algorithm':<10} {'sign ops/s':>12} {'verify ops/s':>14} {'token bytes':>12}")
+    for r in results:
+        print(
+            f"{r['algorithm']:<10} {r['sign_ops_per_sec']:>12,.0f} "
+            f"{r['verify_ops_per_sec']:>14,.0f} {r['token_bytes']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
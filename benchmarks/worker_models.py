@@ -0,0 +1,103 @@
+"""
+Compare gunicorn worker models on the login, upload and download paths.
+
+Starts auth-service and file-service under gunicorn once per worker model
+(sync, gthread, and gevent if installed) against throwaway SQLite databases
+and a temp UPLOAD_DIR, then drives each path at a fixed concurrency.
+
+Usage:
+    python benchmarks/worker_models.py
+    python benchmarks/worker_models.py --models gthread gevent --workers 4 --concurrency 32
+    python benchmarks/worker_models.py --file-db-url postgresql+psycopg2://... --json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import tempfile
+
+from harness import (
+    AUTH_DIR, FILE_DIR, Service, http, login, prepare_auth_db, prepare_file_db,
+    run_load, upload,
+)
+
+MODELS = ["sync", "gthread", "gevent"]
+
+
+def bench_model(model, args, workdir):
+    auth_db = args.auth_db_url or f"sqlite:///{os.path.join(workdir, f'auth-{model}.db')}"
+    file_db = args.file_db_url or f"sqlite:///{os.path.join(workdir, f'file-{model}.db')}"
+    upload_dir = os.path.join(workdir, f"uploads-{model}")
+
+    username, password = prepare_auth_db(auth_db)
+    prepare_file_db(file_db)
+
+    gunicorn_env = {
+        "GUNICORN_WORKER_CLASS": model,
+        "GUNICORN_WORKERS": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads if model == "gthread" else 1),
+    }
+    payload = b"x" * args.upload_bytes
+    results = {}
+
+    with Service(AUTH_DIR, auth_db, gunicorn_env) as auth, \
+            Service(FILE_DIR, file_db, gunicorn_env, {"UPLOAD_DIR": upload_dir}) as files:
+        token = login(auth.base_url, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def do_login(i, n):
+            return bool(login(auth.base_url, username, password))
+
+        def do_upload(i, n):
+            return upload(files.base_url, token, payload)[0] == 201
+
+        status, body = upload(files.base_url, token, payload)
+        file_id = json.loads(body)["file"]["id"]
+
+        def do_download(i, n):
+            return http("GET", f"{files.base_url}/dashboard/download/{file_id}", headers=headers)[0] == 200
+
+        for name, op in (("login", do_login), ("upload", do_upload), ("download", do_download)):
+            results[name] = run_load(op, args.concurrency, args.duration)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gunicorn worker model benchmark")
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--threads", type=int, default=4, help="threads per gthread worker")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per path")
+    parser.add_argument("--upload-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--auth-db-url", help="default: temp SQLite file")
+    parser.add_argument("--file-db-url", help="default: temp SQLite file")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    models = [m for m in args.models if m != "gevent" or importlib.util.find_spec("gevent")]
+    skipped = sorted(set(args.models) - set(models))
+
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="bench-workers-") as workdir:
+        for model in models:
+            report[model] = bench_model(model, args, workdir)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    if skipped:
+        print(f"skipped (not installed): {', '.join(skipped)}")
+    print(f"{'model':<8} {'path':<9} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for model, paths in report.items():
+        for path, r in paths.items():
+            print(
+                f"{model:<8} {path:<9} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.1f} "
+                f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
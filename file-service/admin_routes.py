@@ -0,0 +1,343 @@
+# admin_routes.py
+# Admin-only diagnostics. Every feature is off unless enabled in config, and
+# answers 404 while off so the surface isn't discoverable.
+import os
+import threading
+from flask import Blueprint, Response, current_app, g, jsonify, request, send_from_directory
+from auth import get_authenticated_admin_id
+from profiling import FORMATS, StackSampler, profile_for, render, save_profile
+from memory_profiling import GROUP_BY, MemoryTracker, sample_gauges
+from sqlalchemy import func, select
+from db import db
+from models import UserStorageUsage, ContentTypeStorageUsage, DailyStorageGrowth
+from storage_stats import pending, refresh
+from workers import PeriodicWorker, run_in_each_worker
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+# one process-wide profile at a time
+_PROFILE_LOCK = threading.Lock()
+
+
+def _admin_or_error(feature: str):
+    """None if the caller may use the feature, else the error response."""
+    if not current_app.config.get(feature):
+        return jsonify({"error": "Not found"}), 404
+    if get_authenticated_admin_id(request) is None:
+        return jsonify({"error": "Forbidden"}), 403
+    return None
+
+
+def _format_arg(value):
+    fmt = (value or "collapsed").strip().lower()
+    if fmt in ("1", "true", "yes"):
+        return "collapsed"
+    return fmt if fmt in FORMATS else None
+
+
+# ===== CPU profiling =====
+
+def _save_profile(prefix: str, fmt: str, body: str):
+    """(filename, None), or (None, error response) when PROFILE_DIR can't be written."""
+    try:
+        return save_profile(current_app.config["PROFILE_DIR"], prefix, fmt, body), None
+    except OSError as e:
+        print("Saving profile failed:", e)
+        error = jsonify({"error": "Could not save the profile to PROFILE_DIR"})
+        error.status_code = 507
+        return None, error
+
+
+@admin_bp.post("/profile/cpu")
+def profile_cpu():
+    """
+    Samples every thread in this worker for ?seconds= (default 10, capped by
+    PROFILING_MAX_SECONDS) and returns the profile (?format=collapsed|speedscope).
+    """
+    error = _admin_or_error("PROFILING_ENABLED")
+    if error:
+        return error
+
+    fmt = _format_arg(request.args.get("format"))
+    if fmt is None:
+        return jsonify({"error": f"format must be one of {sorted(FORMATS)}"}), 400
+    try:
+        seconds = float(request.args.get("seconds", "10"))
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    seconds = max(0.1, min(seconds, current_app.config["PROFILING_MAX_SECONDS"]))
+
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        return jsonify({"error": "A profile is already running"}), 409
+    try:
+        sampler = profile_for(seconds, current_app.config["PROFILING_INTERVAL_SECONDS"])
+    finally:
+        _PROFILE_LOCK.release()
+
+    body, mimetype = render(sampler, fmt, f"file-service cpu {seconds:g}s")
+    filename, error = _save_profile("cpu", fmt, body)
+    if error:
+        return error
+    return Response(body, mimetype=mimetype, headers={
+        "X-Profile-File": filename,
+        "Content-Disposition": f"attachment; filename={filename}",
+    })
+
+
+@admin_bp.get("/profiles")
+def list_profiles():
+    error = _admin_or_error("PROFILING_ENABLED")
+    if error:
+        return error
+    profile_dir = current_app.config["PROFILE_DIR"]
+    names = sorted(os.listdir(profile_dir)) if os.path.isdir(profile_dir) else []
+    return jsonify({"profiles": names}), 200
+
+
+@admin_bp.get("/profiles/<name>")
+def download_profile(name: str):
+    error = _admin_or_error("PROFILING_ENABLED")
+    if error:
+        return error
+    # send_from_directory rejects names that escape PROFILE_DIR
+    return send_from_directory(os.path.abspath(current_app.config["PROFILE_DIR"]), name, as_attachment=True)
+
+
+def init_request_profiling(app) -> None:
+    """
+    Single-request profiling: an admin adds `X-Profile: collapsed|speedscope`
+    (or ?profile=...) and gets the profile of that request instead of its body.
+    The original status is returned in X-Profiled-Status. For anyone else the
+    flag is ignored.
+    """
+    if not app.config.get("PROFILING_ENABLED"):
+        return
+
+    @app.before_request
+    def _start_request_profile():
+        flag = request.headers.get("X-Profile") or request.args.get("profile")
+        if not flag:
+            return
+        fmt = _format_arg(flag)
+        if fmt is None or get_authenticated_admin_id(request) is None:
+            return
+        g._profile = (fmt, StackSampler(
+            interval_s=current_app.config["PROFILING_INTERVAL_SECONDS"],
+            thread_ids={threading.get_ident()},
+        ).start())
+
+    @app.after_request
+    def _finish_request_profile(response):
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return response
+        fmt, sampler = profile
+        sampler.stop()
+
+        body, mimetype = render(sampler, fmt, f"file-service {request.method} {request.path}")
+        status = response.status_code
+        response.close()
+        filename, error = _save_profile("request", fmt, body)
+        if error:
+            error.headers["X-Profiled-Status"] = str(status)
+            return error
+        return Response(body, mimetype=mimetype, headers={
+            "X-Profile-File": filename,
+            "X-Profiled-Status": str(status),
+        })
+
+
+# ===== Memory (tracemalloc) =====
+
+def _tracker() -> MemoryTracker:
+    return current_app.extensions["memory_tracker"]
+
+
+def _int_arg(name: str, default: int, low: int, high: int):
+    try:
+        return max(low, min(int(request.args.get(name, default)), high))
+    except ValueError:
+        return None
+
+
+@admin_bp.get("/memory")
+def memory_status():
+    error = _admin_or_error("MEMORY_PROFILING_ENABLED")
+    if error:
+        return error
+    return jsonify({"pid": os.getpid(), **_tracker().status()}), 200
+
+
+@admin_bp.post("/memory/start")
+def memory_start():
+    """Starts tracemalloc, keeping ?frames= (default 1) frames per allocation."""
+    error = _admin_or_error("MEMORY_PROFILING_ENABLED")
+    if error:
+        return error
+    frames = _int_arg("frames", 1, 1, 50)
+    if frames is None:
+        return jsonify({"error": "frames must be an integer"}), 400
+    _tracker().start(frames)
+    return jsonify({"pid": os.getpid(), **_tracker().status()}), 200
+
+
+@admin_bp.post("/memory/stop")
+def memory_stop():
+    error = _admin_or_error("MEMORY_PROFILING_ENABLED")
+    if error:
+        return error
+    _tracker().stop()
+    return jsonify({"pid": os.getpid(), **_tracker().status()}), 200
+
+
+@admin_bp.post("/memory/snapshots")
+def memory_snapshot():
+    """Takes a snapshot and returns its id plus the top allocation sites."""
+    error = _admin_or_error("MEMORY_PROFILING_ENABLED")
+    if error:
+        return error
+    group_by = request.args.get("group_by", "lineno")
+    limit = _int_arg("limit", 25, 1, 500)
+    if group_by not in GROUP_BY or limit is None:
+        return jsonify({"error": f"group_by must be one of {list(GROUP_BY)}, limit an integer"}), 400
+    try:
+        snapshot_id = _tracker().take_snapshot()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({
+        "pid": os.getpid(),
+        "id": snapshot_id,
+        "top": _tracker().top(snapshot_id, group_by, limit),
+    }), 201
+
+
+@admin_bp.get("/memory/snapshots")
+def memory_snapshots():
+    error = _admin_or_error("MEMORY_PROFILING_ENABLED")
+    if error:
+        return error
+    return jsonify({"pid": os.getpid(), "snapshots": _tracker().list_snapshots()}), 200
+
+
+@admin_bp.get("/memory/diff")
+def memory_diff():
+    """?from=<id>&to=<id>: allocation sites that grew the most between the two snapshots."""
+    error = _admin_or_error("MEMORY_PROFILING_ENABLED")
+    if error:
+        return error
+    group_by = request.args.get("group_by", "lineno")
+    limit = _int_arg("limit", 25, 1, 500)
+    try:
+        from_id, to_id = int(request.args["from"]), int(request.args["to"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "from and to must be snapshot ids"}), 400
+    if group_by not in GROUP_BY or limit is None:
+        return jsonify({"error": f"group_by must be one of {list(GROUP_BY)}, limit an integer"}), 400
+    try:
+        sites = _tracker().diff(from_id, to_id, group_by, limit)
+    except KeyError as e:
+        return jsonify({"error": f"Unknown snapshot {e.args[0]}"}), 404
+    return jsonify({"pid": os.getpid(), "from": from_id, "to": to_id, "sites": sites}), 200
+
+
+def init_memory_profiling(app) -> None:
+    """
+    Registers the tracker and keeps the memory gauge thread running in each
+    worker. Does nothing (no thread, no tracemalloc) while disabled.
+    """
+    if not app.config.get("MEMORY_PROFILING_ENABLED"):
+        return
+
+    app.extensions["memory_tracker"] = MemoryTracker(max_snapshots=app.config["MEMORY_MAX_SNAPSHOTS"])
+    if not app.config["ENABLE_METRICS"]:
+        return
+    run_in_each_worker(app, PeriodicWorker(
+        "memory-gauges", app.config["MEMORY_GAUGE_INTERVAL_SECONDS"], sample_gauges, delay_first=False,
+    ))
+
+
+# ===== Storage analytics (aggregates maintained by storage_stats.py) =====
+
+def _usage(row) -> dict:
+    return {"files": row.files, "bytes": row.bytes, "stored_bytes": row.stored_bytes}
+
+
+@admin_bp.get("/storage")
+def storage_summary():
+    error = _admin_or_error("STORAGE_STATS_ENABLED")
+    if error:
+        return error
+    files, size, stored, types = db.session.execute(select(
+        func.coalesce(func.sum(ContentTypeStorageUsage.files), 0),
+        func.coalesce(func.sum(ContentTypeStorageUsage.bytes), 0),
+        func.coalesce(func.sum(ContentTypeStorageUsage.stored_bytes), 0),
+        func.count(),
+    )).one()
+    users = db.session.execute(select(func.count()).select_from(UserStorageUsage)).scalar()
+    return jsonify({
+        "files": files, "bytes": size, "stored_bytes": stored,
+        "users": users, "content_types": types,
+        # changes not yet folded into the numbers above
+        "pending_changes": pending(),
+    })
+
+
+@admin_bp.get("/storage/users")
+def storage_top_users():
+    """?limit= (default 20): users with the most bytes."""
+    error = _admin_or_error("STORAGE_STATS_ENABLED")
+    if error:
+        return error
+    limit = _int_arg("limit", 20, 1, 1000)
+    if limit is None:
+        return jsonify({"error": "limit must be an integer"}), 400
+    rows = db.session.execute(
+        select(UserStorageUsage).order_by(UserStorageUsage.bytes.desc(), UserStorageUsage.owner_user_id).limit(limit)
+    ).scalars()
+    return jsonify({"users": [{"user_id": r.owner_user_id, **_usage(r)} for r in rows]})
+
+
+@admin_bp.get("/storage/content-types")
+def storage_by_content_type():
+    error = _admin_or_error("STORAGE_STATS_ENABLED")
+    if error:
+        return error
+    rows = db.session.execute(
+        select(ContentTypeStorageUsage).order_by(ContentTypeStorageUsage.bytes.desc())
+    ).scalars()
+    return jsonify({"content_types": [{"content_type": r.content_type, **_usage(r)} for r in rows]})
+
+
+@admin_bp.get("/storage/growth")
+def storage_growth():
+    """?days= (default 30): files / bytes added and removed per day, oldest first."""
+    error = _admin_or_error("STORAGE_STATS_ENABLED")
+    if error:
+        return error
+    days = _int_arg("days", 30, 1, 3660)
+    if days is None:
+        return jsonify({"error": "days must be an integer"}), 400
+    rows = db.session.execute(
+        select(DailyStorageGrowth).order_by(DailyStorageGrowth.day.desc()).limit(days)
+    ).scalars().all()
+    return jsonify({"days": [
+        {
+            "day": r.day.isoformat(),
+            "files_added": r.files_added, "bytes_added": r.bytes_added,
+            "files_removed": r.files_removed, "bytes_removed": r.bytes_removed,
+            "net_bytes": r.bytes_added - r.bytes_removed,
+        }
+        for r in reversed(rows)
+    ]})
+
+
+@admin_bp.post("/storage/refresh")
+def storage_refresh():
+    """Folds pending changes into the aggregates now instead of waiting for the refresher."""
+    error = _admin_or_error("STORAGE_STATS_ENABLED")
+    if error:
+        return error
+    applied = 0
+    while (n := refresh()) > 0:
+        applied += n
+    return jsonify({"applied": applied})
@@ -1,8 +1,50 @@
 import os
+import time
+from functools import lru_cache
 import jwt
 from jwt.exceptions import PyJWTError
+from metrics import observe, JWT_DECODE_SECONDS
+from tracing import start_span
 
-def get_authenticated_user_id(request):
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Must match the algorithm auth-service signs with (JWT_ALGORITHM)
+PUBLIC_KEY_FILES = {
+    "ES256": "ec_public.pem",
+    "RS256": "rsa_public.pem",
+    "EdDSA": "ed25519_public.pem",
+}
+
+@lru_cache(maxsize=8)
+def _read_public_key(path: str) -> bytes:
+    # Cached so we don't hit the disk on every request
+    with open(path, "rb") as f:
+        return f.read()
+
+def _verification_key(alg: str):
+    if alg == "HS256":
+        secret = os.getenv("JWT_SECRET")
+        if secret:
+            return secret
+        # the default is in the repo: accepting it outside tests lets anyone forge tokens
+        if os.getenv("TESTING") == "true":
+            return "test-secret"
+        print("JWT_SECRET not set for HS256")
+        return None
+
+    if alg not in PUBLIC_KEY_FILES:
+        print("Unsupported JWT_ALGORITHM:", alg)
+        return None
+
+    path = os.getenv("JWT_PUBLIC_KEY_PATH") or os.path.join(BASE_DIR, PUBLIC_KEY_FILES[alg])
+    try:
+        return _read_public_key(path)
+    except FileNotFoundError:
+        print(f"{os.path.basename(path)} not found")
+        return None
+
+def get_authenticated_claims(request):
+    """Verified JWT payload from the Authorization header, or None."""
     auth = request.headers.get("Authorization", "")
     if not auth.startswith("Bearer "):
         return None
@@ -16,29 +58,48 @@ def get_authenticated_user_id(request):
 
     if testing:
         alg = "HS256"
-        key = os.getenv("JWT_SECRET", "test-secret")
-        options = {"require": ["exp"]}
     else:
-        alg = "ES256"
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        PUBLIC_KEY_PATH = os.path.join(BASE_DIR, "ec_public.pem")
-        try:
-            with open(PUBLIC_KEY_PATH, "rb") as f:
-                key = f.read()
-        except FileNotFoundError:
-            print("ec_public.pem not found")
-            return None
-        options = {"require": ["exp"]}
+        alg = os.getenv("JWT_ALGORITHM", "ES256").strip()
 
-    try:
-        payload = jwt.decode(token, key, algorithms=[alg], options=options)
-    except PyJWTError as e:
-        print("JWT decode failed:", e)
+    key = _verification_key(alg)
+    if key is None:
         return None
+    options = {"require": ["exp"]}
+
+    start = time.perf_counter()
+    with start_span("jwt.decode", algorithm=alg) as span:
+        try:
+            payload = jwt.decode(token, key, algorithms=[alg], options=options)
+        except PyJWTError as e:
+            observe(JWT_DECODE_SECONDS, time.perf_counter() - start, outcome="invalid")
+            span.set_attribute("jwt.outcome", "invalid")
+            print("JWT decode failed:", e)
+            return None
+    observe(JWT_DECODE_SECONDS, time.perf_counter() - start, outcome="ok")
+    return payload
 
+def _user_id(payload):
     user_id = payload.get("sub")
     if isinstance(user_id, int):
         return user_id
     if isinstance(user_id, str) and user_id.isdigit():
         return int(user_id)
     return None
+
+def get_authenticated_user_id(request):
+    payload = get_authenticated_claims(request)
+    if payload is None:
+        return None
+    return _user_id(payload)
+
+def get_authenticated_admin_id(request):
+    """User id if the token belongs to an admin (role claim set by auth-service), else None."""
+    payload = get_authenticated_claims(request)
+    if payload is None or payload.get("role") != "admin":
+        return None
+    return _user_id(payload)
+
+def is_internal_caller(request) -> bool:
+    """Service token minted by auth-service (role "service") or an admin token."""
+    payload = get_authenticated_claims(request)
+    return payload is not None and payload.get("role") in ("service", "admin")
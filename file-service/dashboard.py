@@ -1,24 +1,33 @@
 import os
-from models import File
+from flask import current_app
+from sqlalchemy import select, update
+from models import File, BlobDeletion
 from db import db
+from replicas import read_all, read_first, mark_write
+from tracing import start_span
 
 def get_files_for_user(user_id: int):
     """
     Business logic for the dashboard.
     Given a user_id, return ONLY the files owned by that user.
 
+    Read-only, so it may be served by a read replica.
+
     Returns:
         List[File] (SQLAlchemy model objects)
     """
 
-    return File.query.filter_by(owner_user_id=user_id).all()
+    return read_all(select(File).filter_by(owner_user_id=user_id), user_id)
 
 
-def get_owned_file_or_none(user_id: int, file_id: int):
+def get_owned_file_or_none(user_id: int, file_id: int, use_replica: bool = False):
     """
     Return the file only if it exists AND is owned by user.
     Returns None otherwise (prevents file-id probing)
+    use_replica=True allows a read replica (read-only callers only).
     """
+    if use_replica:
+        return read_first(select(File).filter_by(id=file_id, owner_user_id=user_id), user_id)
     return File.query.filter_by(id=file_id, owner_user_id=user_id).first()
 
 def delete_file_for_user(user_id: int, file_id: int) -> bool:
@@ -27,25 +36,58 @@ def delete_file_for_user(user_id: int, file_id: int) -> bool:
     Returns True if deleted, False if not found/not owned.
     """
 
-    f = get_owned_file_or_none(user_id, file_id)
-    if not f:
-        return False
-    
-    # Try deleting from disk first
+    for _ in range(3):
+        f = get_owned_file_or_none(user_id, file_id)
+        if not f:
+            return False
+        seen_path = f.storage_path
+
+        # Claim the row at the path we read: a rebalance (volumes.move_file) may have
+        # repointed it meanwhile, then read it again. The no-op update also holds the
+        # row until commit, so a move that starts now can't repoint it either.
+        claimed = db.session.execute(
+            update(File).where(File.id == f.id, File.storage_path == seen_path).values(storage_path=seen_path)
+        ).rowcount
+        if claimed == 1:
+            break
+        db.session.rollback()
+    else:
+        raise RuntimeError(f"file {file_id} kept moving while being deleted")
+
+    # Packed entries are reclaimed by pack compaction. Nothing is removed from a
+    # volume in read-only maintenance: the blob is queued for the reaper (purge.py),
+    # which removes it once the volume is writable again.
+    volumes = current_app.extensions.get("volumes")
+    volume = volumes.get(f.volume) if volumes is not None and f.volume else None
+    readonly = f.pack_id is None and volume is not None and volume.state == "readonly"
+    if readonly:
+        db.session.add(BlobDeletion(file_id=f.id, storage_path=seen_path, volume=f.volume))
+    remove_blob = f.pack_id is None and not readonly and seen_path
+
+    db.session.delete(f)
+    db.session.commit()
+    mark_write(user_id)
+
+    # the row is gone, so nothing can point at the blob any more
     try:
-        if f.storage_path and os.path.exists(f.storage_path):
-            os.remove(f.storage_path)
+        if remove_blob and os.path.exists(seen_path):
+            with start_span("disk.delete"):
+                os.remove(seen_path)
     except OSError:
-        # Can use RAISE if strict behaviour, for now still proceed to remove DB record
+        # Can use RAISE if strict behaviour, for now the DB record is already removed
         pass
 
-    db.session.delete(f)
-    db.session.commit()
+    cache = current_app.extensions.get("file_cache")
+    if cache is not None:
+        cache.invalidate(file_id)
+    thumbnails = current_app.extensions.get("thumbnails")
+    if thumbnails is not None:
+        thumbnails.remove(file_id)
     return True
 
 def get_file_for_download(user_id: int, file_id: int):
     """
     Returns the File object if owned; otherwise None.
     """
-    return get_owned_file_or_none(user_id, file_id)
+    return get_owned_file_or_none(user_id, file_id, use_replica=True)
 
@@ -0,0 +1,138 @@
+# db_pool.py
+# Connection pool settings (from env) + pool metrics for Prometheus
+import os
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from prometheus_client import Counter, Gauge, Histogram
+
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to obtain a pooled DB connection (queue wait, new connects, pre-ping)",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Pool checkouts that failed because the pool was exhausted",
+    ["pool"],
+)
+# Updated on pool events (not at scrape time) so they also work with
+# multiprocess metrics; livesum = total over live workers
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["pool"], multiprocess_mode="livesum")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size", ["pool"], multiprocess_mode="livesum")
+POOL_SIZE = Gauge("db_pool_size", "Configured pool_size", ["pool"], multiprocess_mode="livesum")
+
+
+def _env_bool(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "y")
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout takes."""
+
+    metrics_name = "default"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.labels(pool=self.metrics_name).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(pool=self.metrics_name).observe(time.perf_counter() - start)
+
+    def recreate(self):
+        # dispose() swaps in a new pool; keep the label
+        new_pool = super().recreate()
+        new_pool.metrics_name = self.metrics_name
+        return new_pool
+
+
+def engine_options_from_env(database_uri: str, timed_pool: bool = False) -> dict:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the given URI, from env:
+    - DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE (seconds)
+    - DB_POOL_PRE_PING (default true)
+    - DB_STATEMENT_TIMEOUT_MS (Postgres only, 0 = off)
+    - DB_PGBOUNCER=true: don't send startup options and don't rely on
+      prepared statements (PgBouncer transaction pooling)
+    SQLite gets no pool sizing (Flask-SQLAlchemy picks its own pool for it).
+    """
+    url = make_url(database_uri)
+    if url.get_backend_name() == "sqlite":
+        return {}
+
+    options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", "true"),
+    }
+    if timed_pool:
+        options["poolclass"] = TimedQueuePool
+
+    connect_args = {}
+    pgbouncer = _env_bool("DB_PGBOUNCER")
+    statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+    if url.get_backend_name() == "postgresql":
+        if statement_timeout_ms and not pgbouncer:
+            # Set once per server connection
+            connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+        if pgbouncer and url.get_driver_name() == "psycopg":
+            # psycopg 3 prepares repeated statements by default
+            connect_args["prepare_threshold"] = None
+
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def configure_engine(engine) -> None:
+    """
+    Engine hooks that can't be expressed as create_engine options.
+    In PgBouncer mode the statement timeout is applied per transaction
+    (SET LOCAL), because server connections are shared between clients.
+    """
+    if engine.url.get_backend_name() != "postgresql" or not _env_bool("DB_PGBOUNCER"):
+        return
+
+    statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+    if not statement_timeout_ms:
+        return
+
+    @event.listens_for(engine, "begin")
+    def _set_local_timeout(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {statement_timeout_ms}")
+
+
+# ===== Pool gauges =====
+
+def track_engine_pool(engine, name: str = "primary") -> None:
+    """Expose this engine's pool on /metrics under the given label."""
+    if isinstance(engine.pool, TimedQueuePool):
+        engine.pool.metrics_name = name
+
+    checked_out = POOL_CHECKED_OUT.labels(pool=name)
+
+    def _on_checkout(*args):
+        checked_out.inc()
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            POOL_OVERFLOW.labels(pool=name).set(max(pool.overflow(), 0))
+
+    def _on_checkin(*args):
+        # fires before the connection is back in the pool, so count it ourselves
+        checked_out.dec()
+
+    event.listen(engine, "checkout", _on_checkout)
+    event.listen(engine, "checkin", _on_checkin)
+
+    checked_out.set(0)
+    if isinstance(engine.pool, QueuePool):
+        POOL_SIZE.labels(pool=name).set(engine.pool.size())
@@ -0,0 +1,172 @@
+# dedupe.py
+# Rate-limit state for runtime notifications ("did we already email about this key recently?")
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from metrics import inc, set_gauge, NOTIFY_DEDUPE_EVICTIONS, NOTIFY_DEDUPE_KEYS
+
+
+class MemoryDedupeStore:
+    """
+    Per-process store, bounded by max_keys.
+    Keys are kept in last-sent order, so expired keys are always at the front
+    and can be evicted in O(1) each; when full, the oldest key is evicted.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._last_sent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def should_send(self, key: str, window_s: float, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict_expired(now - window_s)
+
+            last = self._last_sent.get(key)
+            if last is not None and now - last < window_s:
+                return False
+
+            self._last_sent[key] = now
+            self._last_sent.move_to_end(key)
+
+            while len(self._last_sent) > self.max_keys:
+                self._last_sent.popitem(last=False)
+                inc(NOTIFY_DEDUPE_EVICTIONS, reason="capacity")
+
+            set_gauge(NOTIFY_DEDUPE_KEYS, len(self._last_sent))
+            return True
+
+    def _evict_expired(self, cutoff: float):
+        while self._last_sent:
+            key, last = next(iter(self._last_sent.items()))
+            if last > cutoff:
+                break
+            del self._last_sent[key]
+            inc(NOTIFY_DEDUPE_EVICTIONS, reason="expired")
+
+    def __len__(self):
+        return len(self._last_sent)
+
+
+class SQLiteDedupeStore:
+    """
+    Shared store for several worker processes on one host (one SQLite file in WAL mode).
+    The check-and-set is a single UPSERT, so only one process wins per window.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, max_keys: int = 100000):
+        self.path = path
+        self.max_keys = max_keys
+        self._local = threading.local()
+        self._ops = 0
+        self._max_window_s = 0.0
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS notify_dedupe ("
+            " key TEXT PRIMARY KEY,"
+            " last_sent REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_notify_dedupe_last_sent ON notify_dedupe(last_sent)")
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def should_send(self, key: str, window_s: float, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        self._max_window_s = max(self._max_window_s, window_s)
+        conn = self._conn()
+        cur = conn.execute(
+            "INSERT INTO notify_dedupe(key, last_sent) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET last_sent = excluded.last_sent "
+            "WHERE notify_dedupe.last_sent <= ?",
+            (key, now, now - window_s),
+        )
+        conn.commit()
+
+        self._ops += 1
+        if self._ops % self.PRUNE_EVERY == 0:
+            self.prune(now)
+
+        return cur.rowcount == 1
+
+    def prune(self, now: float = None):
+        now = time.time() if now is None else now
+        conn = self._conn()
+        expired = conn.execute(
+            "DELETE FROM notify_dedupe WHERE last_sent <= ?",
+            (now - self._max_window_s,),
+        ).rowcount
+        over = conn.execute(
+            "DELETE FROM notify_dedupe WHERE key IN ("
+            " SELECT key FROM notify_dedupe ORDER BY last_sent DESC LIMIT -1 OFFSET ?)",
+            (self.max_keys,),
+        ).rowcount
+        conn.commit()
+
+        if expired:
+            inc(NOTIFY_DEDUPE_EVICTIONS, expired, reason="expired")
+        if over:
+            inc(NOTIFY_DEDUPE_EVICTIONS, over, reason="capacity")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM notify_dedupe").fetchone()[0]
+
+
+class RedisDedupeStore:
+    """
+    Shared store across hosts. Uses SET NX PX, so Redis expires keys itself.
+    Works with any Redis-compatible server (or fakeredis in tests).
+    """
+
+    def __init__(self, client, prefix: str = "notify:dedupe:"):
+        self.client = client
+        self.prefix = prefix
+
+    def should_send(self, key: str, window_s: float, now: float = None) -> bool:
+        if window_s <= 0:
+            return True
+        now = time.time() if now is None else now
+        return bool(self.client.set(self.prefix + key, now, nx=True, px=int(window_s * 1000)))
+
+
+def create_dedupe_store():
+    """
+    Builds the store from env:
+    - NOTIFY_DEDUPE_BACKEND: memory (default) | sqlite | redis
+    - NOTIFY_DEDUPE_MAX_KEYS: bound for memory / sqlite
+    - NOTIFY_DEDUPE_SQLITE_PATH / NOTIFY_DEDUPE_REDIS_URL
+    """
+    backend = os.getenv("NOTIFY_DEDUPE_BACKEND", "memory").strip().lower()
+    max_keys = int(os.getenv("NOTIFY_DEDUPE_MAX_KEYS", "10000"))
+
+    if backend == "sqlite":
+        path = os.getenv("NOTIFY_DEDUPE_SQLITE_PATH", "notify_dedupe.sqlite3")
+        return SQLiteDedupeStore(path, max_keys=max_keys)
+
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("NOTIFY_DEDUPE_BACKEND=redis requires the 'redis' package") from e
+        url = os.getenv("NOTIFY_DEDUPE_REDIS_URL", "redis://localhost:6379/0")
+        return RedisDedupeStore(redis.Redis.from_url(url))
+
+    if backend != "memory":
+        raise RuntimeError(f"Unknown NOTIFY_DEDUPE_BACKEND: {backend}")
+
+    return MemoryDedupeStore(max_keys=max_keys)
@@ -0,0 +1,84 @@
+# digest.py
+# Counts notifications that were suppressed by rate limiting, so they can be
+# summarised in one periodic email instead of being silently dropped.
+import time
+import threading
+from datetime import datetime, timezone
+
+OVERFLOW_KEY = "*other*"
+
+
+class DigestAggregator:
+    """
+    Per (event_type, dedupe_key): [count, first_ts, last_ts].
+    - record() is O(1)
+    - at most max_keys distinct keys; further keys are folded into
+      (event_type, OVERFLOW_KEY) so memory stays bounded
+    """
+
+    def __init__(self, window_s: float = 300, max_keys: int = 1000):
+        self.window_s = window_s
+        self.max_keys = max_keys
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+
+    def record(self, event_type: str, dedupe_key: str = "", now: float = None) -> None:
+        now = time.time() if now is None else now
+        key = (event_type, dedupe_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_keys:
+                    key = (event_type, OVERFLOW_KEY)
+                    entry = self._entries.get(key)
+                if entry is None:
+                    self._entries[key] = [1, now, now]
+                    return
+            entry[0] += 1
+            entry[2] = now
+
+    def take_if_due(self, now: float = None, force: bool = False):
+        """
+        Returns and resets the collected entries once the window has elapsed
+        (or immediately with force=True, e.g. at shutdown).
+        Returns None if the window is still open or nothing was suppressed.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if not force and now - self._window_start < self.window_s:
+                return None
+            self._window_start = now
+            if not self._entries:
+                return None
+            entries, self._entries = self._entries, {}
+        return entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def format_digest(entries: dict, max_lines: int = 50):
+    """
+    Builds (subject, body) for one digest email, busiest keys first.
+    """
+    total = sum(e[0] for e in entries.values())
+    rows = sorted(entries.items(), key=lambda item: item[1][0], reverse=True)
+
+    subject = f"Digest: {total} suppressed events ({len(entries)} keys)"
+
+    lines = [f"suppressed_total={total} keys={len(entries)}"]
+    for (event_type, dedupe_key), (count, first, last) in rows[:max_lines]:
+        lines.append(
+            f"event={event_type} key={dedupe_key or '-'} count={count} "
+            f"first={_iso(first)} last={_iso(last)}"
+        )
+    if len(rows) > max_lines:
+        rest = sum(e[0] for _, e in rows[max_lines:])
+        lines.append(f"... {len(rows) - max_lines} more keys, {rest} events")
+
+    return subject, "\n".join(lines)
@@ -0,0 +1,91 @@
+# file_cache.py
+# Per-worker LRU cache of small files' stored bytes, for hot downloads.
+# Entries are keyed by file id and only used if the row still describes the
+# same stored object (storage path, pack offset, stored size), so a file that
+# was moved, compacted or replaced is simply a miss. Ownership is always
+# checked against the DB before the cache is consulted.
+import threading
+from collections import OrderedDict
+from metrics import inc, set_gauge, DOWNLOAD_CACHE_REQUESTS, DOWNLOAD_CACHE_BYTES, DOWNLOAD_CACHE_ENTRIES, DOWNLOAD_CACHE_EVICTIONS
+
+
+def stored_size(f) -> int:
+    if f.pack_id is not None:
+        return f.pack_length
+    return f.stored_size_bytes if f.stored_size_bytes is not None else f.size_bytes
+
+
+def validator(f):
+    return f.storage_path, f.pack_offset, stored_size(f)
+
+
+class FileCache:
+    """
+    Byte-budgeted LRU: at most max_bytes of file contents, and only files of
+    at most max_file_bytes (larger ones are cheaper to stream than to copy).
+    """
+
+    def __init__(self, max_bytes: int, max_file_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries = OrderedDict()  # file id -> (validator, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def cacheable(self, f) -> bool:
+        return stored_size(f) <= self.max_file_bytes
+
+    def get(self, f):
+        """Cached stored bytes of this file row, or None."""
+        with self._lock:
+            entry = self._entries.get(f.id)
+            if entry is not None and entry[0] == validator(f):
+                self._entries.move_to_end(f.id)
+                inc(DOWNLOAD_CACHE_REQUESTS, result="hit")
+                return entry[1]
+            if entry is not None:
+                # row now points elsewhere (moved / compacted / id reused)
+                self._remove(f.id)
+        inc(DOWNLOAD_CACHE_REQUESTS, result="miss")
+        return None
+
+    def put(self, f, data: bytes) -> None:
+        if len(data) > self.max_file_bytes or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(f.id)
+            self._entries[f.id] = (validator(f), data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                file_id, _ = next(iter(self._entries.items()))
+                self._remove(file_id)
+                inc(DOWNLOAD_CACHE_EVICTIONS)
+            self._update_gauges()
+
+    def invalidate(self, file_id: int) -> None:
+        with self._lock:
+            self._remove(file_id)
+            self._update_gauges()
+
+    def _remove(self, file_id):
+        entry = self._entries.pop(file_id, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _update_gauges(self):
+        set_gauge(DOWNLOAD_CACHE_BYTES, self._bytes)
+        set_gauge(DOWNLOAD_CACHE_ENTRIES, len(self._entries))
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def init_file_cache(app) -> None:
+    """Registers app.extensions["file_cache"] when DOWNLOAD_CACHE_BYTES > 0."""
+    if app.config.get("DOWNLOAD_CACHE_BYTES", 0) <= 0:
+        return
+    app.extensions["file_cache"] = FileCache(app.config["DOWNLOAD_CACHE_BYTES"], app.config["DOWNLOAD_CACHE_MAX_FILE_BYTES"])
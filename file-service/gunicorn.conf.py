@@ -0,0 +1,84 @@
+# gunicorn.conf.py
+# Production server for file-service:  gunicorn -c gunicorn.conf.py app:app
+# Every setting can be overridden with a GUNICORN_* env var.
+import os
+import multiprocessing
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+CPU_COUNT = multiprocessing.cpu_count()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5002")
+
+# Uploads / downloads spend most of their time waiting on disk and the DB,
+# so default to threaded workers. "gevent" is also supported (pip install gevent).
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = _env_int("GUNICORN_WORKERS", str(CPU_COUNT * 2 + 1))
+threads = _env_int("GUNICORN_THREADS", "4" if worker_class == "gthread" else "1")
+worker_connections = _env_int("GUNICORN_WORKER_CONNECTIONS", "1000")  # gevent only
+
+# A user's next request usually lands on another worker, so the read-your-writes
+# markers for read replicas must be shared between workers (see replicas.py)
+raw_env = []
+if workers > 1 and "DB_REPLICA_STICKY_BACKEND" not in os.environ:
+    raw_env.append("DB_REPLICA_STICKY_BACKEND=sqlite")
+
+# Load the app once in the master, then fork (faster start, shared memory)
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Graceful shutdown / hung worker handling
+timeout = _env_int("GUNICORN_TIMEOUT", "60")
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", "30")
+keepalive = _env_int("GUNICORN_KEEPALIVE", "5")
+
+# Recycle workers periodically to cap slow memory growth
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", "2000")
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", "200")
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None  # empty = disabled
+errorlog = "-"
+
+# ===== Multiprocess metrics =====
+# With PROMETHEUS_MULTIPROC_DIR set, every worker writes its metrics to mmap files
+# in that directory. The master serves the aggregate on METRICS_PORT (and /metrics
+# on any worker returns the same aggregate).
+METRICS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_PORT = _env_int("METRICS_PORT", "9102")
+
+def _reset_metrics_dir():
+    # Runs when the config is loaded, i.e. before the app is preloaded and starts writing.
+    # Files from a previous run would be summed into the new totals.
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(".db"):
+            os.remove(os.path.join(METRICS_DIR, name))
+
+if METRICS_DIR:
+    _reset_metrics_dir()
+
+def when_ready(server):
+    if not METRICS_DIR or not METRICS_PORT:
+        return
+    from prometheus_client import start_http_server
+    from metrics import multiprocess_registry
+
+    start_http_server(METRICS_PORT, registry=multiprocess_registry())
+
+def child_exit(server, worker):
+    if not METRICS_DIR:
+        return
+    # Drop the dead worker's live gauges (counters/histograms are kept so totals don't go backwards)
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid, METRICS_DIR)
+
+def post_fork(server, worker):
+    # With preload the master may have opened DB connections; a forked worker must
+    # not reuse those sockets, so drop the inherited pool (without closing it for the parent)
+    from app import app
+    from db import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
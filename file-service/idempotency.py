@@ -0,0 +1,204 @@
+# idempotency.py
+# Idempotency-Key header for state-changing endpoints (upload, delete). A client
+# that retries after a timeout sends the same key and gets the first response
+# back instead of a second File row / disk write.
+#
+# Keys are scoped to the authenticated user and stored in idempotency_keys with
+# a fingerprint of the request (method, path, body) and, once finished, the
+# response. While the first request is in flight the row has no response and
+# retries get 409; a row left behind by a crashed request is taken over after
+# IDEMPOTENCY_LOCK_SECONDS. 5xx responses are not stored so the client can retry.
+# Expired keys (IDEMPOTENCY_TTL_SECONDS) are pruned in batches by a per-worker
+# thread, or with `flask idempotency prune`.
+import functools
+import hashlib
+import json
+from datetime import datetime, timedelta
+import click
+from flask import current_app, jsonify, make_response, request
+from flask.cli import AppGroup
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from db import db
+from models import IdempotencyKey
+from auth import get_authenticated_user_id
+from metrics import inc, IDEMPOTENCY_REQUESTS, IDEMPOTENCY_KEYS_PRUNED
+from workers import PeriodicWorker, run_in_each_worker
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+FORM_MIMETYPES = {"multipart/form-data", "application/x-www-form-urlencoded"}
+
+
+def request_fingerprint(req) -> str:
+    """sha256 of method, path and body; uploaded files are hashed from their streams, which are rewound."""
+    h = hashlib.sha256(f"{req.method} {req.path}\0".encode())
+    if req.mimetype in FORM_MIMETYPES:
+        for name, value in sorted(req.form.items(multi=True)):
+            h.update(f"form\0{name}\0{value}\0".encode())
+        for name, storage in sorted(req.files.items(multi=True), key=lambda item: item[0]):
+            h.update(f"file\0{name}\0{storage.filename}\0{storage.content_type}\0".encode())
+            while chunk := storage.stream.read(1024 * 1024):
+                h.update(chunk)
+            storage.stream.seek(0)
+    else:
+        h.update(req.get_data(cache=True))
+    return h.hexdigest()
+
+
+def _claim(owner_user_id: int, key: str, fingerprint: str, ttl_s: float, lock_s: float):
+    """
+    (row, True) when this request now owns the key, or (existing row, False).
+    Expired rows and in-flight rows older than lock_s are taken over.
+    """
+    for _ in range(3):
+        now = datetime.utcnow()
+        row = IdempotencyKey(
+            owner_user_id=owner_user_id, key=key, fingerprint=fingerprint,
+            created_at=now, expires_at=now + timedelta(seconds=ttl_s),
+        )
+        db.session.add(row)
+        try:
+            db.session.commit()
+            return row, True
+        except IntegrityError:
+            db.session.rollback()  # the unique (owner, key) constraint is the lock
+
+        existing = IdempotencyKey.query.filter_by(owner_user_id=owner_user_id, key=key).first()
+        if existing is None:
+            continue  # pruned or released in between
+        abandoned = existing.response_status is None and existing.created_at <= now - timedelta(seconds=lock_s)
+        if existing.expires_at > now and not abandoned:
+            return existing, False
+        # by id: of several retries taking over, one insert wins and the rest loop
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == existing.id))
+        db.session.commit()
+        if existing in db.session:
+            db.session.expunge(existing)
+    return IdempotencyKey.query.filter_by(owner_user_id=owner_user_id, key=key).first(), False
+
+
+def _release(row: IdempotencyKey, row_id: int) -> None:
+    """Forgets the key so the client can retry (the view failed)."""
+    db.session.rollback()
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == row_id))
+    db.session.commit()
+    if row in db.session:
+        db.session.expunge(row)
+
+
+def _replay(existing: IdempotencyKey):
+    response = current_app.response_class(
+        existing.response_body, status=existing.response_status, mimetype=existing.response_content_type,
+    )
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def idempotent(view):
+    """Honours an Idempotency-Key header on the view; requests without one are unaffected."""
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        user_id = get_authenticated_user_id(request)
+        if not user_id:
+            return view(*args, **kwargs)  # the view answers 401, nothing to remember
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters"}), 400
+
+        fingerprint = request_fingerprint(request)
+        row, owned = _claim(
+            user_id, key, fingerprint,
+            current_app.config["IDEMPOTENCY_TTL_SECONDS"], current_app.config["IDEMPOTENCY_LOCK_SECONDS"],
+        )
+        if not owned:
+            if row is not None and row.fingerprint != fingerprint:
+                inc(IDEMPOTENCY_REQUESTS, result="mismatch")
+                return jsonify({"error": f"{IDEMPOTENCY_HEADER} was already used for a different request"}), 422
+            if row is not None and row.response_status is not None:
+                inc(IDEMPOTENCY_REQUESTS, result="replayed")
+                return _replay(row)
+            inc(IDEMPOTENCY_REQUESTS, result="in_progress")
+            response = jsonify({"error": f"A request with this {IDEMPOTENCY_HEADER} is in progress"})
+            response.headers["Retry-After"] = "1"
+            return response, 409
+
+        row_id = row.id
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            _release(row, row_id)
+            raise
+        if response.status_code >= 500:
+            _release(row, row_id)
+            return response
+
+        # by statement: the view's commits expired `row`, and a takeover may have removed it
+        db.session.execute(
+            update(IdempotencyKey).where(IdempotencyKey.id == row_id).values(
+                response_status=response.status_code,
+                response_body=response.get_data(as_text=True),
+                response_content_type=response.mimetype,
+            )
+        )
+        db.session.commit()
+        inc(IDEMPOTENCY_REQUESTS, result="stored")
+        return response
+
+    return wrapper
+
+
+def prune(batch_size: int = 1000) -> int:
+    """Deletes up to batch_size expired keys (needs an app context). Returns rows deleted."""
+    ids = db.session.execute(
+        select(IdempotencyKey.id)
+        .where(IdempotencyKey.expires_at <= datetime.utcnow())
+        .order_by(IdempotencyKey.expires_at)
+        .limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        db.session.rollback()
+        return 0
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+    db.session.commit()
+    inc(IDEMPOTENCY_KEYS_PRUNED, len(ids))
+    return len(ids)
+
+
+def prune_all(batch_size: int = 1000) -> int:
+    """Prunes batch by batch until no expired keys are left; short transactions keep locks brief."""
+    pruned = 0
+    while (n := prune(batch_size)) > 0:
+        pruned += n
+        if n < batch_size:
+            break
+    return pruned
+
+
+def register_cli(app) -> None:
+    """`flask idempotency prune`"""
+    group = AppGroup("idempotency", help="Stored Idempotency-Key responses.")
+
+    @group.command("prune")
+    def prune_cmd():
+        """Delete expired keys now instead of waiting for the pruner."""
+        click.echo(json.dumps({"pruned": prune_all(app.config["IDEMPOTENCY_PRUNE_BATCH_SIZE"])}))
+
+    app.cli.add_command(group)
+
+
+def init_idempotency(app) -> None:
+    """Registers the CLI and, if IDEMPOTENCY_PRUNE_INTERVAL_SECONDS > 0, the pruner thread in each worker."""
+    register_cli(app)
+    if app.config["IDEMPOTENCY_PRUNE_INTERVAL_SECONDS"] <= 0:
+        return
+
+    batch_size = app.config["IDEMPOTENCY_PRUNE_BATCH_SIZE"]
+    run_in_each_worker(app, PeriodicWorker(
+        "idempotency-pruner", app.config["IDEMPOTENCY_PRUNE_INTERVAL_SECONDS"], lambda: prune_all(batch_size), app=app,
+    ))
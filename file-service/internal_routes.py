@@ -0,0 +1,24 @@
+# internal_routes.py
+# Service-to-service endpoints. Callers authenticate with a short-lived token
+# signed by auth-service (role "service"); admin tokens are accepted too.
+from flask import Blueprint, current_app, jsonify, request
+from auth import is_internal_caller
+from purge import purge_owner
+
+internal_bp = Blueprint("internal", __name__, url_prefix="/internal")
+
+
+@internal_bp.post("/owners/<int:owner_user_id>/purge")
+def purge_owner_files(owner_user_id: int):
+    """
+    Deletes the owner's files for up to PURGE_MAX_SECONDS. Idempotent:
+    "done": false means there is more to delete, so call again.
+    """
+    if not is_internal_caller(request):
+        return jsonify({"error": "Forbidden"}), 403
+    stats = purge_owner(
+        owner_user_id,
+        batch_size=current_app.config["PURGE_BATCH_SIZE"],
+        max_seconds=current_app.config["PURGE_MAX_SECONDS"],
+    )
+    return jsonify({"owner_user_id": owner_user_id, **stats}), 200
@@ -0,0 +1,141 @@
+# memory_profiling.py
+# Allocation tracking (tracemalloc snapshots + diffs) and periodic process memory gauges.
+# tracemalloc is only started on request (it slows allocations down noticeably),
+# and the gauge thread only runs when MEMORY_PROFILING_ENABLED is set.
+import gc
+import os
+import threading
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime, timezone
+from metrics import set_gauge, PROCESS_RSS_BYTES, GC_OBJECTS, GC_COLLECTIONS, GC_PENDING, TRACEMALLOC_TRACED_BYTES
+
+GROUP_BY = ("lineno", "filename", "traceback")
+
+# allocations made by the profiler itself (including the gauge thread's
+# gc.get_objects() list) are noise
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _site(stat, group_by: str) -> str:
+    if group_by == "traceback":
+        return " <- ".join(f"{f.filename}:{f.lineno}" for f in reversed(stat.traceback))
+    frame = stat.traceback[0]
+    return frame.filename if group_by == "filename" else f"{frame.filename}:{frame.lineno}"
+
+
+class MemoryTracker:
+    """
+    Keeps the last max_snapshots tracemalloc snapshots of this process, by id.
+    Snapshot ids are per process; with several gunicorn workers each one
+    has its own tracker, so start / snapshot / diff must hit the same worker.
+    """
+
+    def __init__(self, max_snapshots: int = 5):
+        self.max_snapshots = max_snapshots
+        self._snapshots = OrderedDict()  # id -> (taken_at, snapshot)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        """Stops tracking and frees the traces (kept snapshots stay usable)."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        set_gauge(TRACEMALLOC_TRACED_BYTES, 0)
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        return {
+            "tracing": self.tracing,
+            "frames": tracemalloc.get_traceback_limit() if self.tracing else 0,
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "snapshots": self.list_snapshots(),
+        }
+
+    def take_snapshot(self) -> int:
+        if not self.tracing:
+            raise RuntimeError("tracemalloc is not running; start tracking first")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = (datetime.now(timezone.utc), snapshot)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def list_snapshots(self):
+        with self._lock:
+            return [
+                {"id": sid, "taken_at": taken_at.isoformat(), "traces": len(snap.traces)}
+                for sid, (taken_at, snap) in self._snapshots.items()
+            ]
+
+    def _get(self, snapshot_id: int):
+        with self._lock:
+            entry = self._snapshots.get(snapshot_id)
+        if entry is None:
+            raise KeyError(snapshot_id)
+        return entry[1]
+
+    def top(self, snapshot_id: int, group_by: str = "lineno", limit: int = 25):
+        stats = self._get(snapshot_id).statistics(group_by)
+        return [
+            {"site": _site(s, group_by), "size_bytes": s.size, "count": s.count}
+            for s in stats[:limit]
+        ]
+
+    def diff(self, from_id: int, to_id: int, group_by: str = "lineno", limit: int = 25):
+        """Allocation sites that grew the most between two snapshots (largest size change first)."""
+        stats = self._get(to_id).compare_to(self._get(from_id), group_by)
+        return [
+            {
+                "site": _site(s, group_by),
+                "size_diff_bytes": s.size_diff,
+                "count_diff": s.count_diff,
+                "size_bytes": s.size,
+                "count": s.count,
+            }
+            for s in stats[:limit]
+        ]
+
+
+# ===== Periodic gauges =====
+
+def read_rss_bytes():
+    """Current resident set size (Linux /proc), or None where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def sample_gauges(count_objects: bool = True) -> None:
+    rss = read_rss_bytes()
+    if rss is not None:
+        set_gauge(PROCESS_RSS_BYTES, rss)
+    for generation, pending in enumerate(gc.get_count()):
+        set_gauge(GC_PENDING, pending, generation=str(generation))
+    for generation, stats in enumerate(gc.get_stats()):
+        set_gauge(GC_COLLECTIONS, stats["collections"], generation=str(generation))
+    if count_objects:
+        # walks every tracked object, hence only on the sampler thread
+        set_gauge(GC_OBJECTS, len(gc.get_objects()))
+    if tracemalloc.is_tracing():
+        set_gauge(TRACEMALLOC_TRACED_BYTES, tracemalloc.get_traced_memory()[0])
@@ -0,0 +1,217 @@
+# metrics.py
+# Hot-path Prometheus metrics for file-service.
+# Labels are kept to small fixed sets (no user ids, file ids or paths).
+# When ENABLE_METRICS is false, set_enabled(False) turns every helper here into a no-op.
+import os
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+_ENABLED = True
+
+SIZE_BUCKETS = (1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+UPLOAD_BYTES = Histogram("file_upload_bytes", "Size of accepted uploads", ["content_type"], buckets=SIZE_BUCKETS)
+DOWNLOAD_BYTES = Histogram("file_download_bytes", "Size of served downloads", ["content_type"], buckets=SIZE_BUCKETS)
+DISK_WRITE_SECONDS = Histogram("file_disk_write_seconds", "Time writing upload data to disk", buckets=FAST_BUCKETS)
+FSYNC_SECONDS = Histogram("file_fsync_seconds", "Time spent in fsync for uploads", buckets=FAST_BUCKETS)
+DB_QUERY_SECONDS = Histogram("file_db_query_seconds", "DB statement execution time", ["operation"], buckets=FAST_BUCKETS)
+JWT_DECODE_SECONDS = Histogram("file_jwt_decode_seconds", "JWT verification time", ["outcome"], buckets=FAST_BUCKETS)
+NOTIFY_SEND_SECONDS = Histogram("file_notify_send_seconds", "Time delivering one notification batch", ["outcome"], buckets=SLOW_BUCKETS)
+# Gauges use livesum so multi-worker deployments report the total over live workers
+UPLOADS_IN_FLIGHT = Gauge("file_uploads_in_flight", "Uploads currently being processed", multiprocess_mode="livesum")
+NOTIFY_QUEUE_DEPTH = Gauge("file_notify_queue_depth", "Notifications waiting to be sent", multiprocess_mode="livesum")
+NOTIFY_MESSAGES = Counter("file_notify_messages", "Notification worker message counts", ["state"])
+# Memory gauges, refreshed periodically only when MEMORY_PROFILING_ENABLED (see memory_profiling.py).
+# Per worker (liveall) because RSS creep shows up in individual workers.
+PROCESS_RSS_BYTES = Gauge("file_process_rss_bytes", "Resident set size of this worker", multiprocess_mode="liveall")
+GC_OBJECTS = Gauge("file_gc_objects", "Objects tracked by the garbage collector", multiprocess_mode="liveall")
+GC_COLLECTIONS = Gauge("file_gc_collections", "GC runs since start, by generation", ["generation"], multiprocess_mode="liveall")
+GC_PENDING = Gauge("file_gc_pending", "Allocations counted towards the next collection, by generation", ["generation"], multiprocess_mode="liveall")
+TRACEMALLOC_TRACED_BYTES = Gauge("file_tracemalloc_traced_bytes", "Memory traced by tracemalloc (0 when not tracking)", multiprocess_mode="liveall")
+# Small-file packs (see packs.py)
+PACK_COMPACTIONS = Counter("file_pack_compactions", "Pack compaction passes")
+PACK_RECLAIMED_BYTES = Counter("file_pack_reclaimed_bytes", "Dead pack bytes reclaimed by compaction")
+# Hot-file download cache (see file_cache.py); hit ratio = hit / (hit + miss)
+DOWNLOAD_CACHE_REQUESTS = Counter("file_download_cache_requests", "Download cache lookups", ["result"])
+DOWNLOAD_CACHE_EVICTIONS = Counter("file_download_cache_evictions", "Entries evicted to stay within DOWNLOAD_CACHE_BYTES")
+DOWNLOAD_CACHE_BYTES = Gauge("file_download_cache_bytes", "Bytes held in the download cache", multiprocess_mode="livesum")
+DOWNLOAD_CACHE_ENTRIES = Gauge("file_download_cache_entries", "Files held in the download cache", multiprocess_mode="livesum")
+# Thumbnails (see thumbnails.py): hit = served from disk, rendered = this request rendered it,
+# coalesced = joined a render already in progress
+THUMBNAIL_REQUESTS = Counter("file_thumbnail_requests", "Thumbnail lookups", ["result"])
+THUMBNAIL_RENDER_SECONDS = Histogram("file_thumbnail_render_seconds", "Time rendering one thumbnail", buckets=SLOW_BUCKETS)
+# Owner purges (see purge.py)
+FILES_PURGED = Counter("file_purged_files", "File rows deleted by owner purges")
+BLOBS_REAPED = Counter("file_reaped_blobs", "Purged files whose blob / thumbnails were removed from disk")
+# Idempotency-Key handling (see idempotency.py)
+IDEMPOTENCY_REQUESTS = Counter("file_idempotency_requests", "Requests carrying an Idempotency-Key", ["result"])
+IDEMPOTENCY_KEYS_PRUNED = Counter("file_idempotency_keys_pruned", "Expired idempotency keys deleted")
+# Notification dedupe state (see dedupe.py); reason: expired | capacity
+NOTIFY_DEDUPE_EVICTIONS = Counter("file_notify_dedupe_evictions", "Notification dedupe keys evicted from local state", ["reason"])
+NOTIFY_DEDUPE_KEYS = Gauge("file_notify_dedupe_keys", "Notification dedupe keys currently tracked in this process", multiprocess_mode="livesum")
+
+for _result in ("hit", "miss"):
+    DOWNLOAD_CACHE_REQUESTS.labels(result=_result)
+for _result in ("hit", "rendered", "coalesced"):
+    THUMBNAIL_REQUESTS.labels(result=_result)
+for _result in ("stored", "replayed", "in_progress", "mismatch"):
+    IDEMPOTENCY_REQUESTS.labels(result=_result)
+for _reason in ("expired", "capacity"):
+    NOTIFY_DEDUPE_EVICTIONS.labels(reason=_reason)
+
+KNOWN_CONTENT_TYPES = {"text/plain", "image/png"}
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def set_enabled(enabled: bool) -> None:
+    global _ENABLED
+    _ENABLED = enabled
+
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+
+def content_type_label(content_type) -> str:
+    return content_type if content_type in KNOWN_CONTENT_TYPES else "other"
+
+
+def inc(metric, amount=1, **labels) -> None:
+    if not _ENABLED:
+        return
+    (metric.labels(**labels) if labels else metric).inc(amount)
+
+
+def set_gauge(metric, value, **labels) -> None:
+    if not _ENABLED:
+        return
+    (metric.labels(**labels) if labels else metric).set(value)
+
+
+def observe(metric, value, **labels) -> None:
+    if not _ENABLED:
+        return
+    (metric.labels(**labels) if labels else metric).observe(value)
+
+
+@contextmanager
+def timed(metric, **labels):
+    if not _ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        (metric.labels(**labels) if labels else metric).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_in_flight(gauge):
+    if not _ENABLED:
+        yield
+        return
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+# ===== SQLAlchemy engine events =====
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine) -> None:
+    """Times every statement on this engine (only call when metrics are enabled)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_query_start")
+        if starts:
+            observe(DB_QUERY_SECONDS, time.perf_counter() - starts.pop(), operation=_operation(statement))
+
+
+# ===== Scrape-time gauges =====
+
+class UploadVolumeCollector:
+    """
+    Free / total bytes of the filesystems holding the upload volumes
+    (statvfs, read at scrape time). Without STORAGE_VOLUMES that is just
+    UPLOAD_DIR, reported as volume="default".
+    """
+
+    def __init__(self):
+        self.upload_dir = None
+        self.volumes = None  # [(name, path)], set by volumes.init_volumes
+
+    def describe(self):
+        # Don't let registration call collect()
+        return []
+
+    def collect(self):
+        if not _ENABLED:
+            return
+        volumes = self.volumes or ([("default", self.upload_dir)] if self.upload_dir else [])
+        total = GaugeMetricFamily("file_upload_volume_bytes_total", "Size of the uploads volume", labels=["volume"])
+        free = GaugeMetricFamily("file_upload_volume_bytes_free", "Free space on the uploads volume", labels=["volume"])
+        for name, path in volumes:
+            if not os.path.isdir(path):
+                continue
+            st = os.statvfs(path)
+            total.add_metric([name], st.f_blocks * st.f_frsize)
+            free.add_metric([name], st.f_bavail * st.f_frsize)
+        yield total
+        yield free
+
+
+UPLOAD_VOLUME = UploadVolumeCollector()
+REGISTRY.register(UPLOAD_VOLUME)
+
+
+# ===== Multiprocess mode (several gunicorn workers) =====
+
+def multiprocess_dir():
+    """PROMETHEUS_MULTIPROC_DIR if set: metrics are written to shared mmap files there."""
+    return os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+def multiprocess_registry(include_worker_files: bool = True) -> CollectorRegistry:
+    """
+    Registry that aggregates every worker's metric files, plus the scrape-time
+    volume gauge (which is the same for all workers).
+    prometheus_flask_exporter adds its own MultiProcessCollector, so pass
+    include_worker_files=False for the registry handed to it.
+    """
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    if include_worker_files:
+        multiprocess.MultiProcessCollector(registry, path=multiprocess_dir())
+    registry.register(UPLOAD_VOLUME)
+    return registry
+
+
+def init_metrics(app) -> None:
+    """Applies app.config["ENABLE_METRICS"] (call inside app context after db.init_app)."""
+    from db import db
+
+    set_enabled(app.config["ENABLE_METRICS"])
+    if not app.config["ENABLE_METRICS"]:
+        return
+
+    UPLOAD_VOLUME.upload_dir = app.config["UPLOAD_DIR"]
+    for engine in db.engines.values():
+        instrument_engine(engine)
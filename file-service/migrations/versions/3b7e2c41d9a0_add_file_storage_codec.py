@@ -0,0 +1,29 @@
+"""add file storage codec
+
+Revision ID: 3b7e2c41d9a0
+Revises: 059392a25378
+Create Date: 2026-10-19 10:12:03.418220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e2c41d9a0'
+down_revision = '059392a25378'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nullable: existing rows are stored raw (NULL codec, stored size = size_bytes)
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('storage_codec', sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column('stored_size_bytes', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_column('stored_size_bytes')
+        batch_op.drop_column('storage_codec')
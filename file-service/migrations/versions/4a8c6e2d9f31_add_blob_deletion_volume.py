@@ -0,0 +1,27 @@
+"""add blob deletion volume
+
+Revision ID: 4a8c6e2d9f31
+Revises: 9b2d7e4f6a18
+Create Date: 2026-10-20 09:41:52.207315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a8c6e2d9f31'
+down_revision = '9b2d7e4f6a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # blobs deleted while their volume was read-only wait here until it is writable again
+    with op.batch_alter_table('pending_blob_deletions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('volume', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('pending_blob_deletions', schema=None) as batch_op:
+        batch_op.drop_column('volume')
@@ -0,0 +1,33 @@
+"""add file pack location
+
+Revision ID: 8f4d1a6c2e57
+Revises: 3b7e2c41d9a0
+Create Date: 2026-10-19 14:31:52.907113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f4d1a6c2e57'
+down_revision = '3b7e2c41d9a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL pack_id = the file has its own file at storage_path (every existing row)
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pack_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('pack_offset', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('pack_length', sa.BigInteger(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_files_pack_id'), ['pack_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_files_pack_id'))
+        batch_op.drop_column('pack_length')
+        batch_op.drop_column('pack_offset')
+        batch_op.drop_column('pack_id')
@@ -0,0 +1,29 @@
+"""add file volume
+
+Revision ID: c52a9e7d3f18
+Revises: 8f4d1a6c2e57
+Create Date: 2026-10-19 17:05:26.551904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52a9e7d3f18'
+down_revision = '8f4d1a6c2e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL = stored under UPLOAD_DIR before STORAGE_VOLUMES (see `flask volumes backfill`)
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('volume', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_files_volume'), ['volume'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_files_volume'))
+        batch_op.drop_column('volume')
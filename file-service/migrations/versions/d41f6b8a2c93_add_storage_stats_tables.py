@@ -0,0 +1,65 @@
+"""add storage stats tables
+
+Revision ID: d41f6b8a2c93
+Revises: c52a9e7d3f18
+Create Date: 2026-10-19 19:42:10.318274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f6b8a2c93'
+down_revision = 'c52a9e7d3f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # aggregates start empty: run `flask storage-stats rebuild` once after enabling STORAGE_STATS_ENABLED
+    op.create_table('storage_usage_deltas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_user_id', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('files', sa.Integer(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), nullable=False),
+    sa.Column('stored_bytes', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('storage_usage_by_user',
+    sa.Column('owner_user_id', sa.Integer(), nullable=False),
+    sa.Column('files', sa.Integer(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), nullable=False),
+    sa.Column('stored_bytes', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('owner_user_id')
+    )
+    with op.batch_alter_table('storage_usage_by_user', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_storage_usage_by_user_bytes'), ['bytes'], unique=False)
+
+    op.create_table('storage_usage_by_content_type',
+    sa.Column('content_type', sa.String(length=100), nullable=False),
+    sa.Column('files', sa.Integer(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), nullable=False),
+    sa.Column('stored_bytes', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('content_type')
+    )
+    op.create_table('storage_growth_by_day',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('files_added', sa.Integer(), nullable=False),
+    sa.Column('bytes_added', sa.BigInteger(), nullable=False),
+    sa.Column('files_removed', sa.Integer(), nullable=False),
+    sa.Column('bytes_removed', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+
+
+def downgrade():
+    op.drop_table('storage_growth_by_day')
+    op.drop_table('storage_usage_by_content_type')
+    with op.batch_alter_table('storage_usage_by_user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_storage_usage_by_user_bytes'))
+
+    op.drop_table('storage_usage_by_user')
+    op.drop_table('storage_usage_deltas')
@@ -0,0 +1,31 @@
+"""add pending blob deletions
+
+Revision ID: e7a93c15b4d2
+Revises: d41f6b8a2c93
+Create Date: 2026-10-19 21:10:44.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a93c15b4d2'
+down_revision = 'd41f6b8a2c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # blobs of purged files, removed from disk by the reaper (see purge.py)
+    op.create_table('pending_blob_deletions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('storage_path', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('pending_blob_deletions')
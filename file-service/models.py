@@ -12,4 +12,90 @@ class File(db.Model):
     content_type = db.Column(db.String(100), nullable=False)
     size_bytes = db.Column(db.BigInteger, nullable=False)
 
+    # at-rest compression (see storage_codec.py); NULL = stored as uploaded
+    storage_codec = db.Column(db.String(16), nullable=True)
+    stored_size_bytes = db.Column(db.BigInteger, nullable=True)
+
+    # storage volume holding the file (see volumes.py); NULL = UPLOAD_DIR / written before volumes
+    volume = db.Column(db.String(64), nullable=True, index=True)
+
+    # small files packed into a shared pack file (see packs.py); NULL = own file at storage_path
+    pack_id = db.Column(db.Integer, nullable=True, index=True)
+    pack_offset = db.Column(db.BigInteger, nullable=True)
+    pack_length = db.Column(db.BigInteger, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class BlobDeletion(db.Model):
+    """Blob (and thumbnails) of a deleted file, removed from disk by the background reaper (see purge.py)."""
+    __tablename__ = "pending_blob_deletions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, nullable=False)
+    # NULL = nothing to remove (packed entry)
+    storage_path = db.Column(db.String(500), nullable=True)
+    # storage volume of the blob; the reaper skips it while that volume is read-only
+    volume = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+# ===== Storage analytics (see storage_stats.py) =====
+
+class StorageUsageDelta(db.Model):
+    """One file added (+1) or removed (-1); folded into the aggregates below and then deleted."""
+    __tablename__ = "storage_usage_deltas"
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner_user_id = db.Column(db.Integer, nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    files = db.Column(db.Integer, nullable=False)
+    bytes = db.Column(db.BigInteger, nullable=False)
+    stored_bytes = db.Column(db.BigInteger, nullable=False)
+
+
+class UserStorageUsage(db.Model):
+    __tablename__ = "storage_usage_by_user"
+
+    owner_user_id = db.Column(db.Integer, primary_key=True)
+    files = db.Column(db.Integer, nullable=False, default=0)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0, index=True)
+    stored_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class ContentTypeStorageUsage(db.Model):
+    __tablename__ = "storage_usage_by_content_type"
+
+    content_type = db.Column(db.String(100), primary_key=True)
+    files = db.Column(db.Integer, nullable=False, default=0)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    stored_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class DailyStorageGrowth(db.Model):
+    __tablename__ = "storage_growth_by_day"
+
+    day = db.Column(db.Date, primary_key=True)
+    files_added = db.Column(db.Integer, nullable=False, default=0)
+    bytes_added = db.Column(db.BigInteger, nullable=False, default=0)
+    files_removed = db.Column(db.Integer, nullable=False, default=0)
+    bytes_removed = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class IdempotencyKey(db.Model):
+    """A client's Idempotency-Key and the response to replay for it (see idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (db.UniqueConstraint("owner_user_id", "key", name="uq_idempotency_keys_owner_key"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner_user_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    # sha256 of method, path and body: the same key for a different request is rejected
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # NULL while the first request is in flight
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    response_content_type = db.Column(db.String(100), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -1,56 +1,340 @@
 # notify.py
 import os
 import time
+import queue
+import atexit
 import smtplib
+import threading
 from email.message import EmailMessage
+from dedupe import create_dedupe_store
+from digest import DigestAggregator, format_digest
+from metrics import observe, inc, set_gauge, NOTIFY_SEND_SECONDS, NOTIFY_MESSAGES, NOTIFY_QUEUE_DEPTH
+from tracing import start_span
+from workers import ProcessThread
 
-# simple in-memory dedupe to prevent spam
-_LAST_SENT = {}
+# dedupe / rate-limit state to prevent spam (bounded; see dedupe.py)
+_DEDUPE = None
+_DEDUPE_LOCK = threading.Lock()
+
+# suppressed events, summarised in one digest email per window
+_DIGEST = None
 
 def _env_bool(name: str, default: str = "false") -> bool:
     return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "y")
 
+def _env_int(name: str, default: str) -> int:
+    return int(os.getenv(name, default))
+
+def _env_float(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
 def notify_event(event_type: str, subject: str, body: str, dedupe_key: str = "") -> None:
     """
     Runtime email notification. Safe defaults:
     - Does nothing if ENABLE_RUNTIME_EMAILS is false
-    - Rate-limits per event_type to avoid spamming
+    - Rate-limits per event_type to avoid spamming; suppressed events are
+      counted and sent later as one digest email
+    - Only enqueues; delivery happens on a background worker so the
+      request never waits on the mail server
     """
     if not _env_bool("ENABLE_RUNTIME_EMAILS", "false"):
         return
 
     rate_limit_s = int(os.getenv("EMAIL_RATE_LIMIT_SECONDS", "60"))
-    
+
     key = f"{event_type}:{dedupe_key}" if dedupe_key else event_type
 
-    now = time.time()
-    last = _LAST_SENT.get(key, 0)
-    if now - last < rate_limit_s:
+    if not _get_dedupe_store().should_send(key, rate_limit_s):
+        if _env_bool("NOTIFY_DIGEST_ENABLED", "true"):
+            _get_digest().record(event_type, dedupe_key)
+            # the worker thread flushes the digest; with a shared dedupe store (or
+            # after a fork) this process may not have submitted anything to start it
+            _get_worker().ensure_running()
         return
-    _LAST_SENT[key] = now
 
-    send_email_smtp(subject, body)
+    _get_worker().submit(subject, body)
 
-def send_email_smtp(subject: str, body: str) -> None:
-    smtp_user = os.getenv("SMTP_USERNAME")
-    smtp_pass = os.getenv("SMTP_PASSWORD")
+def _get_dedupe_store():
+    global _DEDUPE
+    if _DEDUPE is None:
+        with _DEDUPE_LOCK:
+            if _DEDUPE is None:
+                _DEDUPE = create_dedupe_store()
+    return _DEDUPE
+
+def _get_digest() -> DigestAggregator:
+    global _DIGEST
+    if _DIGEST is None:
+        with _DEDUPE_LOCK:
+            if _DIGEST is None:
+                _DIGEST = DigestAggregator(
+                    window_s=_env_float("NOTIFY_DIGEST_WINDOW_SECONDS", "300"),
+                    max_keys=_env_int("NOTIFY_DIGEST_MAX_KEYS", "1000"),
+                )
+    return _DIGEST
+
+def flush_digest(force: bool = False) -> bool:
+    """
+    Enqueues the digest email if the window has elapsed (or force=True).
+    Called from the worker loop; returns True if a digest was queued.
+    """
+    if _DIGEST is None:
+        return False
+    entries = _DIGEST.take_if_due(force=force)
+    if not entries:
+        return False
+    subject, body = format_digest(entries)
+    return _get_worker().submit(subject, body)
+
+# ===== Delivery =====
+
+def _smtp_settings() -> dict:
+    return {
+        "host": os.getenv("SMTP_HOST", "smtp.gmail.com"),
+        "port": _env_int("SMTP_PORT", "587"),
+        "starttls": _env_bool("SMTP_STARTTLS", "true"),
+        "timeout": _env_float("SMTP_TIMEOUT_SECONDS", "10"),
+        "username": os.getenv("SMTP_USERNAME"),
+        "password": os.getenv("SMTP_PASSWORD"),
+    }
+
+def build_message(subject: str, body: str):
+    """
+    Returns an EmailMessage, or None if email is not configured
+    (no recipient / sender) so callers can fail quietly.
+    """
     to_addr = os.getenv("RUNTIME_EMAIL_TO")
-    from_addr = os.getenv("EMAIL_FROM") or smtp_user
+    from_addr = os.getenv("EMAIL_FROM") or os.getenv("SMTP_USERNAME")
     service = os.getenv("SERVICE_NAME", "file-service")
     env = os.getenv("APP_ENV", "dev")
 
-    # Fail quietly (don’t break the API response) if not configured
-    if not (smtp_user and smtp_pass and to_addr):
-        return
+    if not (to_addr and from_addr):
+        return None
 
     msg = EmailMessage()
     msg["Subject"] = f"[{env}][{service}] {subject}"
     msg["From"] = from_addr
     msg["To"] = to_addr
     msg.set_content(body)
+    return msg
+
+class SMTPConnection:
+    """
+    Lazily opened SMTP session that is reused across batches.
+    Closed after SMTP_IDLE_SECONDS without traffic, or on error.
+    Shared by every worker in the process, so a send and an idle close never interleave.
+    """
+
+    def __init__(self):
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.RLock()
 
-    with smtplib.SMTP("smtp.gmail.com", 587, timeout=10) as server:
+    def _open(self):
+        settings = _smtp_settings()
+        server = smtplib.SMTP(settings["host"], settings["port"], timeout=settings["timeout"])
         server.ehlo()
-        server.starttls()
-        server.login(smtp_user, smtp_pass)
-        server.send_message(msg)
+        if settings["starttls"]:
+            server.starttls()
+            server.ehlo()
+        if settings["username"] and settings["password"]:
+            server.login(settings["username"], settings["password"])
+        return server
+
+    def send(self, msg: EmailMessage) -> None:
+        with self._lock:
+            if self._server is None:
+                self._server = self._open()
+            self._server.send_message(msg)
+            self._last_used = time.monotonic()
+
+    def close_if_idle(self) -> None:
+        idle_s = _env_float("SMTP_IDLE_SECONDS", "30")
+        with self._lock:
+            if self._server is not None and time.monotonic() - self._last_used >= idle_s:
+                self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._server is None:
+                return
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+_CONNECTION = SMTPConnection()
+
+class PartialDelivery(Exception):
+    """A batch failed after `sent` of its messages were delivered."""
+
+    def __init__(self, sent: int, error: Exception):
+        super().__init__(str(error))
+        self.sent = sent
+
+
+def deliver_batch(messages) -> None:
+    """
+    Sends a list of (subject, body) over the shared SMTP connection, in order.
+    Raises PartialDelivery on SMTP / network errors so the worker retries only
+    the messages that weren't sent.
+    """
+    for i, (subject, body) in enumerate(messages):
+        msg = build_message(subject, body)
+        if msg is None:
+            continue
+        try:
+            _CONNECTION.send(msg)
+        except (smtplib.SMTPException, OSError) as e:
+            # Drop the (possibly broken) session; the retry reconnects
+            _CONNECTION.close()
+            raise PartialDelivery(i, e) from e
+
+# ===== Background worker =====
+
+class NotificationWorker:
+    """
+    Bounded in-memory queue drained by a single daemon thread.
+    - submit() never blocks; when the queue is full the message is dropped and counted
+    - the thread groups queued messages into batches and hands them to deliver_batch
+    - failed batches are retried with exponential backoff, then dropped and counted
+    """
+
+    def __init__(self, max_queue=1000, batch_size=50, batch_wait_s=0.5,
+                 max_retries=3, backoff_s=1.0, on_tick=None):
+        self.batch_size = batch_size
+        self.batch_wait_s = batch_wait_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        # called from the worker thread on every loop (at least every batch_wait_s)
+        self.on_tick = on_tick
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._thread = ProcessThread("notify-worker", self._run)
+        self.stats = {"enqueued": 0, "sent": 0, "dropped": 0, "failed": 0, "retries": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[name] += n
+        inc(NOTIFY_MESSAGES, n, state=name)
+        set_gauge(NOTIFY_QUEUE_DEPTH, self._queue.qsize())
+
+    def submit(self, subject: str, body: str) -> bool:
+        self.ensure_running()
+        try:
+            self._queue.put_nowait((subject, body))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far has been handled. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def ensure_running(self) -> None:
+        self._thread.ensure_running()
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=self.batch_wait_s)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            if self.on_tick is not None:
+                try:
+                    self.on_tick()
+                except Exception as e:
+                    print("Notification worker tick failed:", e)
+
+            batch = self._next_batch()
+            if not batch:
+                _CONNECTION.close_if_idle()
+                continue
+            try:
+                self._deliver_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver_with_retry(self, batch):
+        pending = list(batch)
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                # worker thread: not part of any request, so each send is its own (sampled) trace
+                with start_span("smtp.send", kind="client", new_trace=True, messages=len(pending), attempt=attempt):
+                    deliver_batch(pending)
+                observe(NOTIFY_SEND_SECONDS, time.perf_counter() - start, outcome="ok")
+                self._count("sent", len(pending))
+                return
+            except Exception as e:
+                observe(NOTIFY_SEND_SECONDS, time.perf_counter() - start, outcome="error")
+                # messages sent before the failure are not sent again
+                delivered = e.sent if isinstance(e, PartialDelivery) else 0
+                if delivered:
+                    self._count("sent", delivered)
+                    pending = pending[delivered:]
+                if attempt == self.max_retries:
+                    print("Runtime email delivery failed:", e)
+                    self._count("failed", len(pending))
+                    return
+                self._count("retries")
+                time.sleep(self.backoff_s * (2 ** attempt))
+
+_WORKER = None
+_WORKER_LOCK = threading.Lock()
+
+def _get_worker() -> NotificationWorker:
+    global _WORKER
+    if _WORKER is None:
+        with _WORKER_LOCK:
+            if _WORKER is None:
+                _WORKER = NotificationWorker(
+                    max_queue=_env_int("NOTIFY_QUEUE_SIZE", "1000"),
+                    batch_size=_env_int("NOTIFY_BATCH_SIZE", "50"),
+                    batch_wait_s=_env_float("NOTIFY_BATCH_WAIT_SECONDS", "0.5"),
+                    max_retries=_env_int("NOTIFY_MAX_RETRIES", "3"),
+                    backoff_s=_env_float("NOTIFY_RETRY_BACKOFF_SECONDS", "1"),
+                    on_tick=flush_digest,
+                )
+    return _WORKER
+
+def flush(timeout: float = 5.0) -> bool:
+    """Block until queued notifications are delivered (tests / shutdown)."""
+    if _WORKER is None:
+        return True
+    return _WORKER.flush(timeout)
+
+def _shutdown():
+    flush_digest(force=True)
+    flush(5.0)
+
+atexit.register(_shutdown)
@@ -0,0 +1,252 @@
+# packs.py
+# Small-file packing: uploads below PACK_THRESHOLD_BYTES are appended to large
+# append-only pack files instead of getting a file (and an inode) each.
+# File rows point at (pack_id, pack_offset, pack_length); reads use os.pread.
+#
+# Each worker process appends to its own active pack and holds an exclusive
+# flock on it, so there is no cross-process write contention. A pack is never
+# appended to again once its writer moves on (size limit) or exits, and only
+# such unlocked packs are compacted.
+import fcntl
+import os
+import re
+import time
+import threading
+from sqlalchemy import func
+from db import db
+from models import File
+from metrics import inc, PACK_COMPACTIONS, PACK_RECLAIMED_BYTES
+from workers import PeriodicWorker, run_in_each_worker
+
+PACK_NAME = re.compile(r"^(\d{8})\.pack$")
+LAST_ID_FILE = "last_pack_id"
+
+
+def pack_path(pack_dir: str, pack_id: int) -> str:
+    return os.path.join(pack_dir, f"{pack_id:08d}.pack")
+
+
+def list_pack_ids(pack_dir: str):
+    try:
+        names = os.listdir(pack_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(int(m.group(1)) for m in map(PACK_NAME.match, names) if m)
+
+
+def _try_lock(fd) -> bool:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _next_pack_id(pack_dir: str) -> int:
+    """
+    Next id from the pack dir's high-water mark (LAST_ID_FILE, under flock).
+    Ids are never reused: a reader holding a stale row for a compacted pack
+    must get FileNotFoundError, not another pack's bytes at the same offset.
+    """
+    fd = os.open(os.path.join(pack_dir, LAST_ID_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        raw = os.pread(fd, 32, 0).strip()
+        # packs written before the high-water mark existed
+        pack_id = max(int(raw) if raw else 0, (list_pack_ids(pack_dir) or [0])[-1]) + 1
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, str(pack_id).encode(), 0)
+        os.fsync(fd)
+        return pack_id
+    finally:
+        os.close(fd)  # releases the flock
+
+
+def create_pack(pack_dir: str):
+    """Creates and locks a new, empty pack; returns (pack_id, fd)."""
+    os.makedirs(pack_dir, exist_ok=True)
+    pack_id = _next_pack_id(pack_dir)
+    while True:
+        try:
+            fd = os.open(pack_path(pack_dir, pack_id), os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            # another worker took this id
+            pack_id += 1
+            continue
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return pack_id, fd
+
+
+def read_entry(path: str, offset: int, length: int) -> bytes:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        data = os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
+    if len(data) != length:
+        raise OSError(f"short read from {os.path.basename(path)}: {len(data)} of {length} bytes")
+    return data
+
+
+class PackStore:
+    """Per-process writer for the active pack."""
+
+    def __init__(self, pack_dir: str, threshold_bytes: int = 64 * 1024, max_pack_bytes: int = 256 * 1024 ** 2):
+        self.pack_dir = pack_dir
+        self.threshold_bytes = threshold_bytes
+        self.max_pack_bytes = max_pack_bytes
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pack_id = None
+        self._fd = None
+        self._size = 0
+
+    def accepts(self, size: int) -> bool:
+        return size < self.threshold_bytes
+
+    def append(self, data: bytes, fsync: bool = True):
+        """Writes data to the active pack; returns (pack_id, offset, path)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked: the inherited fd shares the parent's lock, start a pack of our own
+                self._pid, self._fd, self._size = os.getpid(), None, 0
+            if self._fd is None or (self._size and self._size + len(data) > self.max_pack_bytes):
+                self._seal()
+                self._pack_id, self._fd = create_pack(self.pack_dir)
+                self._size = 0
+
+            offset = self._size
+            written = os.pwrite(self._fd, data, offset)
+            if written != len(data):
+                raise OSError(f"short write to pack {self._pack_id}")
+            if fsync:
+                os.fsync(self._fd)
+            self._size += len(data)
+            return self._pack_id, offset, pack_path(self.pack_dir, self._pack_id)
+
+    def _seal(self):
+        if self._fd is not None:
+            os.close(self._fd)  # releases the flock
+            self._fd = None
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._seal()
+
+
+# ===== Compaction =====
+
+def pack_usage():
+    """pack_id -> (live entries, live bytes), from the files table."""
+    rows = (
+        db.session.query(File.pack_id, func.count(File.id), func.coalesce(func.sum(File.pack_length), 0))
+        .filter(File.pack_id.isnot(None))
+        .group_by(File.pack_id)
+        .all()
+    )
+    return {pack_id: (count, int(live)) for pack_id, count, live in rows}
+
+
+def _rewrite(store: PackStore, pack_id: int, src_fd) -> int:
+    """Copies the live entries of pack_id into a new pack and repoints their rows. Returns the new pack id."""
+    entries = File.query.filter_by(pack_id=pack_id).order_by(File.pack_offset).all()
+    new_id, dst_fd = create_pack(store.pack_dir)
+    try:
+        offset = 0
+        moves = []
+        for f in entries:
+            data = os.pread(src_fd, f.pack_length, f.pack_offset)
+            os.pwrite(dst_fd, data, offset)
+            moves.append((f, offset))
+            offset += len(data)
+        os.fsync(dst_fd)
+
+        new_path = pack_path(store.pack_dir, new_id)
+        for f, new_offset in moves:
+            f.pack_id, f.pack_offset, f.storage_path = new_id, new_offset, new_path
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.close(dst_fd)
+        os.remove(pack_path(store.pack_dir, new_id))
+        raise
+    os.close(dst_fd)
+    return new_id
+
+
+def compact_packs(store: PackStore, min_dead_ratio: float = 0.3, grace_s: float = 300) -> dict:
+    """
+    Reclaims space held by deleted entries (needs an app context):
+    - packs with no live entries are removed
+    - packs where at least min_dead_ratio of the bytes are dead are rewritten
+    Packs that are still locked by a writer, or were modified within grace_s
+    (an upload may not have committed its row yet), are skipped.
+    """
+    stats = {"removed": 0, "rewritten": 0, "reclaimed_bytes": 0, "skipped_active": 0}
+    usage = pack_usage()
+    now = time.time()
+
+    for pack_id in list_pack_ids(store.pack_dir):
+        path = pack_path(store.pack_dir, pack_id)
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            continue
+        try:
+            st = os.fstat(fd)
+            if now - st.st_mtime < grace_s or not _try_lock(fd):
+                stats["skipped_active"] += 1
+                continue
+            if os.stat(path).st_ino != st.st_ino:
+                continue  # another worker's compactor removed it after we opened it
+
+            live_count, live_bytes = usage.get(pack_id, (0, 0))
+            dead = st.st_size - live_bytes
+            if live_count == 0:
+                os.remove(path)
+                stats["removed"] += 1
+            elif st.st_size and dead / st.st_size >= min_dead_ratio:
+                _rewrite(store, pack_id, fd)
+                os.remove(path)
+                stats["rewritten"] += 1
+            else:
+                continue
+            stats["reclaimed_bytes"] += dead
+            inc(PACK_RECLAIMED_BYTES, dead)
+        except FileNotFoundError:
+            # a concurrent compactor got there first; the rest of the pass goes on
+            continue
+        finally:
+            os.close(fd)
+
+    inc(PACK_COMPACTIONS)
+    return stats
+
+
+def init_pack_storage(app) -> None:
+    """
+    Registers the PackStore (app.extensions["pack_store"]) and, if
+    PACK_COMPACT_INTERVAL_SECONDS > 0, the compactor thread in each worker.
+    Does nothing while PACK_STORAGE_ENABLED is off.
+    """
+    if not app.config.get("PACK_STORAGE_ENABLED"):
+        return
+
+    store = PackStore(
+        app.config["PACK_DIR"],
+        threshold_bytes=app.config["PACK_THRESHOLD_BYTES"],
+        max_pack_bytes=app.config["PACK_MAX_BYTES"],
+    )
+    app.extensions["pack_store"] = store
+    if app.config["PACK_COMPACT_INTERVAL_SECONDS"] <= 0:
+        return
+
+    min_dead_ratio, grace_s = app.config["PACK_COMPACT_MIN_DEAD_RATIO"], app.config["PACK_COMPACT_GRACE_SECONDS"]
+
+    def compact():
+        stats = compact_packs(store, min_dead_ratio, grace_s)
+        if stats["removed"] or stats["rewritten"]:
+            print("Pack compaction:", stats)
+
+    run_in_each_worker(app, PeriodicWorker("pack-compactor", app.config["PACK_COMPACT_INTERVAL_SECONDS"], compact, app=app))
@@ -0,0 +1,149 @@
+# previews.py
+# Line-aware partial reads of text files for /dashboard/preview.
+# Plain stored files are read with seek: head reads forward, tail scans
+# backwards from the end in blocks, and a byte range seeks straight to it.
+# Compressed files can only be read forwards, so they are streamed through a
+# window of at most max_bytes. Either way memory stays bounded by max_bytes.
+import io
+from packs import read_entry
+from storage_codec import decode_bytes, open_decoded
+
+BLOCK_SIZE = 64 * 1024
+DEFAULT_LINES = 100
+
+
+class Preview:
+    def __init__(self, start: int, data: bytes, size: int, truncated: bool):
+        self.start = start  # byte offsets into the original file
+        self.end = start + len(data)
+        self.data = data
+        self.size = size
+        self.truncated = truncated  # stopped at max_bytes before reaching the requested line count
+
+    def to_dict(self) -> dict:
+        return {
+            "start": self.start,
+            "end": self.end,
+            "size_bytes": self.size,
+            "truncated": self.truncated,
+            "eof": self.end >= self.size,
+            "text": self.data.decode("utf-8", errors="replace"),
+        }
+
+
+def open_text(f):
+    """(binary file object with the original bytes, seekable) for a File row."""
+    if f.pack_id is not None:
+        # packed files are small by definition
+        data = read_entry(f.storage_path, f.pack_offset, f.pack_length)
+        return io.BytesIO(decode_bytes(data, f.storage_codec)), True
+    if f.storage_codec:
+        return open_decoded(f.storage_path, f.storage_codec), False
+    return open(f.storage_path, "rb"), True
+
+
+def read_head(fh, size: int, lines: int, max_bytes: int) -> Preview:
+    buf = bytearray()
+    count = 0
+    line_end = 0  # end of the last complete line in buf
+    while len(buf) < max_bytes:
+        chunk = fh.read(min(BLOCK_SIZE, max_bytes - len(buf)))
+        if not chunk:
+            return Preview(0, bytes(buf), size, False)
+        scan = len(buf)
+        buf += chunk
+        while count < lines:
+            i = buf.find(b"\n", scan)
+            if i < 0:
+                break
+            count += 1
+            line_end = scan = i + 1
+        if count == lines:
+            return Preview(0, bytes(buf[:line_end]), size, False)
+    more = fh.read(1) != b""
+    return Preview(0, bytes(buf), size, more)
+
+
+def read_tail(fh, size: int, lines: int, max_bytes: int) -> Preview:
+    """Last `lines` lines of a seekable file, scanning backwards at most max_bytes."""
+    pos = size
+    count = 0
+    while pos > 0 and size - pos < max_bytes:
+        step = min(BLOCK_SIZE, pos, max_bytes - (size - pos))
+        pos -= step
+        fh.seek(pos)
+        chunk = fh.read(step)
+        i = len(chunk)
+        while True:
+            i = chunk.rfind(b"\n", 0, i)
+            if i < 0:
+                break
+            if pos + i == size - 1:
+                continue  # the file's final newline doesn't start another line
+            count += 1
+            if count == lines:
+                start = pos + i + 1
+                fh.seek(start)
+                return Preview(start, fh.read(size - start), size, False)
+
+    fh.seek(pos)
+    data = fh.read(size - pos)
+    if pos == 0:
+        return Preview(0, data, size, False)
+    return Preview(*_drop_partial_line(pos, data), size, True)
+
+
+def _drop_partial_line(start: int, data: bytes):
+    """Cut a window that begins mid-line to its first whole line (if it has one)."""
+    cut = data.find(b"\n")
+    if 0 <= cut < len(data) - 1:
+        return start + cut + 1, data[cut + 1:]
+    return start, data
+
+
+def read_tail_stream(fh, size: int, lines: int, max_bytes: int) -> Preview:
+    """read_tail for forward-only streams: keeps a sliding window of the last max_bytes."""
+    window = bytearray()
+    total = 0
+    while True:
+        chunk = fh.read(BLOCK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        window += chunk
+        if len(window) > max_bytes:
+            del window[:len(window) - max_bytes]
+    tail = read_tail(io.BytesIO(window), len(window), lines, max_bytes)
+    start, data, truncated = tail.start, tail.data, tail.truncated
+    offset = total - len(window)
+    if offset and start == 0:
+        # the window didn't reach back far enough for all the lines
+        start, data = _drop_partial_line(start, data)
+        truncated = True
+    return Preview(offset + start, data, size, truncated)
+
+
+def read_range(fh, size: int, offset: int, length: int, seekable: bool) -> Preview:
+    if seekable:
+        fh.seek(offset)
+    else:
+        remaining = offset
+        while remaining > 0:
+            skipped = len(fh.read(min(BLOCK_SIZE, remaining)))
+            if not skipped:
+                break
+            remaining -= skipped
+    return Preview(offset, fh.read(length), size, False)
+
+
+def build_preview(f, mode: str, value, max_bytes: int) -> Preview:
+    """mode is 'head' / 'tail' (value = lines) or 'range' (value = (offset, length))."""
+    fh, seekable = open_text(f)
+    with fh:
+        if mode == "head":
+            return read_head(fh, f.size_bytes, value, max_bytes)
+        if mode == "tail":
+            reader = read_tail if seekable else read_tail_stream
+            return reader(fh, f.size_bytes, value, max_bytes)
+        offset, length = value
+        return read_range(fh, f.size_bytes, offset, min(length, max_bytes), seekable)
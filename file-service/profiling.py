@@ -0,0 +1,148 @@
+# profiling.py
+# Statistical CPU profiler: a daemon thread samples Python stacks (sys._current_frames)
+# every few milliseconds. Nothing runs unless a profile has been asked for.
+# Output formats:
+# - collapsed: "frame;frame;frame count" lines (flamegraph.pl, speedscope, inferno)
+# - speedscope: https://www.speedscope.app file format (sampled profile per thread)
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+FORMATS = {"collapsed": "txt", "speedscope": "json"}
+MAX_STACK_DEPTH = 200
+
+
+def _frame_key(frame):
+    code = frame.f_code
+    return code.co_name, code.co_filename, code.co_firstlineno
+
+
+class StackSampler:
+    """
+    Samples the stacks of the given threads (default: every thread except
+    itself and exclude_ids) until stop() is called. Samples are aggregated,
+    so memory grows with the number of distinct stacks, not with the duration.
+    """
+
+    def __init__(self, interval_s: float = 0.005, thread_ids=None, exclude_ids=()):
+        self.interval_s = interval_s
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.exclude_ids = set(exclude_ids)
+        self.samples = Counter()  # (thread name, (frame key, ...) root first) -> count
+        self.started_at = None
+        self.duration_s = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "StackSampler":
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="cpu-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration_s = time.monotonic() - self.started_at
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or thread_id in self.exclude_ids:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_key(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[(names.get(thread_id, str(thread_id)), tuple(stack))] += 1
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+
+def _frame_label(key) -> str:
+    name, filename, line = key
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def to_collapsed(sampler: StackSampler) -> str:
+    lines = []
+    for (thread_name, stack), count in sorted(sampler.samples.items(), key=lambda kv: -kv[1]):
+        frames = [thread_name] + [_frame_label(k).replace(";", ":") for k in stack]
+        lines.append(f"{';'.join(frames)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def to_speedscope(sampler: StackSampler, name: str) -> dict:
+    frames, index = [], {}
+    by_thread = {}
+    for (thread_name, stack), count in sampler.samples.items():
+        ids = []
+        for key in stack:
+            if key not in index:
+                index[key] = len(frames)
+                frames.append({"name": key[0], "file": key[1], "line": key[2]})
+            ids.append(index[key])
+        samples, weights = by_thread.setdefault(thread_name, ([], []))
+        samples.append(ids)
+        weights.append(count * sampler.interval_s)
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "file-service profiling.py",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+            for thread_name, (samples, weights) in sorted(by_thread.items())
+        ],
+    }
+
+
+def render(sampler: StackSampler, fmt: str, name: str):
+    """(body, mimetype) for one of FORMATS."""
+    if fmt == "speedscope":
+        return json.dumps(to_speedscope(sampler, name)), "application/json"
+    return to_collapsed(sampler), "text/plain"
+
+
+def save_profile(profile_dir: str, prefix: str, fmt: str, body: str) -> str:
+    """Writes the profile to profile_dir and returns the file name."""
+    os.makedirs(profile_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    filename = f"{prefix}-{stamp}-{os.getpid()}.{fmt}.{FORMATS[fmt]}"
+    with open(os.path.join(profile_dir, filename), "w", encoding="utf-8") as f:
+        f.write(body)
+    return filename
+
+
+def profile_for(seconds: float, interval_s: float) -> StackSampler:
+    """Samples every other thread in the process for `seconds` (blocks the caller)."""
+    # the caller is only sleeping, leave it out
+    sampler = StackSampler(interval_s=interval_s, exclude_ids={threading.get_ident()})
+    sampler.start()
+    try:
+        time.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler
@@ -0,0 +1,127 @@
+# purge.py
+# Removes everything a deleted user owned (called by auth-service's outbox via
+# POST /internal/owners/<id>/purge, or `flask purge owner <id>`).
+# Rows are deleted in batches of PURGE_BATCH_SIZE, each batch queueing its
+# blobs in pending_blob_deletions in the same transaction. A per-worker reaper
+# thread removes the queued blobs and thumbnails from disk, so a purge request
+# never waits on the filesystem and a crash doesn't leak blobs. Single deletes
+# on a read-only volume queue their blob here too; it is reaped once the
+# volume is writable again.
+import json
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, or_, select
+from db import db
+from models import File, BlobDeletion
+from replicas import mark_write
+from metrics import inc, FILES_PURGED, BLOBS_REAPED
+from workers import PeriodicWorker, run_in_each_worker
+
+
+def purge_owner(owner_user_id: int, batch_size: int = 1000, max_seconds: float = None) -> dict:
+    """
+    Deletes the owner's files batch by batch (needs an app context). Stops
+    early after max_seconds; {"deleted": n, "done": False} means call again.
+    """
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    deleted = 0
+    while True:
+        files = File.query.filter_by(owner_user_id=owner_user_id).order_by(File.id).limit(batch_size).all()
+        for f in files:
+            # packed entries are reclaimed by compaction; blobs on a read-only
+            # volume wait in the queue until it is writable again (see reap)
+            db.session.add(BlobDeletion(
+                file_id=f.id, storage_path=None if f.pack_id is not None else f.storage_path, volume=f.volume,
+            ))
+            db.session.delete(f)
+        db.session.commit()
+        deleted += len(files)
+        inc(FILES_PURGED, len(files))
+
+        if len(files) < batch_size:
+            if deleted:
+                mark_write(owner_user_id)
+            return {"deleted": deleted, "done": True}
+        if deadline is not None and time.monotonic() >= deadline:
+            mark_write(owner_user_id)
+            return {"deleted": deleted, "done": False}
+
+
+def _readonly_volumes() -> list:
+    volumes = current_app.extensions.get("volumes")
+    if volumes is None:
+        return []
+    return [v.name for v in volumes.volumes if v.state == "readonly"]
+
+
+def reap(batch_size: int = 500) -> int:
+    """
+    Removes up to batch_size queued blobs from disk (needs an app context).
+    Blobs on read-only volumes are left queued. Returns entries handled.
+    """
+    stmt = select(BlobDeletion).order_by(BlobDeletion.id).limit(batch_size)
+    readonly = _readonly_volumes()
+    if readonly:
+        stmt = stmt.where(or_(BlobDeletion.volume.is_(None), BlobDeletion.volume.notin_(readonly)))
+    if db.session.get_bind().dialect.name == "postgresql":
+        stmt = stmt.with_for_update(skip_locked=True)  # several workers reap side by side
+    pending = db.session.execute(stmt).scalars().all()
+    if not pending:
+        db.session.rollback()
+        return 0
+
+    thumbnails = current_app.extensions.get("thumbnails")
+    for item in pending:
+        if item.storage_path:
+            try:
+                os.remove(item.storage_path)
+            except FileNotFoundError:
+                pass  # removed by an earlier attempt that didn't commit
+            except OSError as e:
+                print(f"Removing blob of purged file {item.file_id} failed:", e)
+        if thumbnails is not None:
+            thumbnails.remove(item.file_id)
+
+    db.session.execute(delete(BlobDeletion).where(BlobDeletion.id.in_([item.id for item in pending])))
+    db.session.commit()
+    inc(BLOBS_REAPED, len(pending))
+    return len(pending)
+
+
+def reap_all() -> int:
+    """Reaps batch by batch until nothing reapable is queued. Returns entries handled."""
+    reaped = 0
+    while (n := reap()) > 0:
+        reaped += n
+    return reaped
+
+
+def register_cli(app) -> None:
+    """`flask purge owner <id>|reap`"""
+    group = AppGroup("purge", help="Purge files of deleted users.")
+
+    @group.command("owner")
+    @click.argument("owner_user_id", type=int)
+    def owner_cmd(owner_user_id):
+        """Delete every file of OWNER_USER_ID and remove the blobs."""
+        stats = purge_owner(owner_user_id, app.config["PURGE_BATCH_SIZE"])
+        click.echo(json.dumps({**stats, "reaped": reap_all()}))
+
+    @group.command("reap")
+    def reap_cmd():
+        """Remove queued blobs now instead of waiting for the reaper."""
+        click.echo(json.dumps({"reaped": reap_all()}))
+
+    app.cli.add_command(group)
+
+
+def init_purge(app) -> None:
+    """Registers the CLI and, if PURGE_REAPER_INTERVAL_SECONDS > 0, the reaper thread in each worker."""
+    register_cli(app)
+    if app.config["PURGE_REAPER_INTERVAL_SECONDS"] <= 0:
+        return
+
+    run_in_each_worker(app, PeriodicWorker("blob-reaper", app.config["PURGE_REAPER_INTERVAL_SECONDS"], reap_all, app=app))
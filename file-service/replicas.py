@@ -0,0 +1,265 @@
+# replicas.py
+# Optional read replicas for read-only lookups (dashboard listing, download lookup).
+# Writes and read-after-write paths always use the primary (DATABASE_URL).
+# A user who just wrote reads from the primary for DB_REPLICA_STICKY_SECONDS; the
+# markers are per process unless DB_REPLICA_STICKY_BACKEND=sqlite shares them
+# between the workers on a host (gunicorn.conf.py sets it for several workers).
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from db import db
+from db_pool import engine_options_from_env
+from workers import PeriodicWorker, run_in_each_worker
+
+REPLICA_BIND_PREFIX = "replica_"
+
+
+def replica_urls_from_env():
+    """DATABASE_REPLICA_URLS: comma-separated list of replica URLs (optional)."""
+    raw = os.getenv("DATABASE_REPLICA_URLS", "")
+    return [u.strip() for u in raw.split(",") if u.strip()]
+
+
+def replica_binds(replica_uris, timed_pool: bool = False) -> dict:
+    """SQLALCHEMY_BINDS entries for the replicas (same pool settings as the primary)."""
+    return {
+        f"{REPLICA_BIND_PREFIX}{i}": {"url": uri, **engine_options_from_env(uri, timed_pool=timed_pool)}
+        for i, uri in enumerate(replica_uris)
+    }
+
+
+def _postgres_lag_seconds(conn) -> float:
+    # Caught up (everything received is replayed) -> 0. Without this check an idle
+    # primary makes the replay timestamp look ever older. NULL on a primary -> 0.
+    value = conn.execute(text(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+        " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )).scalar()
+    return float(value or 0)
+
+
+def default_lag_probe(engine) -> float:
+    """Replication lag in seconds. Backends we can't ask (e.g. SQLite stand-ins) report 0."""
+    if engine.url.get_backend_name() != "postgresql":
+        return 0.0
+    with engine.connect() as conn:
+        return _postgres_lag_seconds(conn)
+
+
+# ===== Recent writers (read-your-writes) =====
+
+class MemoryWriteMarkers:
+    """Last write time per user in this process, bounded by max_keys (oldest dropped first)."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._last = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark(self, user_id, now: float) -> None:
+        with self._lock:
+            self._last[user_id] = now
+            self._last.move_to_end(user_id)
+            while len(self._last) > self.max_keys:
+                self._last.popitem(last=False)
+
+    def last_write(self, user_id):
+        with self._lock:
+            return self._last.get(user_id)
+
+
+class SQLiteWriteMarkers:
+    """
+    Last write time per user shared by the worker processes on one host (one
+    SQLite file in WAL mode), so a user's next request sees their write even
+    when it lands on another gunicorn worker.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, keep_s: float):
+        self.path = path
+        self.keep_s = keep_s
+        self._local = threading.local()
+        self._ops = 0
+
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS replica_writes (user_id INTEGER PRIMARY KEY, at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_replica_writes_at ON replica_writes(at)")
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def mark(self, user_id, now: float) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO replica_writes(user_id, at) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET at = excluded.at",
+            (user_id, now),
+        )
+        self._ops += 1
+        if self._ops % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM replica_writes WHERE at <= ?", (now - self.keep_s,))
+        conn.commit()
+
+    def last_write(self, user_id):
+        row = self._conn().execute("SELECT at FROM replica_writes WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+
+def create_write_markers(sticky_s: float):
+    """
+    DB_REPLICA_STICKY_BACKEND: memory (one process) | sqlite (all workers on the
+    host, DB_REPLICA_STICKY_SQLITE_PATH). gunicorn.conf.py selects sqlite when it
+    runs several workers.
+    """
+    backend = os.getenv("DB_REPLICA_STICKY_BACKEND", "memory").strip().lower()
+    if backend == "sqlite":
+        return SQLiteWriteMarkers(os.getenv("DB_REPLICA_STICKY_SQLITE_PATH", "replica_writes.sqlite3"), keep_s=sticky_s)
+    if backend != "memory":
+        raise RuntimeError(f"Unknown DB_REPLICA_STICKY_BACKEND: {backend}")
+    return MemoryWriteMarkers()
+
+
+# ===== Routing =====
+
+class ReplicaRouter:
+    """
+    Chooses the engine for a read-only query:
+    - round-robin over replicas whose last measured lag was within max_lag_s
+    - lag is measured by refresh(), which the replica-lag worker calls every lag_check_s
+      outside the request path; a replica counts as unhealthy until its first probe
+    - users who wrote in the last sticky_s seconds read from the primary
+    - returns None (= primary) when no replica qualifies
+    """
+
+    def __init__(self, engines, max_lag_s=5.0, lag_check_s=1.0, sticky_s=5.0,
+                 lag_probe=default_lag_probe, writers=None):
+        self.engines = list(engines)
+        self.max_lag_s = max_lag_s
+        self.lag_check_s = lag_check_s
+        self.sticky_s = sticky_s
+        self.lag_probe = lag_probe
+        self.writers = writers if writers is not None else MemoryWriteMarkers()
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._healthy = {}  # engine -> bool, from the last refresh()
+
+    def mark_write(self, user_id) -> None:
+        try:
+            self.writers.mark(user_id, time.time())
+        except sqlite3.Error as e:
+            print("Recording replica write marker failed:", e)
+
+    def _recently_wrote(self, user_id, now) -> bool:
+        try:
+            last = self.writers.last_write(user_id)
+        except sqlite3.Error as e:
+            print("Reading replica write marker failed:", e)
+            return True  # can't tell: the primary is always correct
+        return last is not None and now - last < self.sticky_s
+
+    def refresh(self) -> None:
+        """Probes every replica's lag (blocking; called from the replica-lag worker)."""
+        for engine in self.engines:
+            try:
+                healthy = self.lag_probe(engine) <= self.max_lag_s
+            except SQLAlchemyError:
+                healthy = False
+            self._healthy[engine] = healthy
+
+    def mark_unhealthy(self, engine) -> None:
+        # until the next refresh()
+        self._healthy[engine] = False
+
+    def pick(self, user_id=None):
+        if not self.engines:
+            return None
+        if user_id is not None and self._recently_wrote(user_id, time.time()):
+            return None
+
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.engines)
+
+        for i in range(len(self.engines)):
+            engine = self.engines[(start + i) % len(self.engines)]
+            if self._healthy.get(engine, False):
+                return engine
+        return None
+
+
+def init_replica_router(app) -> None:
+    """
+    Builds the router from the replica binds (call inside app context after
+    db.init_app) and, when there are replicas, its lag monitor thread.
+    """
+    engines = [
+        engine for key, engine in sorted(db.engines.items(), key=lambda kv: str(kv[0]))
+        if isinstance(key, str) and key.startswith(REPLICA_BIND_PREFIX)
+    ]
+    sticky_s = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+    router = ReplicaRouter(
+        engines,
+        max_lag_s=float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5")),
+        lag_check_s=float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "1")),
+        sticky_s=sticky_s,
+        writers=create_write_markers(sticky_s) if engines else None,
+    )
+    app.extensions["replica_router"] = router
+    if not engines or router.lag_check_s <= 0:
+        return
+
+    # probes right away: replicas count as unhealthy until first probed
+    run_in_each_worker(app, PeriodicWorker("replica-lag", router.lag_check_s, router.refresh, delay_first=False))
+
+
+def _router():
+    return current_app.extensions.get("replica_router")
+
+
+def mark_write(user_id) -> None:
+    router = _router()
+    if router is not None:
+        router.mark_write(user_id)
+
+
+def _read(stmt, user_id, fetch):
+    """
+    Runs a read-only SELECT on a replica when one is fresh enough,
+    otherwise (or if the replica errors) on the primary.
+    """
+    router = _router()
+    engine = router.pick(user_id) if router is not None else None
+
+    if engine is not None:
+        try:
+            return fetch(db.session.scalars(stmt, bind_arguments={"bind": engine}))
+        except SQLAlchemyError:
+            db.session.rollback()
+            router.mark_unhealthy(engine)
+
+    return fetch(db.session.scalars(stmt))
+
+
+def read_all(stmt, user_id=None):
+    return _read(stmt, user_id, lambda result: result.all())
+
+
+def read_first(stmt, user_id=None):
+    return _read(stmt, user_id, lambda result: result.first())
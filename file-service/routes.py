@@ -1,11 +1,22 @@
+import io
 import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from flask import Blueprint, request, jsonify, send_file
 from models import File
-from dashboard import get_files_for_user, delete_file_for_user, get_file_for_download
+from dashboard import get_files_for_user, delete_file_for_user, get_file_for_download, get_owned_file_or_none
 from flask import current_app #The Flask app that is handling this request right now
 from upload import save_upload_for_user
 from auth import get_authenticated_user_id
 from notify import notify_event
+from metrics import track_in_flight, observe, content_type_label, UPLOADS_IN_FLIGHT, DOWNLOAD_BYTES
+from tracing import start_span
+from storage_codec import policy_from_config, open_decoded, decode_bytes
+from packs import read_entry
+from volumes import NoWritableVolume
+from file_cache import stored_size
+from previews import build_preview, DEFAULT_LINES
+from thumbnails import SourceRef, ThumbnailError, THUMBNAIL_TYPES
+from idempotency import idempotent
 from datetime import datetime, timezone
 
 def _email_body(event, status, user_id=None, extra=""):
@@ -54,6 +65,7 @@ def dashboard():
     }), 200
 
 @bp.post("/dashboard/upload")
+@idempotent
 def upload_dashboard_file():
     # Auth check - simulate authentication using HTTP header
     user_id = get_authenticated_user_id(request)
@@ -89,15 +101,30 @@ def upload_dashboard_file():
     max_size = current_app.config["MAX_UPLOAD_SIZE_BYTES"]
     allowed_types = current_app.config.get("ALLOWED_CONTENT_TYPES")
 
+    # STORAGE_VOLUMES: pick the upload directory for this file (volumes.py)
+    volume = None
+    volumes = current_app.extensions.get("volumes")
+    if volumes is not None:
+        try:
+            volume = volumes.place(user_id)
+        except NoWritableVolume as e:
+            current_app.logger.error("Upload rejected: %s", e)
+            return jsonify({"error": "Storage unavailable"}), 503
+        upload_dir = volume.path
+
     try:
          # Call Business logic
-        saved = save_upload_for_user(
-            user_id=user_id,
-            file_storage=file_storage,
-            upload_dir=upload_dir,
-            max_size=max_size,
-            allowed_types=allowed_types,
-        )
+        with track_in_flight(UPLOADS_IN_FLIGHT):
+            saved = save_upload_for_user(
+                user_id=user_id,
+                file_storage=file_storage,
+                upload_dir=upload_dir,
+                max_size=max_size,
+                allowed_types=allowed_types,
+                compression=policy_from_config(current_app.config),
+                packs=current_app.extensions.get("pack_store"),
+                volume=volume.name if volume else None,
+            )
     except ValueError as e:
         # AC-FILE-02: reject invalid upload, no persistence
         # Log internal error details server-side without exposing them to the client
@@ -111,6 +138,10 @@ def upload_dashboard_file():
 
         return jsonify({"error": "Invalid upload"}), 400
     
+    if current_app.config["THUMBNAIL_EAGER"] and saved.content_type in THUMBNAIL_TYPES:
+        # queued only: the upload response doesn't wait for the renders
+        current_app.extensions["thumbnails"].generate_all(SourceRef(saved))
+
     notify_event(
         event_type="upload_success",
         subject="[Runtime ✅] File Service: Upload successful",
@@ -131,6 +162,7 @@ def upload_dashboard_file():
     }), 201
 
 @bp.post("/dashboard/delete/<int:file_id>")
+@idempotent
 def delete_file(file_id: int):
     user_id = get_authenticated_user_id(request)
     if not user_id:
@@ -176,16 +208,204 @@ def download_file(file_id: int):
         )
         return jsonify({"error": "Not found"}), 404
     
+    cache = current_app.extensions.get("file_cache")
+    if cache is not None and cache.cacheable(f):
+        data = cache.get(f)
+        if data is None:
+            with start_span("cache.fill", bytes=stored_size(f)):
+                f, data = _read_stored(f, user_id, file_id)
+            if f is None:
+                return jsonify({"error": "Not found"}), 404
+            cache.put(f, data)
+        return _send_bytes(f, data)
+
+    if f.pack_id is not None:
+        return _send_packed(f, user_id, file_id)
+
+    if f.storage_path and not os.path.exists(f.storage_path):
+        # moved to another volume after this row was read (maybe from a replica): re-read from the primary
+        f = get_owned_file_or_none(user_id, file_id)
+
     # If record exists but file missing on disk -> treat as not found
-    if not f.storage_path or not os.path.exists(f.storage_path):
+    if not f or not f.storage_path or not os.path.exists(f.storage_path):
         return jsonify({"error": "Not found"}), 404
-    
-    return send_file(
-        f.storage_path,
+
+    observe(DOWNLOAD_BYTES, f.size_bytes, content_type=content_type_label(f.content_type))
+    # opens + stats the file; the body itself is streamed after the request span ends
+    try:
+        with start_span("disk.open", bytes=f.size_bytes, codec=f.storage_codec or "none"):
+            if not f.storage_codec:
+                return send_file(
+                    f.storage_path,
+                    as_attachment=True,
+                    download_name=f.filename,
+                    mimetype=f.content_type
+                )
+
+            if request.accept_encodings.quality(f.storage_codec) > 0:
+                # client decodes: send the stored bytes as they are
+                response = send_file(
+                    f.storage_path,
+                    as_attachment=True,
+                    download_name=f.filename,
+                    mimetype=f.content_type
+                )
+                response.headers["Content-Encoding"] = f.storage_codec
+            else:
+                response = send_file(
+                    open_decoded(f.storage_path, f.storage_codec),
+                    as_attachment=True,
+                    download_name=f.filename,
+                    mimetype=f.content_type,
+                    conditional=False,
+                    etag=False,
+                )
+                response.content_length = f.size_bytes
+            response.vary.add("Accept-Encoding")
+            return response
+    except FileNotFoundError:
+        # deleted or moved between the exists() check and the open
+        return jsonify({"error": "Not found"}), 404
+
+def _read_stored(f, user_id: int, file_id: int):
+    """(row, stored bytes) of a small file, or (None, None) if it is gone."""
+    for attempt in range(2):
+        try:
+            if f.pack_id is not None:
+                return f, read_entry(f.storage_path, f.pack_offset, f.pack_length)
+            with open(f.storage_path, "rb") as fh:
+                return f, fh.read()
+        except FileNotFoundError:
+            if attempt:
+                break
+            # pack compacted / file moved after this row was read (maybe from a replica): re-read from the primary
+            f = get_owned_file_or_none(user_id, file_id)
+            if f is None:
+                break
+    return None, None
+
+def _send_packed(f, user_id: int, file_id: int):
+    with start_span("pack.read", bytes=f.pack_length, codec=f.storage_codec or "none"):
+        f, data = _read_stored(f, user_id, file_id)
+    if f is None:
+        return jsonify({"error": "Not found"}), 404
+    return _send_bytes(f, data)
+
+def _send_bytes(f, data: bytes):
+    """Download response for a small file whose stored bytes are already in memory."""
+    observe(DOWNLOAD_BYTES, f.size_bytes, content_type=content_type_label(f.content_type))
+    passthrough = f.storage_codec and request.accept_encodings.quality(f.storage_codec) > 0
+    body = data if passthrough or not f.storage_codec else decode_bytes(data, f.storage_codec)
+    response = send_file(
+        io.BytesIO(body),
         as_attachment=True,
         download_name=f.filename,
-        mimetype=f.content_type
+        mimetype=f.content_type,
+        etag=False,
     )
+    if f.storage_codec:
+        if passthrough:
+            response.headers["Content-Encoding"] = f.storage_codec
+        response.vary.add("Accept-Encoding")
+    return response
+
+@bp.get("/dashboard/thumbnail/<int:file_id>")
+def thumbnail(file_id: int):
+    user_id = get_authenticated_user_id(request)
+    if not user_id:
+        notify_event(
+            event_type="thumbnail_unauthorized",
+            subject="Unauthorized thumbnail request",
+            body=f"event=thumbnail_unauthorized status=401 method={request.method} path={request.path} file_id={file_id} ip={request.remote_addr}",
+            dedupe_key=request.remote_addr or "unknown"
+        )
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # only configured sizes, so the disk cache stays bounded per file
+    thumbnails = current_app.extensions["thumbnails"]
+    size = request.args.get("size", default=thumbnails.sizes[0], type=int)
+    if size not in thumbnails.sizes:
+        return jsonify({"error": "Invalid size", "sizes": list(thumbnails.sizes)}), 400
+
+    f = get_file_for_download(user_id, file_id)
+    if not f:
+        return jsonify({"error": "Not found"}), 404
+    if f.content_type not in THUMBNAIL_TYPES:
+        return jsonify({"error": "No thumbnail for this file type"}), 415
+
+    try:
+        path = thumbnails.get_or_create(SourceRef(f), size)
+    except FileNotFoundError:
+        return jsonify({"error": "Not found"}), 404
+    except ThumbnailError as e:
+        current_app.logger.warning("Thumbnail for file %s failed: %s", file_id, e)
+        return jsonify({"error": "Cannot render thumbnail"}), 422
+    except FutureTimeoutError:
+        # the render keeps going in the pool; a retry is then a cache hit
+        response = jsonify({"error": "Thumbnail is still being rendered"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
+    # a file's contents never change, so neither does its thumbnail
+    response = send_file(path, mimetype="image/png", max_age=365 * 24 * 3600)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+@bp.get("/dashboard/preview/<int:file_id>")
+def preview(file_id: int):
+    user_id = get_authenticated_user_id(request)
+    if not user_id:
+        notify_event(
+            event_type="preview_unauthorized",
+            subject="Unauthorized preview request",
+            body=f"event=preview_unauthorized status=401 method={request.method} path={request.path} file_id={file_id} ip={request.remote_addr}",
+            dedupe_key=request.remote_addr or "unknown"
+        )
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # ?head=N | ?tail=N | ?offset=&length= (default: head=100)
+    max_lines = current_app.config["PREVIEW_MAX_LINES"]
+    max_bytes = current_app.config["PREVIEW_MAX_BYTES"]
+    args = request.args
+    modes = [m for m in ("head", "tail", "offset") if m in args]
+    if len(modes) > 1:
+        return jsonify({"error": "Use only one of head, tail or offset"}), 400
+    mode = modes[0] if modes else "head"
+    try:
+        if mode == "offset":
+            value = (int(args["offset"]), int(args.get("length", max_bytes)))
+            valid = value[0] >= 0 and value[1] > 0
+            mode = "range"
+        else:
+            value = int(args.get(mode, DEFAULT_LINES))
+            valid = 0 < value <= max_lines
+    except ValueError:
+        valid = False
+    if not valid:
+        return jsonify({"error": "Invalid preview range", "max_lines": max_lines, "max_bytes": max_bytes}), 400
+
+    f = get_file_for_download(user_id, file_id)
+    if not f:
+        return jsonify({"error": "Not found"}), 404
+    if (f.content_type or "").split(";")[0].strip().lower() != "text/plain":
+        return jsonify({"error": "Preview is only available for text files"}), 415
+
+    try:
+        with start_span("preview.read", mode=mode):
+            result = build_preview(f, mode, value, max_bytes)
+    except FileNotFoundError:
+        # moved / compacted after this row was read (maybe from a replica): re-read from the primary
+        f = get_owned_file_or_none(user_id, file_id)
+        try:
+            result = build_preview(f, mode, value, max_bytes) if f else None
+        except FileNotFoundError:
+            result = None
+        if result is None:
+            return jsonify({"error": "Not found"}), 404
+
+    return jsonify({"file_id": f.id, "filename": f.filename, **result.to_dict()}), 200
 
 @bp.get("/test/crash")
 def test_crash():
@@ -0,0 +1,119 @@
+# storage_codec.py
+# Optional at-rest compression of uploads (STORAGE_COMPRESSION=gzip|zstd, default none).
+# The codec name is stored on File (NULL = stored raw) and is also the HTTP
+# Content-Encoding token, so a download can be served straight from storage
+# when the client accepts that encoding.
+import gzip
+import io
+import os
+
+try:
+    import zstandard  # optional: pip install zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ("gzip", "zstd")
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+DEFAULT_COMPRESSIBLE_TYPES = "text/plain,text/csv,application/json"
+CHUNK_BYTES = 1024 * 1024
+
+
+def available(codec: str) -> bool:
+    return codec == "gzip" or (codec == "zstd" and zstandard is not None)
+
+
+def resolve_codec(name: str):
+    """Codec to compress new uploads with, or None (unknown / not installed -> stored raw)."""
+    name = (name or "none").strip().lower()
+    if name in ("", "none"):
+        return None
+    if name not in CODECS:
+        print(f"Unknown STORAGE_COMPRESSION={name!r}; storing uploads uncompressed")
+        return None
+    if not available(name):
+        print(f"STORAGE_COMPRESSION={name} needs the zstandard package; storing uploads uncompressed")
+        return None
+    return name
+
+
+class CompressionPolicy:
+    """Which uploads get compressed, and how."""
+
+    def __init__(self, codec: str, level: int = None, content_types=(), min_bytes: int = 1024):
+        self.codec = codec
+        self.level = level if level is not None else DEFAULT_LEVELS[codec]
+        self.content_types = frozenset(content_types)
+        self.min_bytes = min_bytes
+
+    def applies_to(self, content_type: str, size: int) -> bool:
+        # tiny files don't shrink enough to pay for the header and the CPU
+        if size < self.min_bytes or not content_type:
+            return False
+        return content_type.split(";", 1)[0].strip().lower() in self.content_types
+
+
+def policy_from_config(config):
+    """CompressionPolicy from app config, or None when compression is off."""
+    codec = config.get("STORAGE_COMPRESSION")
+    if not codec:
+        return None
+    return CompressionPolicy(
+        codec,
+        level=config.get("STORAGE_COMPRESSION_LEVEL"),
+        content_types=config.get("STORAGE_COMPRESSIBLE_TYPES", ()),
+        min_bytes=config.get("STORAGE_COMPRESSION_MIN_BYTES", 1024),
+    )
+
+
+def write_encoded(f, data, codec: str, level: int) -> None:
+    """Compresses data into the open binary file f, CHUNK_BYTES at a time."""
+    view = memoryview(data)
+    if codec == "gzip":
+        # mtime=0: identical uploads give identical files
+        with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=level, mtime=0) as out:
+            for start in range(0, len(view), CHUNK_BYTES):
+                out.write(view[start:start + CHUNK_BYTES])
+        return
+    if codec == "zstd":
+        with zstandard.ZstdCompressor(level=level).stream_writer(f, closefd=False) as out:
+            for start in range(0, len(view), CHUNK_BYTES):
+                out.write(view[start:start + CHUNK_BYTES])
+        return
+    raise ValueError(f"unknown codec: {codec}")
+
+
+def encode_bytes(data, codec: str, level: int) -> bytes:
+    """write_encoded into memory (small files headed for a pack, see packs.py)."""
+    buf = io.BytesIO()
+    write_encoded(buf, data, codec, level)
+    return buf.getvalue()
+
+
+def decode_bytes(data: bytes, codec) -> bytes:
+    if codec is None:
+        return data
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("file is stored with zstd but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"unknown codec: {codec}")
+
+
+def open_decoded(path: str, codec):
+    """Binary file object yielding the original bytes of a stored file (decompressed as it is read)."""
+    if codec is None:
+        return open(path, "rb")
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("file is stored with zstd but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    raise ValueError(f"unknown codec: {codec}")
+
+
+def compressible_types_from_env() -> frozenset:
+    raw = os.getenv("STORAGE_COMPRESSIBLE_TYPES", DEFAULT_COMPRESSIBLE_TYPES)
+    return frozenset(t.strip().lower() for t in raw.split(",") if t.strip())
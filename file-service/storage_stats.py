@@ -0,0 +1,205 @@
+# storage_stats.py
+# Storage analytics for admins, read from small aggregate tables instead of
+# scanning `files`:
+# - storage_usage_by_user / storage_usage_by_content_type: current totals
+# - storage_growth_by_day: files and bytes added / removed per day
+#
+# Every insert / delete of a File row also writes a StorageUsageDelta in the
+# same transaction (mapper events below). A refresher folds pending deltas into
+# the aggregates every STORAGE_STATS_REFRESH_SECONDS and deletes them, so each
+# refresh costs O(changes since the last one). The aggregates are built once
+# from `files` with `flask storage-stats rebuild` (the only full scan).
+import json
+from collections import defaultdict
+from datetime import date, datetime, timezone
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, select, text
+from db import db
+from models import File, StorageUsageDelta, UserStorageUsage, ContentTypeStorageUsage, DailyStorageGrowth
+from workers import PeriodicWorker, run_in_each_worker
+
+# pg_advisory_xact_lock key: one refresh / rebuild at a time across workers
+_LOCK_KEY = 0x5354_4154
+
+
+def normalize_type(content_type) -> str:
+    return (content_type or "").split(";")[0].strip().lower()[:100] or "unknown"
+
+
+def _stats_enabled() -> bool:
+    return has_app_context() and current_app.config.get("STORAGE_STATS_ENABLED", False)
+
+
+def _record(connection, f, sign: int, day: date) -> None:
+    stored = f.pack_length if f.pack_id is not None else (f.stored_size_bytes if f.stored_size_bytes is not None else f.size_bytes)
+    connection.execute(StorageUsageDelta.__table__.insert().values(
+        owner_user_id=f.owner_user_id,
+        content_type=normalize_type(f.content_type),
+        day=day,
+        files=sign,
+        bytes=sign * f.size_bytes,
+        stored_bytes=sign * (stored or 0),
+    ))
+
+
+@event.listens_for(File, "after_insert")
+def _file_inserted(mapper, connection, f):
+    if _stats_enabled():
+        _record(connection, f, 1, (f.created_at or datetime.utcnow()).date())
+
+
+@event.listens_for(File, "after_delete")
+def _file_deleted(mapper, connection, f):
+    if _stats_enabled():
+        _record(connection, f, -1, datetime.now(timezone.utc).date())
+
+
+def _lock() -> None:
+    if db.session.get_bind().dialect.name == "postgresql":
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+    # SQLite: the DELETE below takes the database write lock, which serializes refreshes
+
+
+def _add(model, key, **amounts):
+    row = db.session.get(model, key)
+    if row is None:
+        row = model(**{model.__mapper__.primary_key[0].name: key}, **{k: 0 for k in amounts})
+        db.session.add(row)
+    for name, amount in amounts.items():
+        setattr(row, name, getattr(row, name) + amount)
+
+
+def refresh(batch_size: int = 50000) -> int:
+    """Folds up to batch_size pending deltas into the aggregates (needs an app context). Returns deltas applied."""
+    _lock()
+    upto = db.session.execute(
+        select(StorageUsageDelta.id).order_by(StorageUsageDelta.id).offset(batch_size - 1).limit(1)
+    ).scalar()
+    stmt = delete(StorageUsageDelta)
+    if upto is not None:
+        stmt = stmt.where(StorageUsageDelta.id <= upto)
+    rows = db.session.execute(stmt.returning(
+        StorageUsageDelta.owner_user_id, StorageUsageDelta.content_type, StorageUsageDelta.day,
+        StorageUsageDelta.files, StorageUsageDelta.bytes, StorageUsageDelta.stored_bytes,
+    )).all()
+
+    by_user = defaultdict(lambda: [0, 0, 0])
+    by_type = defaultdict(lambda: [0, 0, 0])
+    by_day = defaultdict(lambda: [0, 0, 0, 0])
+    for owner, content_type, day, files, size, stored in rows:
+        for totals in (by_user[owner], by_type[content_type]):
+            totals[0] += files
+            totals[1] += size
+            totals[2] += stored
+        growth = by_day[day]
+        if files > 0:
+            growth[0] += files
+            growth[1] += size
+        else:
+            growth[2] -= files
+            growth[3] -= size
+
+    for owner, (files, size, stored) in by_user.items():
+        _add(UserStorageUsage, owner, files=files, bytes=size, stored_bytes=stored)
+    for content_type, (files, size, stored) in by_type.items():
+        _add(ContentTypeStorageUsage, content_type, files=files, bytes=size, stored_bytes=stored)
+    for day, (added, added_bytes, removed, removed_bytes) in by_day.items():
+        _add(DailyStorageGrowth, day, files_added=added, bytes_added=added_bytes,
+             files_removed=removed, bytes_removed=removed_bytes)
+    # users / types that no longer have any files
+    db.session.flush()
+    db.session.execute(delete(UserStorageUsage).where(UserStorageUsage.files <= 0))
+    db.session.execute(delete(ContentTypeStorageUsage).where(ContentTypeStorageUsage.files <= 0))
+    db.session.commit()
+    return len(rows)
+
+
+def rebuild() -> dict:
+    """Recomputes every aggregate from `files` (full scan; needs an app context)."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        # one snapshot for the scans and the delta cleanup
+        db.session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    _lock()
+    for model in (StorageUsageDelta, UserStorageUsage, ContentTypeStorageUsage, DailyStorageGrowth):
+        db.session.execute(delete(model))
+
+    stored = func.coalesce(func.sum(func.coalesce(File.pack_length, File.stored_size_bytes, File.size_bytes)), 0)
+    users = db.session.execute(
+        select(File.owner_user_id, func.count(), func.coalesce(func.sum(File.size_bytes), 0), stored)
+        .group_by(File.owner_user_id)
+    ).all()
+    _insert(UserStorageUsage, [dict(owner_user_id=o, files=n, bytes=b, stored_bytes=s) for o, n, b, s in users])
+
+    types = defaultdict(lambda: [0, 0, 0])
+    for content_type, n, b, s in db.session.execute(
+        select(File.content_type, func.count(), func.coalesce(func.sum(File.size_bytes), 0), stored)
+        .group_by(File.content_type)
+    ):
+        totals = types[normalize_type(content_type)]
+        totals[0] += n
+        totals[1] += b
+        totals[2] += s
+    _insert(ContentTypeStorageUsage, [
+        dict(content_type=t, files=n, bytes=b, stored_bytes=s) for t, (n, b, s) in types.items()
+    ])
+
+    # removals before the rebuild aren't known; growth only counts files that still exist
+    day = func.date(File.created_at)
+    days = db.session.execute(
+        select(day, func.count(), func.coalesce(func.sum(File.size_bytes), 0)).group_by(day)
+    ).all()
+    _insert(DailyStorageGrowth, [
+        dict(day=_as_date(d), files_added=n, bytes_added=b, files_removed=0, bytes_removed=0) for d, n, b in days
+    ])
+    db.session.commit()
+    return {"users": len(users), "content_types": len(types), "days": len(days)}
+
+
+def _insert(model, rows) -> None:
+    if rows:
+        db.session.execute(insert(model), rows)
+
+
+def _as_date(value) -> date:
+    # func.date() returns a string on SQLite
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def pending() -> int:
+    return db.session.execute(select(func.count()).select_from(StorageUsageDelta)).scalar()
+
+
+def refresh_all() -> int:
+    """Refreshes until no deltas are pending. Returns deltas applied."""
+    applied = 0
+    while (n := refresh()) > 0:
+        applied += n
+    return applied
+
+
+def register_cli(app) -> None:
+    """`flask storage-stats rebuild|refresh`"""
+    group = AppGroup("storage-stats", help="Storage analytics aggregates.")
+
+    @group.command("rebuild")
+    def rebuild_cmd():
+        """Recompute the aggregates from the files table (run once after enabling)."""
+        click.echo(json.dumps(rebuild()))
+
+    @group.command("refresh")
+    def refresh_cmd():
+        """Fold pending changes into the aggregates now."""
+        click.echo(json.dumps({"applied": refresh_all()}))
+
+    app.cli.add_command(group)
+
+
+def init_storage_stats(app) -> None:
+    """Registers the CLI and, while STORAGE_STATS_ENABLED, the refresher thread in each worker."""
+    register_cli(app)
+    if not app.config.get("STORAGE_STATS_ENABLED") or app.config["STORAGE_STATS_REFRESH_SECONDS"] <= 0:
+        return
+
+    run_in_each_worker(app, PeriodicWorker("storage-stats", app.config["STORAGE_STATS_REFRESH_SECONDS"], refresh_all, app=app))
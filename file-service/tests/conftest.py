@@ -4,6 +4,7 @@ from app import create_app
 from db import db
 import jwt
 from datetime import datetime, timedelta, UTC
+from io import BytesIO
 from pathlib import Path
 
 @pytest.fixture(autouse=True)
@@ -13,6 +14,10 @@ def set_testing_env(monkeypatch):
 
     # runtime emails OFF by default in tests
     monkeypatch.setenv("ENABLE_RUNTIME_EMAILS", "false")
+    # purged blobs are reaped explicitly in tests (purge.reap)
+    monkeypatch.setenv("PURGE_REAPER_INTERVAL_SECONDS", "0")
+    # expired idempotency keys are pruned explicitly in tests (idempotency.prune)
+    monkeypatch.setenv("IDEMPOTENCY_PRUNE_INTERVAL_SECONDS", "0")
 
 def make_test_jwt(user_id=1, role="user"):
     payload = {
@@ -22,6 +27,24 @@ def make_test_jwt(user_id=1, role="user"):
     }
     return jwt.encode(payload, "test-secret", algorithm="HS256")
 
+def auth_headers(user_id=1, role="user"):
+    return {"Authorization": f"Bearer {make_test_jwt(user_id=user_id, role=role)}"}
+
+def upload(client, content=b"data", filename="a.txt", content_type="text/plain", user_id=1, headers=None):
+    """POST /dashboard/upload as user_id; returns the response. headers are added to the auth header."""
+    return client.post(
+        "/dashboard/upload",
+        data={"file": (BytesIO(content), filename, content_type)},
+        headers={**auth_headers(user_id), **(headers or {})},
+        content_type="multipart/form-data",
+    )
+
+def upload_id(client, *args, **kwargs):
+    """upload() that must succeed; returns the new file's id."""
+    resp = upload(client, *args, **kwargs)
+    assert resp.status_code == 201, resp.get_data(as_text=True)
+    return resp.get_json()["file"]["id"]
+
 @pytest.fixture
 def app():
     app = create_app("sqlite:///:memory:")
@@ -0,0 +1,117 @@
+import os
+import tarfile
+import pytest
+from db import db
+from models import File, UserStorageUsage
+from conftest import auth_headers, upload_id
+from packs import PackStore
+from backup import BackupError, create_backup, list_backups, restore_backup, verify_backup
+
+
+@pytest.fixture
+def uploads(app, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path / "uploads")
+    return tmp_path
+
+
+def _delete(client, file_id, user_id=1):
+    client.post(f"/dashboard/delete/{file_id}", headers=auth_headers(user_id))
+
+
+def _contents():
+    out = {}
+    for f in File.query.order_by(File.id):
+        with open(f.storage_path, "rb") as fh:
+            out[f.id] = (f.filename, f.owner_user_id, fh.read())
+    return out
+
+
+def test_incremental_backup_copies_only_new_files(uploads, client):
+    dest = str(uploads / "backups")
+    first = [upload_id(client, b"file %d" % i) for i in range(3)]
+    full = create_backup(dest)
+    assert (full["kind"], full["rows"], full["blob_bytes"]) == ("full", 3, 18)
+
+    upload_id(client, b"later")
+    _delete(client, first[0])
+    incremental = create_backup(dest)
+    assert incremental["kind"] == "incremental" and incremental["base"] == full["id"]
+    assert (incremental["rows"], incremental["blob_bytes"], incremental["deleted_since_base"]) == (1, 5, 1)
+    assert incremental["snapshot_rows"] == 3
+
+    assert create_backup(dest, full=True)["rows"] == 3
+    assert len(list_backups(dest)) == 3
+
+
+def test_restore_replays_the_chain(uploads, client):
+    dest = str(uploads / "backups")
+    keep = upload_id(client, b"keep", user_id=1)
+    gone = upload_id(client, b"gone", user_id=2)
+    create_backup(dest, chunk_bytes=1)  # one blob per chunk
+    upload_id(client, b"new", user_id=3)
+    _delete(client, gone, user_id=2)
+    latest = create_backup(dest, chunk_bytes=1)
+    expected = _contents()
+
+    with pytest.raises(BackupError):
+        restore_backup(os.path.join(dest, latest["id"]), str(uploads / "restored"))
+
+    File.query.delete()
+    db.session.commit()
+    stats = restore_backup(os.path.join(dest, latest["id"]), str(uploads / "restored"), workers=3)
+
+    assert (stats["rows"], stats["restored"], stats["errors"]) == (2, 2, [])
+    assert _contents() == expected
+    assert keep in expected and gone not in expected
+    assert all(f.storage_path.startswith(str(uploads / "restored")) for f in File.query)
+
+
+def test_packed_files_are_restored_as_plain_files(uploads, app, client):
+    store = PackStore(str(uploads / "packs"), threshold_bytes=1024, max_pack_bytes=4096)
+    app.extensions["pack_store"] = store
+    file_id = upload_id(client, b"tiny packed file")
+    store.close()
+    manifest = create_backup(str(uploads / "backups"))
+
+    File.query.delete()
+    db.session.commit()
+    restore_backup(os.path.join(str(uploads / "backups"), manifest["id"]), str(uploads / "restored"))
+
+    f = File.query.get(file_id)
+    assert f.pack_id is None
+    with open(f.storage_path, "rb") as fh:
+        assert fh.read() == b"tiny packed file"
+
+
+def test_restore_rebuilds_storage_stats(uploads, app, client):
+    app.config["STORAGE_STATS_ENABLED"] = True
+    upload_id(client, b"one", user_id=1)
+    upload_id(client, b"three", user_id=2)
+    manifest = create_backup(str(uploads / "backups"))
+    File.query.delete()  # bulk delete: no deltas, like the bulk insert in restore
+    db.session.commit()
+
+    stats = restore_backup(os.path.join(str(uploads / "backups"), manifest["id"]), str(uploads / "restored"))
+
+    assert stats["storage_stats"]["users"] == 2
+    usage = {u.owner_user_id: (u.files, u.bytes) for u in UserStorageUsage.query}
+    assert usage == {1: (1, 3), 2: (1, 5)}
+
+
+def test_verify_detects_corruption(uploads, client):
+    dest = str(uploads / "backups")
+    upload_id(client, b"a" * 100)
+    manifest = create_backup(dest)
+    path = os.path.join(dest, manifest["id"])
+    assert verify_backup(path)["errors"] == []
+
+    chunk = os.path.join(path, manifest["chunks"][0])
+    with tarfile.open(chunk) as tar:
+        offset = tar.getmembers()[0].offset_data
+    with open(chunk, "r+b") as fh:
+        fh.seek(offset)
+        fh.write(b"b")
+
+    stats = verify_backup(path)
+    assert stats["checked"] == 1
+    assert stats["errors"] == [f"{manifest['id']}/{manifest['chunks'][0]}/1: sha256 mismatch"]
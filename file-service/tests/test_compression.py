@@ -0,0 +1,95 @@
+import gzip
+import os
+import pytest
+from models import File
+from conftest import auth_headers, upload_id
+import storage_codec
+
+LOG = b"".join(
+    b"2026-10-19T10:00:%02d INFO request_id=%06d path=/dashboard status=200 duration_ms=12\n" % (i % 60, i)
+    for i in range(2000)
+)
+
+
+@pytest.fixture
+def compressing_app(app, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    app.config["STORAGE_COMPRESSION"] = "gzip"
+    app.config["STORAGE_COMPRESSIBLE_TYPES"] = frozenset({"text/plain"})
+    return app
+
+
+def test_compressible_upload_is_stored_gzipped(compressing_app, client):
+    file_id = upload_id(client, LOG)
+
+    rec = File.query.get(file_id)
+    assert rec.storage_codec == "gzip"
+    assert rec.size_bytes == len(LOG)
+    assert rec.stored_size_bytes == os.path.getsize(rec.storage_path) < len(LOG) / 5
+    with gzip.open(rec.storage_path, "rb") as f:
+        assert f.read() == LOG
+
+
+def test_other_types_and_small_files_are_stored_raw(compressing_app, client):
+    png_id = upload_id(client, LOG, "a.png", "image/png")
+    tiny_id = upload_id(client, b"hello", "a.txt")
+
+    for file_id in (png_id, tiny_id):
+        rec = File.query.get(file_id)
+        assert rec.storage_codec is None
+        assert rec.stored_size_bytes == rec.size_bytes
+
+
+def test_incompressible_text_falls_back_to_raw(compressing_app, client):
+    file_id = upload_id(client, os.urandom(4096))
+
+    rec = File.query.get(file_id)
+    assert rec.storage_codec is None
+    assert os.path.getsize(rec.storage_path) == 4096
+
+
+def test_download_passes_gzip_through_when_accepted(compressing_app, client):
+    file_id = upload_id(client, LOG)
+
+    resp = client.get(
+        f"/dashboard/download/{file_id}",
+        headers={**auth_headers(), "Accept-Encoding": "gzip, deflate"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert gzip.decompress(resp.data) == LOG
+
+
+def test_download_decompresses_for_clients_without_gzip(compressing_app, client):
+    file_id = upload_id(client, LOG)
+
+    resp = client.get(f"/dashboard/download/{file_id}", headers=auth_headers())
+    assert resp.status_code == 200
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["Content-Length"] == str(len(LOG))
+    assert resp.data == LOG
+    assert "attachment" in resp.headers["Content-Disposition"]
+
+
+def test_compression_off_by_default(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    file_id = upload_id(client, LOG)
+    assert File.query.get(file_id).storage_codec is None
+
+
+def test_zstd_round_trip(tmp_path):
+    pytest.importorskip("zstandard")
+    path = tmp_path / "blob"
+    with open(path, "wb") as f:
+        storage_codec.write_encoded(f, LOG, "zstd", 3)
+    assert path.stat().st_size < len(LOG) / 5
+    with storage_codec.open_decoded(str(path), "zstd") as f:
+        assert f.read() == LOG
+
+
+def test_resolve_codec_falls_back_when_unavailable(monkeypatch):
+    monkeypatch.setattr(storage_codec, "zstandard", None)
+    assert storage_codec.resolve_codec("zstd") is None
+    assert storage_codec.resolve_codec("none") is None
+    assert storage_codec.resolve_codec("GZIP") == "gzip"
@@ -0,0 +1,95 @@
+import os
+from types import SimpleNamespace
+import pytest
+from prometheus_client import REGISTRY
+from models import File
+from conftest import auth_headers, upload_id
+from file_cache import FileCache
+
+
+def _row(file_id, size, path=None):
+    return SimpleNamespace(id=file_id, storage_path=path or f"/u/{file_id}", pack_id=None, pack_offset=None,
+                           pack_length=None, stored_size_bytes=size, size_bytes=size)
+
+
+def _sample(result):
+    return REGISTRY.get_sample_value("file_download_cache_requests_total", {"result": result}) or 0
+
+
+def test_lru_stays_within_byte_budget():
+    cache = FileCache(max_bytes=10, max_file_bytes=10)
+    a, b, c = _row(1, 4), _row(2, 4), _row(3, 4)
+    cache.put(a, b"aaaa")
+    cache.put(b, b"bbbb")
+    assert cache.get(a) == b"aaaa"  # a is now most recently used
+    cache.put(c, b"cccc")
+
+    assert cache.get(b) is None
+    assert cache.get(a) == b"aaaa" and cache.get(c) == b"cccc"
+    assert cache.size_bytes == 8 and len(cache) == 2
+
+
+def test_entry_is_dropped_when_the_row_changes():
+    cache = FileCache(max_bytes=100, max_file_bytes=100)
+    cache.put(_row(1, 3), b"old")
+
+    # same id, different stored object (moved volume, compacted pack, reused id)
+    assert cache.get(_row(1, 3, path="/v2/1")) is None
+    assert len(cache) == 0
+
+
+def test_oversized_files_are_not_cached():
+    cache = FileCache(max_bytes=100, max_file_bytes=4)
+    assert not cache.cacheable(_row(1, 5))
+    cache.put(_row(1, 5), b"12345")
+    assert len(cache) == 0
+
+
+@pytest.fixture
+def cache(app, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    cache = FileCache(max_bytes=1024 * 1024, max_file_bytes=1024)
+    app.extensions["file_cache"] = cache
+    return cache
+
+
+def test_hot_download_is_served_from_memory(cache, client):
+    headers = auth_headers(1)
+    file_id = upload_id(client, b"shared template")
+    hits, misses = _sample("hit"), _sample("miss")
+
+    first = client.get(f"/dashboard/download/{file_id}", headers=headers)
+    os.remove(File.query.get(file_id).storage_path)  # proves the next response doesn't touch the disk
+    second = client.get(f"/dashboard/download/{file_id}", headers=headers)
+
+    assert first.data == second.data == b"shared template"
+    assert "attachment" in second.headers["Content-Disposition"]
+    assert (_sample("hit") - hits, _sample("miss") - misses) == (1, 1)
+
+
+def test_ownership_is_checked_before_the_cache(cache, client):
+    owner = auth_headers(1)
+    other = auth_headers(2)
+    file_id = upload_id(client, b"private")
+    client.get(f"/dashboard/download/{file_id}", headers=owner)
+
+    assert client.get(f"/dashboard/download/{file_id}", headers=other).status_code == 404
+
+
+def test_delete_invalidates_the_entry(cache, client):
+    headers = auth_headers(1)
+    file_id = upload_id(client, b"short lived")
+    client.get(f"/dashboard/download/{file_id}", headers=headers)
+    assert len(cache) == 1
+
+    client.post(f"/dashboard/delete/{file_id}", headers=headers)
+    assert len(cache) == 0
+    assert client.get(f"/dashboard/download/{file_id}", headers=headers).status_code == 404
+
+
+def test_large_files_bypass_the_cache(cache, client):
+    headers = auth_headers(1)
+    file_id = upload_id(client, b"x" * 2048)
+
+    assert client.get(f"/dashboard/download/{file_id}", headers=headers).data == b"x" * 2048
+    assert len(cache) == 0
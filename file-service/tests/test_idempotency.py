@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from io import BytesIO
+from db import db
+from models import File, IdempotencyKey
+from conftest import auth_headers, upload
+from flask import request
+from idempotency import prune, prune_all, request_fingerprint
+
+
+def _upload(client, key=None, content=b"hello", user_id=1):
+    return upload(client, content, user_id=user_id, headers={"Idempotency-Key": key} if key is not None else None)
+
+
+def test_retried_upload_is_replayed_not_duplicated(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    first = _upload(client, key="k1")
+    again = _upload(client, key="k1")
+
+    assert first.status_code == again.status_code == 201
+    assert again.get_json() == first.get_json()
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert File.query.count() == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_keys_are_per_user_and_optional(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    _upload(client, key="k1", user_id=1)
+    assert _upload(client, key="k1", user_id=2).status_code == 201
+    # no key: every request is processed
+    _upload(client)
+    _upload(client)
+    assert File.query.count() == 4
+
+
+def test_same_key_for_a_different_request_is_rejected(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    _upload(client, key="k1", content=b"one")
+    resp = _upload(client, key="k1", content=b"two")
+    assert resp.status_code == 422
+    assert File.query.count() == 1
+
+
+def _upload_fingerprint(app, content=b"hello"):
+    # what _upload(client, content=content) hashes to
+    with app.test_request_context(
+        "/dashboard/upload", method="POST",
+        data={"file": (BytesIO(content), "a.txt", "text/plain")}, content_type="multipart/form-data",
+    ):
+        return request_fingerprint(request)
+
+
+def test_in_flight_key_blocks_duplicates_until_abandoned(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    # a concurrent first attempt holds the key but has no response yet
+    now = datetime.utcnow()
+    row = IdempotencyKey(owner_user_id=1, key="k1", fingerprint=_upload_fingerprint(app),
+                         created_at=now, expires_at=now + timedelta(hours=1))
+    db.session.add(row)
+    db.session.commit()
+
+    resp = _upload(client, key="k1")
+    assert resp.status_code == 409
+    assert resp.headers["Retry-After"] == "1"
+    assert File.query.count() == 0
+
+    # the first attempt died: after IDEMPOTENCY_LOCK_SECONDS a retry takes over
+    row.created_at = now - timedelta(seconds=app.config["IDEMPOTENCY_LOCK_SECONDS"] + 1)
+    db.session.commit()
+    assert _upload(client, key="k1").status_code == 201
+    assert IdempotencyKey.query.filter_by(key="k1").one().response_status == 201
+    assert File.query.count() == 1
+
+
+def test_server_errors_are_not_stored(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    volumes_ok = app.extensions.get("volumes")
+
+    class Full:
+        def place(self, user_id):
+            from volumes import NoWritableVolume
+            raise NoWritableVolume("full")
+
+    app.extensions["volumes"] = Full()
+    assert _upload(client, key="k1").status_code == 503
+    assert IdempotencyKey.query.count() == 0
+
+    app.extensions["volumes"] = volumes_ok
+    assert _upload(client, key="k1").status_code == 201
+
+
+def test_retried_delete_replays_success(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    file_id = _upload(client).get_json()["file"]["id"]
+    headers = {**auth_headers(), "Idempotency-Key": "d1"}
+
+    assert client.post(f"/dashboard/delete/{file_id}", headers=headers).status_code == 200
+    again = client.post(f"/dashboard/delete/{file_id}", headers=headers)
+    assert again.status_code == 200
+    assert again.headers["Idempotent-Replayed"] == "true"
+
+
+def test_invalid_key_and_unauthenticated(client):
+    assert _upload(client, key="x" * 256).status_code == 400
+    resp = client.post("/dashboard/upload", headers={"Idempotency-Key": "k1"})
+    assert resp.status_code == 401
+    assert IdempotencyKey.query.count() == 0
+
+
+def test_prune_deletes_expired_keys_in_batches(app):
+    now = datetime.utcnow()
+    for i in range(5):
+        db.session.add(IdempotencyKey(owner_user_id=1, key=f"old{i}", fingerprint="0" * 64,
+                                      response_status=201, expires_at=now - timedelta(seconds=1)))
+    db.session.add(IdempotencyKey(owner_user_id=1, key="live", fingerprint="0" * 64,
+                                  response_status=201, expires_at=now + timedelta(hours=1)))
+    db.session.commit()
+
+    assert prune(batch_size=2) == 2
+    assert prune_all(batch_size=2) == 3
+    assert prune() == 0
+    assert [k.key for k in IdempotencyKey.query.all()] == ["live"]
@@ -0,0 +1,66 @@
+import tracemalloc
+import pytest
+from prometheus_client import REGISTRY
+from app import create_app
+from db import db
+from conftest import make_test_jwt
+from memory_profiling import sample_gauges
+
+ADMIN = {"Authorization": f"Bearer {make_test_jwt(user_id=1, role='admin')}"}
+
+@pytest.fixture
+def memory_client(monkeypatch):
+    monkeypatch.setenv("MEMORY_PROFILING_ENABLED", "true")
+    app = create_app("sqlite:///:memory:")
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+    tracemalloc.stop()
+
+_retained = []
+
+def _leaky_allocation():
+    _retained.append([bytearray(1024) for _ in range(500)])
+
+def test_memory_endpoints_are_off_by_default(client):
+    assert client.get("/admin/memory", headers=ADMIN).status_code == 404
+    assert client.post("/admin/memory/start", headers=ADMIN).status_code == 404
+
+def test_memory_endpoints_require_admin(memory_client):
+    user = {"Authorization": f"Bearer {make_test_jwt(user_id=2, role='user')}"}
+    assert memory_client.post("/admin/memory/start", headers=user).status_code == 403
+    assert not tracemalloc.is_tracing()
+
+def test_snapshot_diff_finds_the_growing_site(memory_client):
+    assert memory_client.post("/admin/memory/snapshots", headers=ADMIN).status_code == 409  # not started
+
+    res = memory_client.post("/admin/memory/start?frames=5", headers=ADMIN)
+    assert res.status_code == 200 and res.get_json()["tracing"] is True
+
+    first = memory_client.post("/admin/memory/snapshots", headers=ADMIN).get_json()["id"]
+    _leaky_allocation()
+    second = memory_client.post("/admin/memory/snapshots?limit=5", headers=ADMIN).get_json()["id"]
+
+    res = memory_client.get(f"/admin/memory/diff?from={first}&to={second}&limit=5", headers=ADMIN)
+    assert res.status_code == 200
+    top = res.get_json()["sites"][0]
+    assert "test_memory_profiling.py" in top["site"]
+    assert top["size_diff_bytes"] >= 500 * 1024
+
+    listed = memory_client.get("/admin/memory/snapshots", headers=ADMIN).get_json()["snapshots"]
+    assert [s["id"] for s in listed] == [first, second]
+    assert memory_client.get(f"/admin/memory/diff?from={first}&to=999", headers=ADMIN).status_code == 404
+
+    res = memory_client.post("/admin/memory/stop", headers=ADMIN)
+    assert res.get_json()["tracing"] is False
+    # snapshots survive stop
+    assert memory_client.get(f"/admin/memory/diff?from={first}&to={second}", headers=ADMIN).status_code == 200
+
+def test_memory_gauges():
+    sample_gauges()
+    assert REGISTRY.get_sample_value("file_process_rss_bytes") > 0
+    assert REGISTRY.get_sample_value("file_gc_objects") > 0
+    assert REGISTRY.get_sample_value("file_gc_collections", {"generation": "0"}) is not None
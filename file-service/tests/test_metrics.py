@@ -3,3 +3,66 @@ def test_metrics_endpoint_exists(client):
     assert res.status_code == 200
     # Prometheus format usually contains '# HELP' or '# TYPE'
     assert b"#" in res.data
+
+from io import BytesIO
+from prometheus_client import REGISTRY
+import metrics
+from app import create_app
+from conftest import make_test_jwt
+
+def _sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+def test_upload_and_download_hot_paths_are_instrumented(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    token = make_test_jwt(user_id=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    before = {
+        "upload": _sample("file_upload_bytes_sum", {"content_type": "text/plain"}),
+        "download": _sample("file_download_bytes_count", {"content_type": "text/plain"}),
+        "write": _sample("file_disk_write_seconds_count"),
+        "fsync": _sample("file_fsync_seconds_count"),
+        "insert": _sample("file_db_query_seconds_count", {"operation": "INSERT"}),
+        "jwt": _sample("file_jwt_decode_seconds_count", {"outcome": "ok"}),
+    }
+
+    res = client.post(
+        "/dashboard/upload",
+        data={"file": (BytesIO(b"hello world"), "a.txt", "text/plain")},
+        headers=headers,
+        content_type="multipart/form-data",
+    )
+    assert res.status_code == 201
+    file_id = res.get_json()["file"]["id"]
+    assert client.get(f"/dashboard/download/{file_id}", headers=headers).status_code == 200
+
+    assert _sample("file_upload_bytes_sum", {"content_type": "text/plain"}) - before["upload"] == 11
+    assert _sample("file_download_bytes_count", {"content_type": "text/plain"}) - before["download"] == 1
+    assert _sample("file_disk_write_seconds_count") - before["write"] == 1
+    assert _sample("file_fsync_seconds_count") - before["fsync"] == 1
+    assert _sample("file_db_query_seconds_count", {"operation": "INSERT"}) - before["insert"] >= 1
+    assert _sample("file_jwt_decode_seconds_count", {"outcome": "ok"}) - before["jwt"] == 2
+
+def test_metrics_body_has_no_user_or_path_labels(client):
+    body = client.get("/metrics").data.decode()
+    assert "user_id" not in body
+    assert "storage_path" not in body
+
+def test_disabling_metrics_stops_collection(monkeypatch):
+    monkeypatch.setenv("ENABLE_METRICS", "false")
+    try:
+        app = create_app("sqlite:///:memory:")
+        assert metrics.is_enabled() is False
+        assert "/metrics" not in [r.rule for r in app.url_map.iter_rules()]
+
+        before = _sample("file_disk_write_seconds_count")
+        with metrics.timed(metrics.DISK_WRITE_SECONDS):
+            pass
+        assert _sample("file_disk_write_seconds_count") == before
+    finally:
+        metrics.set_enabled(True)
+
+def test_dedupe_eviction_reasons_are_exported_before_any_eviction(client):
+    body = client.get("/metrics").data.decode()
+    for reason in ("expired", "capacity"):
+        assert f'file_notify_dedupe_evictions_total{{reason="{reason}"}}' in body
@@ -0,0 +1,75 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+import pytest
+
+pytest.importorskip("gunicorn")
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=5) as r:
+        return r.read().decode()
+
+def _wait_until_up(url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert proc.poll() is None, "gunicorn exited during startup"
+        try:
+            return _get(url)
+        except OSError:
+            time.sleep(0.2)
+    raise AssertionError(f"{url} did not come up")
+
+def _health_requests(metrics_text):
+    total = 0.0
+    for line in metrics_text.splitlines():
+        if line.startswith("flask_http_request_duration_seconds_count{") and 'path="/health"' in line:
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+def test_counts_are_aggregated_across_workers(tmp_path):
+    app_port, metrics_port = _free_port(), _free_port()
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'files.db'}",
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+        "PROMETHEUS_MULTIPROC_DIR": str(tmp_path / "metrics"),
+        "METRICS_PORT": str(metrics_port),
+        "GUNICORN_BIND": f"127.0.0.1:{app_port}",
+        "GUNICORN_WORKERS": "3",
+        "GUNICORN_WORKER_CLASS": "sync",
+        "GUNICORN_ACCESS_LOG": "",
+        "TESTING": "true",
+    })
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until_up(f"http://127.0.0.1:{app_port}/health", proc)
+        _wait_until_up(f"http://127.0.0.1:{metrics_port}/metrics", proc)
+
+        requests = 60
+        for _ in range(requests - 1):  # one already made while waiting for startup
+            _get(f"http://127.0.0.1:{app_port}/health")
+
+        # several worker processes wrote metric files ...
+        worker_files = [p for p in (tmp_path / "metrics").iterdir() if p.name.startswith("histogram_")]
+        assert len(worker_files) >= 2
+
+        # ... and both the dedicated port and /metrics on any worker report the total
+        assert _health_requests(_get(f"http://127.0.0.1:{metrics_port}/metrics")) == requests
+        assert _health_requests(_get(f"http://127.0.0.1:{app_port}/metrics")) == requests
+    finally:
+        proc.terminate()
+        proc.wait(timeout=15)
@@ -0,0 +1,128 @@
+import gzip
+import os
+import pytest
+from models import File
+from conftest import auth_headers, upload_id
+from packs import PackStore, compact_packs, list_pack_ids, read_entry
+
+
+@pytest.fixture
+def store(app, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path / "uploads")
+    store = PackStore(str(tmp_path / "packs"), threshold_bytes=1024, max_pack_bytes=4096)
+    app.extensions["pack_store"] = store
+    yield store
+    store.close()
+
+
+def _download(client, file_id, **headers):
+    return client.get(f"/dashboard/download/{file_id}", headers={**auth_headers(), **headers})
+
+
+def test_small_uploads_share_a_pack(store, app, client):
+    ids = [upload_id(client, f"small file {i}".encode()) for i in range(3)]
+
+    rows = [File.query.get(i) for i in ids]
+    assert {r.pack_id for r in rows} == {1}
+    assert [r.pack_offset for r in rows] == [0, 12, 24]
+    assert os.listdir(app.config["UPLOAD_DIR"]) == []
+
+    resp = _download(client, ids[1])
+    assert resp.status_code == 200
+    assert resp.data == b"small file 1"
+    assert "attachment" in resp.headers["Content-Disposition"]
+
+
+def test_large_uploads_get_their_own_file(store, client):
+    file_id = upload_id(client, b"x" * 2048)
+
+    rec = File.query.get(file_id)
+    assert rec.pack_id is None
+    assert os.path.getsize(rec.storage_path) == 2048
+
+
+def test_full_pack_rolls_over(store, client):
+    ids = [upload_id(client, bytes([65 + i]) * 1000) for i in range(5)]
+
+    assert [File.query.get(i).pack_id for i in ids] == [1, 1, 1, 1, 2]
+    assert list_pack_ids(store.pack_dir) == [1, 2]
+    assert _download(client, ids[4]).data == b"E" * 1000
+
+
+def test_delete_keeps_pack_until_compaction(store, client):
+    keep = upload_id(client, b"keep me")
+    gone = [upload_id(client, b"delete me %d" % i) for i in range(3)]
+    for file_id in gone:
+        assert client.post(f"/dashboard/delete/{file_id}", headers=auth_headers()).status_code == 200
+    assert list_pack_ids(store.pack_dir) == [1]
+
+    # still being written to by this worker
+    assert compact_packs(store, min_dead_ratio=0.3, grace_s=0)["skipped_active"] == 1
+
+    store.close()
+    stats = compact_packs(store, min_dead_ratio=0.3, grace_s=0)
+    assert stats["rewritten"] == 1
+    assert stats["reclaimed_bytes"] == 3 * len(b"delete me 0")
+    assert list_pack_ids(store.pack_dir) == [2]
+
+    rec = File.query.get(keep)
+    assert (rec.pack_id, rec.pack_offset) == (2, 0)
+    assert _download(client, keep).data == b"keep me"
+
+
+def test_compaction_removes_empty_packs_and_respects_grace(store, client):
+    file_id = upload_id(client, b"short lived")
+    client.post(f"/dashboard/delete/{file_id}", headers=auth_headers())
+    store.close()
+
+    assert compact_packs(store, grace_s=3600)["skipped_active"] == 1
+    assert compact_packs(store, grace_s=0)["removed"] == 1
+    assert list_pack_ids(store.pack_dir) == []
+
+
+def test_pack_ids_are_not_reused_after_compaction(store, client):
+    file_id = upload_id(client, b"short lived")
+    stale = File.query.get(file_id)
+    stale_path, stale_offset, stale_length = stale.storage_path, stale.pack_offset, stale.pack_length
+    client.post(f"/dashboard/delete/{file_id}", headers=auth_headers(1))
+    store.close()
+    assert compact_packs(store, grace_s=0)["removed"] == 1
+
+    # the next pack gets a new id, so a stale row (e.g. from a lagging replica) can't read its bytes
+    new_id = File.query.get(upload_id(client, b"someone else")).pack_id
+    assert new_id == 2
+    with pytest.raises(FileNotFoundError):
+        read_entry(stale_path, stale_offset, stale_length)
+
+
+def test_compaction_tolerates_a_concurrent_compactor(store, client, monkeypatch):
+    for content in (b"a" * 1000,) * 5:  # two packs
+        client.post(f"/dashboard/delete/{upload_id(client, content)}", headers=auth_headers())
+    store.close()
+    assert list_pack_ids(store.pack_dir) == [1, 2]
+
+    real_remove = os.remove
+    def removed_by_other_worker(path):
+        real_remove(path)
+        if path.endswith("00000001.pack"):
+            raise FileNotFoundError(path)
+    monkeypatch.setattr(os, "remove", removed_by_other_worker)
+
+    assert compact_packs(store, grace_s=0)["removed"] == 1
+    assert list_pack_ids(store.pack_dir) == []
+
+
+def test_packed_files_can_be_compressed(store, app, client):
+    app.config["STORAGE_COMPRESSION"] = "gzip"
+    app.config["STORAGE_COMPRESSIBLE_TYPES"] = frozenset({"text/plain"})
+    app.config["STORAGE_COMPRESSION_MIN_BYTES"] = 0
+    content = b"INFO ok\n" * 100
+    file_id = upload_id(client, content)
+
+    rec = File.query.get(file_id)
+    assert rec.storage_codec == "gzip" and rec.pack_length < len(content)
+
+    passthrough = _download(client, file_id, **{"Accept-Encoding": "gzip"})
+    assert passthrough.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(passthrough.data) == content
+    assert _download(client, file_id).data == content
@@ -0,0 +1,103 @@
+import io
+from io import BytesIO
+import pytest
+from models import File
+from conftest import auth_headers, upload_id
+import previews
+from previews import read_head, read_tail, read_tail_stream, read_range
+
+LOG = b"".join(b"line %04d\n" % i for i in range(1000))  # 10 bytes per line
+
+
+class ForwardOnly(io.RawIOBase):
+    """A stream that can't seek, like a decompressing reader."""
+
+    def __init__(self, data):
+        self._inner = BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._inner.readinto(b)
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(previews, "BLOCK_SIZE", 64)  # exercise the block boundaries
+
+
+def test_head_stops_after_n_lines():
+    p = read_head(BytesIO(LOG), len(LOG), 3, 1024)
+    assert p.data == b"line 0000\nline 0001\nline 0002\n"
+    assert (p.start, p.end, p.truncated) == (0, 30, False)
+
+
+def test_tail_scans_backwards():
+    p = read_tail(BytesIO(LOG), len(LOG), 2, 1024)
+    assert p.data == b"line 0998\nline 0999\n"
+    assert (p.start, p.end) == (9980, 10000)
+
+    no_final_newline = LOG[:-1]
+    assert read_tail(BytesIO(no_final_newline), len(no_final_newline), 1, 1024).data == b"line 0999"
+
+
+def test_tail_is_capped_at_whole_lines():
+    p = read_tail(BytesIO(LOG), len(LOG), 500, 55)
+    assert p.truncated
+    assert p.data == b"line 0995\nline 0996\nline 0997\nline 0998\nline 0999\n"
+
+
+def test_stream_tail_matches_seekable_tail():
+    for lines, max_bytes in ((2, 1024), (500, 55), (5, 10 ** 6)):
+        seekable = read_tail(BytesIO(LOG), len(LOG), lines, max_bytes)
+        streamed = read_tail_stream(ForwardOnly(LOG), len(LOG), lines, max_bytes)
+        assert (streamed.start, streamed.data, streamed.truncated) == (seekable.start, seekable.data, seekable.truncated)
+
+
+def test_range_with_and_without_seek():
+    assert read_range(BytesIO(LOG), len(LOG), 5000, 10, True).data == b"line 0500\n"
+    assert read_range(ForwardOnly(LOG), len(LOG), 5000, 10, False).data == b"line 0500\n"
+    assert read_range(BytesIO(LOG), len(LOG), 20000, 10, True).data == b""
+
+
+@pytest.fixture
+def uploads(app, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+
+
+def test_preview_endpoint(uploads, client):
+    file_id = upload_id(client, LOG)
+
+    head = client.get(f"/dashboard/preview/{file_id}?head=2", headers=auth_headers()).get_json()
+    assert head["text"] == "line 0000\nline 0001\n"
+    assert head["end"] == 20 and head["size_bytes"] == len(LOG) and not head["eof"]
+
+    tail = client.get(f"/dashboard/preview/{file_id}?tail=1", headers=auth_headers()).get_json()
+    assert tail["text"] == "line 0999\n" and tail["eof"]
+
+    page = client.get(f"/dashboard/preview/{file_id}?offset=20&length=10", headers=auth_headers()).get_json()
+    assert page["text"] == "line 0002\n"
+
+
+def test_preview_of_compressed_file(uploads, app, client):
+    app.config["STORAGE_COMPRESSION"] = "gzip"
+    app.config["STORAGE_COMPRESSIBLE_TYPES"] = frozenset({"text/plain"})
+    file_id = upload_id(client, LOG)
+    assert File.query.get(file_id).storage_codec == "gzip"
+
+    tail = client.get(f"/dashboard/preview/{file_id}?tail=2", headers=auth_headers()).get_json()
+    assert tail["text"] == "line 0998\nline 0999\n" and tail["start"] == 9980
+
+
+def test_preview_checks_owner_type_and_arguments(uploads, client):
+    file_id = upload_id(client, LOG)
+    png_id = upload_id(client, b"\x89PNG....", content_type="image/png")
+
+    assert client.get(f"/dashboard/preview/{file_id}", headers=auth_headers(2)).status_code == 404
+    assert client.get(f"/dashboard/preview/{png_id}", headers=auth_headers()).status_code == 415
+    assert client.get(f"/dashboard/preview/{file_id}?head=0", headers=auth_headers()).status_code == 400
+    assert client.get(f"/dashboard/preview/{file_id}?head=5000", headers=auth_headers()).status_code == 400
+    assert client.get(f"/dashboard/preview/{file_id}?head=2&tail=2", headers=auth_headers()).status_code == 400
+    assert client.get(f"/dashboard/preview/{file_id}?offset=-1", headers=auth_headers()).status_code == 400
+    assert client.get(f"/dashboard/preview/{file_id}").status_code == 401
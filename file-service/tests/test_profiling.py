@@ -0,0 +1,115 @@
+import json
+import threading
+import pytest
+from app import create_app
+from db import db
+from conftest import make_test_jwt
+from profiling import StackSampler, to_collapsed
+
+def _headers(role):
+    return {"Authorization": f"Bearer {make_test_jwt(user_id=1, role=role)}"}
+
+@pytest.fixture
+def profiling_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILING_ENABLED", "true")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path / "profiles"))
+    app = create_app("sqlite:///:memory:")
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app.test_client(), tmp_path / "profiles"
+        db.session.remove()
+        db.drop_all()
+
+def test_max_profile_stays_under_worker_timeout(monkeypatch):
+    monkeypatch.setenv("PROFILING_MAX_SECONDS", "60")
+    monkeypatch.setenv("GUNICORN_TIMEOUT", "60")
+    assert create_app("sqlite:///:memory:").config["PROFILING_MAX_SECONDS"] == 50
+    monkeypatch.delenv("PROFILING_MAX_SECONDS")
+    monkeypatch.setenv("GUNICORN_TIMEOUT", "120")
+    assert create_app("sqlite:///:memory:").config["PROFILING_MAX_SECONDS"] == 30
+
+def _busy_loop_for_profiler(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_profiler_is_off_by_default(client):
+    assert client.post("/admin/profile/cpu", headers=_headers("admin")).status_code == 404
+    res = client.get("/dashboard?profile=1", headers=_headers("admin"))
+    assert res.status_code == 200
+    assert "X-Profile-File" not in res.headers
+
+def test_profiler_requires_admin(profiling_client):
+    client, _ = profiling_client
+    assert client.post("/admin/profile/cpu").status_code == 403
+    assert client.post("/admin/profile/cpu", headers=_headers("user")).status_code == 403
+
+def test_process_profile_samples_other_threads(profiling_client):
+    client, profile_dir = profiling_client
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop_for_profiler, args=(stop,), name="busy")
+    worker.start()
+    try:
+        res = client.post("/admin/profile/cpu?seconds=0.3&format=collapsed", headers=_headers("admin"))
+    finally:
+        stop.set()
+        worker.join()
+
+    assert res.status_code == 200
+    body = res.data.decode()
+    busy = [line for line in body.splitlines() if line.startswith("busy;")]
+    assert busy and "_busy_loop_for_profiler" in busy[0]
+    assert int(busy[0].rsplit(" ", 1)[1]) > 0
+    assert (profile_dir / res.headers["X-Profile-File"]).read_text() == body
+
+    listed = client.get("/admin/profiles", headers=_headers("admin")).get_json()["profiles"]
+    assert res.headers["X-Profile-File"] in listed
+    download = client.get(f"/admin/profiles/{res.headers['X-Profile-File']}", headers=_headers("admin"))
+    assert download.data.decode() == body
+
+def test_profile_dir_defaults_under_upload_dir(monkeypatch, tmp_path):
+    # UPLOAD_DIR is the directory the container user owns
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    monkeypatch.delenv("PROFILE_DIR", raising=False)
+    assert create_app("sqlite:///:memory:").config["PROFILE_DIR"] == str(tmp_path / "profiles")
+
+def test_unwritable_profile_dir_is_a_json_error(profiling_client, tmp_path):
+    client, _ = profiling_client
+    (tmp_path / "not-a-dir").write_text("")
+    client.application.config["PROFILE_DIR"] = str(tmp_path / "not-a-dir" / "profiles")
+
+    res = client.post("/admin/profile/cpu?seconds=0.1", headers=_headers("admin"))
+    assert res.status_code == 507
+    assert "PROFILE_DIR" in res.get_json()["error"]
+
+    res = client.get("/dashboard", headers={**_headers("admin"), "X-Profile": "collapsed"})
+    assert res.status_code == 507
+    assert res.headers["X-Profiled-Status"] == "200"
+    assert "error" in res.get_json()
+
+def test_rejects_unknown_format(profiling_client):
+    client, _ = profiling_client
+    res = client.post("/admin/profile/cpu?format=pdf", headers=_headers("admin"))
+    assert res.status_code == 400
+
+def test_single_request_profile_replaces_body(profiling_client):
+    client, profile_dir = profiling_client
+    res = client.get("/dashboard", headers={**_headers("admin"), "X-Profile": "speedscope"})
+
+    assert res.status_code == 200
+    assert res.headers["X-Profiled-Status"] == "200"
+    profile = json.loads(res.data)
+    assert profile["$schema"].startswith("https://www.speedscope.app/")
+    assert (profile_dir / res.headers["X-Profile-File"]).exists()
+
+def test_profile_flag_is_ignored_for_non_admins(profiling_client):
+    client, _ = profiling_client
+    res = client.get("/dashboard?profile=1", headers=_headers("user"))
+    assert res.status_code == 200
+    assert "files" in res.get_json()
+    assert "X-Profile-File" not in res.headers
+
+def test_collapsed_format():
+    sampler = StackSampler(interval_s=0.01)
+    sampler.samples[("MainThread", (("main", "/app/app.py", 1), ("handler", "/app/routes.py", 10)))] = 3
+    assert to_collapsed(sampler) == "MainThread;main (app.py:1);handler (routes.py:10) 3\n"
@@ -0,0 +1,52 @@
+import os
+from db import db
+from models import File, BlobDeletion
+from conftest import auth_headers, upload_id
+from purge import purge_owner, reap
+
+SERVICE = auth_headers(0, role="service")
+
+
+def test_purge_deletes_rows_now_and_blobs_in_the_background(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    gone = [upload_id(client, user_id=7) for _ in range(3)]
+    kept = upload_id(client, user_id=8)
+    paths = [File.query.get(i).storage_path for i in gone]
+
+    resp = client.post("/internal/owners/7/purge", headers=SERVICE)
+    assert resp.status_code == 200
+    assert resp.get_json() == {"owner_user_id": 7, "deleted": 3, "done": True}
+    assert File.query.filter_by(owner_user_id=7).count() == 0
+    assert all(os.path.exists(p) for p in paths)  # not removed inline
+    assert BlobDeletion.query.count() == 3
+
+    assert reap() == 3
+    assert not any(os.path.exists(p) for p in paths)
+    assert os.path.exists(File.query.get(kept).storage_path)
+    assert BlobDeletion.query.count() == 0
+
+
+def test_purge_is_batched_and_resumable(app, client, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    for _ in range(5):
+        upload_id(client, user_id=7)
+
+    # a zero time budget stops after the first batch
+    assert purge_owner(7, batch_size=2, max_seconds=1e-9) == {"deleted": 2, "done": False}
+    assert purge_owner(7, batch_size=2) == {"deleted": 3, "done": True}
+    assert purge_owner(7, batch_size=2) == {"deleted": 0, "done": True}
+
+
+def test_reap_tolerates_missing_blobs(app):
+    db.session.add(BlobDeletion(file_id=1, storage_path="/nonexistent/blob"))
+    db.session.add(BlobDeletion(file_id=2, storage_path=None))
+    db.session.commit()
+
+    assert reap() == 2
+    assert reap() == 0
+
+
+def test_purge_requires_a_service_token(client):
+    user = auth_headers(7)
+    assert client.post("/internal/owners/7/purge", headers=user).status_code == 403
+    assert client.post("/internal/owners/7/purge").status_code == 403
@@ -0,0 +1,108 @@
+import pytest
+from app import create_app
+from db import db
+from models import File
+from types import SimpleNamespace
+import replicas
+from replicas import ReplicaRouter, SQLiteWriteMarkers
+from conftest import make_test_jwt
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """Primary + one replica, both local SQLite files standing in for Postgres."""
+    app = create_app(
+        f"sqlite:///{tmp_path / 'primary.db'}",
+        replica_uris=[f"sqlite:///{tmp_path / 'replica.db'}"],
+    )
+    app.config["TESTING"] = True
+    app.config["UPLOAD_DIR"] = str(tmp_path / "uploads")
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines["replica_0"])
+        app.extensions["replica_router"].refresh()  # normally done by the lag monitor thread
+        yield app
+        db.session.remove()
+    # init_app registered a (model-less) metadata for the replica bind on the shared
+    # db object; drop it so other tests' db.create_all() don't look for that bind
+    db.metadatas.pop("replica_0", None)
+
+def _add(engine, **kw):
+    """Insert a row directly into one database (simulates replication state)."""
+    with engine.begin() as conn:
+        conn.execute(File.__table__.insert().values(
+            storage_path="/x", content_type="text/plain", size_bytes=1, **kw
+        ))
+
+def _filenames(client, user_id):
+    token = make_test_jwt(user_id=user_id)
+    res = client.get("/dashboard", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+    return [f["filename"] for f in res.get_json()["files"]]
+
+def test_dashboard_list_reads_from_replica(replica_app):
+    _add(db.engines[None], id=1, owner_user_id=1, filename="primary.txt")
+    _add(db.engines["replica_0"], id=1, owner_user_id=1, filename="replica.txt")
+
+    assert _filenames(replica_app.test_client(), 1) == ["replica.txt"]
+
+def test_stale_replica_falls_back_to_primary(replica_app):
+    _add(db.engines[None], id=1, owner_user_id=1, filename="primary.txt")
+    _add(db.engines["replica_0"], id=1, owner_user_id=1, filename="replica.txt")
+    router = replica_app.extensions["replica_router"]
+    router.lag_probe = lambda engine: 60.0
+    router.refresh()
+
+    assert _filenames(replica_app.test_client(), 1) == ["primary.txt"]
+
+def test_broken_replica_falls_back_to_primary(replica_app, tmp_path):
+    _add(db.engines[None], id=1, owner_user_id=1, filename="primary.txt")
+    with db.engines["replica_0"].begin() as conn:
+        conn.exec_driver_sql("DROP TABLE files")
+
+    assert _filenames(replica_app.test_client(), 1) == ["primary.txt"]
+
+def test_user_reads_primary_after_own_delete(replica_app):
+    _add(db.engines[None], id=1, owner_user_id=1, filename="a.txt")
+    _add(db.engines["replica_0"], id=1, owner_user_id=1, filename="a.txt")
+    client = replica_app.test_client()
+    token = make_test_jwt(user_id=1)
+
+    res = client.post("/dashboard/delete/1", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+
+    # replica hasn't caught up yet, but the deleting user must not see the file
+    assert _filenames(client, 1) == []
+
+def test_router_round_robins_healthy_replicas():
+    router = ReplicaRouter(["r0", "r1", "r2"], lag_probe=lambda e: 0 if e != "r1" else 99)
+    assert router.pick() is None  # not probed yet
+    router.refresh()
+
+    picks = [router.pick() for _ in range(4)]
+    assert "r1" not in picks
+    assert set(picks) == {"r0", "r2"}
+
+def test_write_markers_are_shared_between_processes(tmp_path):
+    # two routers stand in for two gunicorn workers on the same host
+    path = str(tmp_path / "writes.sqlite3")
+    worker_a = ReplicaRouter(["r0"], lag_probe=lambda e: 0, writers=SQLiteWriteMarkers(path, keep_s=5))
+    worker_b = ReplicaRouter(["r0"], lag_probe=lambda e: 0, writers=SQLiteWriteMarkers(path, keep_s=5))
+    worker_b.refresh()
+
+    assert worker_b.pick(user_id=1) == "r0"
+    worker_a.mark_write(1)
+    assert worker_b.pick(user_id=1) is None
+    assert worker_b.pick(user_id=2) == "r0"
+
+def test_caught_up_idle_replica_reports_no_lag():
+    class Conn:
+        def __init__(self):
+            self.sql = None
+
+        def execute(self, stmt):
+            self.sql = str(stmt)
+            return SimpleNamespace(scalar=lambda: None)
+
+    conn = Conn()
+    assert replicas._postgres_lag_seconds(conn) == 0.0
+    assert "pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()" in conn.sql
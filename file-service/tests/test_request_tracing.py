@@ -0,0 +1,64 @@
+import json
+from io import BytesIO
+import pytest
+import tracing
+from app import create_app
+from db import db
+from conftest import make_test_jwt
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+@pytest.fixture
+def traced_client(tmp_path, monkeypatch):
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACING_EXPORTER", "file")
+    monkeypatch.setenv("TRACING_FILE_PATH", str(trace_file))
+    monkeypatch.setenv("TRACING_SAMPLE_RATIO", "0")
+    # PARENT's sampled flag decides, as behind a trusted caller
+    monkeypatch.setenv("TRACING_TRUST_UPSTREAM", "true")
+    app = create_app("sqlite:///:memory:")
+    app.config["TESTING"] = True
+    app.config["UPLOAD_DIR"] = str(tmp_path / "uploads")
+    with app.app_context():
+        db.create_all()
+        yield app.test_client(), trace_file
+        db.session.remove()
+        db.drop_all()
+    monkeypatch.setenv("TRACING_EXPORTER", "none")
+    tracing.configure()
+
+def _spans(trace_file):
+    assert tracing.flush(5)
+    return [json.loads(line) for line in trace_file.read_text().splitlines()]
+
+def test_upload_continues_incoming_trace(traced_client):
+    client, trace_file = traced_client
+    headers = {"Authorization": f"Bearer {make_test_jwt(user_id=1)}", "traceparent": PARENT}
+
+    res = client.post(
+        "/dashboard/upload",
+        data={"file": (BytesIO(b"hello"), "a.txt", "text/plain")},
+        headers=headers,
+        content_type="multipart/form-data",
+    )
+    assert res.status_code == 201
+
+    spans = _spans(trace_file)
+    assert {s["trace_id"] for s in spans} == {TRACE_ID}
+    server = next(s for s in spans if s["kind"] == "server")
+    assert server["name"] == "POST /dashboard/upload"
+    assert server["parent_id"] == "00f067aa0ba902b7"
+    assert server["attributes"]["http.status_code"] == 201
+
+    names = {s["name"] for s in spans}
+    assert {"jwt.decode", "disk.write", "disk.fsync", "db.query"} <= names
+    children = [s for s in spans if s["kind"] != "server"]
+    assert all(s["parent_id"] == server["span_id"] for s in children)
+
+def test_unsampled_requests_export_nothing(traced_client):
+    client, trace_file = traced_client
+    res = client.get("/dashboard", headers={"Authorization": f"Bearer {make_test_jwt(user_id=1)}"})
+    assert res.status_code == 200
+    assert tracing.flush(5)
+    assert not trace_file.exists()
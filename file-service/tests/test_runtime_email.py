@@ -7,16 +7,19 @@ def test_unauthorized_upload_triggers_email(client, monkeypatch):
 
     sent = []
 
-    def fake_send_email(subject, body):
-        sent.append((subject, body))
+    def fake_deliver_batch(messages):
+        sent.extend(messages)
 
-    # patch the actual send function so no SMTP happens
-    monkeypatch.setattr(notify, "send_email_smtp", fake_send_email)
+    # patch the actual delivery function so no SMTP happens
+    monkeypatch.setattr(notify, "deliver_batch", fake_deliver_batch)
 
     # call your endpoint without auth header -> should 401 and trigger notify
     res = client.post("/dashboard/upload")
     assert res.status_code == 401
 
+    # delivery is asynchronous; wait for the worker to drain the queue
+    assert notify.flush(timeout=5)
+
     assert len(sent) == 1
     subject, body = sent[0]
     assert "Unauthorized" in subject
@@ -27,9 +30,10 @@ def test_server_error_triggers_email(client, monkeypatch):
     monkeypatch.setenv("EMAIL_RATE_LIMIT_SECONDS", "0")
 
     sent = []
-    monkeypatch.setattr(notify, "send_email_smtp", lambda s, b: sent.append((s, b)))
+    monkeypatch.setattr(notify, "deliver_batch", lambda msgs: sent.extend(msgs))
 
     res = client.get("/test/crash")
     assert res.status_code == 500
+    assert notify.flush(timeout=5)
     assert len(sent) == 1
-    assert "500" in sent[0][0] or "Unhandled" in sent[0][0]
\ No newline at end of file
+    assert "500" in sent[0][0] or "Unhandled" in sent[0][0]
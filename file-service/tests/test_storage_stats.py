@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+import pytest
+from db import db
+from models import File, StorageUsageDelta
+from conftest import auth_headers, upload_id
+from storage_stats import rebuild, refresh
+
+ADMIN = auth_headers(99, role="admin")
+
+
+@pytest.fixture
+def stats(app, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path)
+    app.config["STORAGE_STATS_ENABLED"] = True
+
+
+def test_endpoints_are_admin_only_and_off_by_default(app, client):
+    assert client.get("/admin/storage", headers=ADMIN).status_code == 404
+    app.config["STORAGE_STATS_ENABLED"] = True
+    user = auth_headers(1)
+    assert client.get("/admin/storage/users", headers=user).status_code == 403
+
+
+def test_uploads_and_deletes_are_folded_incrementally(stats, client):
+    upload_id(client, b"a" * 100, user_id=1)
+    upload_id(client, b"b" * 50, user_id=1, content_type="image/png")
+    gone = upload_id(client, b"c" * 500, user_id=2)
+    upload_id(client, b"d" * 10, user_id=3)
+    client.post(f"/dashboard/delete/{gone}", headers=auth_headers(2))
+
+    summary = client.get("/admin/storage", headers=ADMIN).get_json()
+    assert summary["pending_changes"] == 5 and summary["bytes"] == 0  # nothing folded yet
+
+    assert client.post("/admin/storage/refresh", headers=ADMIN).get_json() == {"applied": 5}
+    assert StorageUsageDelta.query.count() == 0
+
+    summary = client.get("/admin/storage", headers=ADMIN).get_json()
+    assert (summary["files"], summary["bytes"], summary["users"]) == (3, 160, 2)
+
+    users = client.get("/admin/storage/users?limit=1", headers=ADMIN).get_json()["users"]
+    assert users == [{"user_id": 1, "files": 2, "bytes": 150, "stored_bytes": 150}]
+
+    types = client.get("/admin/storage/content-types", headers=ADMIN).get_json()["content_types"]
+    assert [(t["content_type"], t["bytes"]) for t in types] == [("text/plain", 110), ("image/png", 50)]
+
+    (today,) = client.get("/admin/storage/growth", headers=ADMIN).get_json()["days"]
+    assert (today["files_added"], today["bytes_added"], today["files_removed"], today["bytes_removed"]) == (4, 660, 1, 500)
+    assert today["net_bytes"] == 160
+
+
+def test_refresh_works_in_batches(stats, client):
+    for i in range(5):
+        upload_id(client, b"x" * 10, user_id=1)
+
+    assert refresh(batch_size=2) == 2
+    assert refresh(batch_size=2) == 2
+    assert refresh(batch_size=2) == 1
+    assert refresh(batch_size=2) == 0
+    assert client.get("/admin/storage/users", headers=ADMIN).get_json()["users"][0]["bytes"] == 50
+
+
+def test_rebuild_matches_the_files_table(stats, app, client):
+    app.config["STORAGE_STATS_ENABLED"] = False  # files written before the feature was enabled
+    upload_id(client, b"old" * 10, user_id=1)
+    app.config["STORAGE_STATS_ENABLED"] = True
+    f = File.query.first()
+    f.created_at = datetime.utcnow() - timedelta(days=3)
+    db.session.commit()
+    upload_id(client, b"new", user_id=2)
+
+    assert rebuild() == {"users": 2, "content_types": 1, "days": 2}
+    assert StorageUsageDelta.query.count() == 0  # already included by the rebuild
+
+    days = client.get("/admin/storage/growth", headers=ADMIN).get_json()["days"]
+    assert [d["bytes_added"] for d in days] == [30, 3]
+    assert client.get("/admin/storage", headers=ADMIN).get_json()["bytes"] == 33
@@ -0,0 +1,143 @@
+import os
+import threading
+from io import BytesIO
+import pytest
+from PIL import Image, ImageFile
+from models import File
+from conftest import auth_headers, upload_id
+from thumbnails import ThumbnailService, SourceRef
+
+
+PNG = {"filename": "photo.png", "content_type": "image/png"}
+
+
+def _png(width=400, height=200):
+    out = BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(out, format="PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def thumbnails(app, tmp_path):
+    app.config["UPLOAD_DIR"] = str(tmp_path / "uploads")
+    service = ThumbnailService(str(tmp_path / "thumbs"), sizes=(64, 128), workers=2)
+    app.extensions["thumbnails"] = service
+    return service
+
+
+def test_thumbnail_is_rendered_once_and_cached(thumbnails, client):
+    file_id = upload_id(client, _png(), **PNG)
+
+    first = client.get(f"/dashboard/thumbnail/{file_id}?size=128", headers=auth_headers())
+    assert first.status_code == 200
+    assert first.mimetype == "image/png"
+    assert Image.open(BytesIO(first.data)).size == (128, 64)
+    assert first.headers["ETag"]
+    cache_control = first.headers["Cache-Control"]
+    assert "private" in cache_control and "immutable" in cache_control and "public" not in cache_control
+
+    path = thumbnails.path(file_id, 128)
+    assert os.path.exists(path)
+    mtime = os.path.getmtime(path)
+    again = client.get(f"/dashboard/thumbnail/{file_id}?size=128", headers=auth_headers())
+    assert again.data == first.data and os.path.getmtime(path) == mtime
+
+    revalidated = client.get(
+        f"/dashboard/thumbnail/{file_id}?size=128",
+        headers={**auth_headers(), "If-None-Match": first.headers["ETag"]},
+    )
+    assert revalidated.status_code == 304
+
+
+def test_only_owner_and_configured_sizes(thumbnails, client):
+    file_id = upload_id(client, _png(), **PNG)
+
+    assert client.get(f"/dashboard/thumbnail/{file_id}?size=64", headers=auth_headers(2)).status_code == 404
+    assert client.get(f"/dashboard/thumbnail/{file_id}?size=1000", headers=auth_headers()).status_code == 400
+    assert client.get(f"/dashboard/thumbnail/{file_id}").status_code == 401
+
+
+def test_non_images_are_rejected(thumbnails, client):
+    text_id = upload_id(client, b"hello")
+    broken_id = upload_id(client, b"not really a png", **PNG)
+
+    assert client.get(f"/dashboard/thumbnail/{text_id}", headers=auth_headers()).status_code == 415
+    assert client.get(f"/dashboard/thumbnail/{broken_id}", headers=auth_headers()).status_code == 422
+
+
+def test_images_over_the_pixel_cap_are_refused_before_decoding(thumbnails, client, monkeypatch):
+    file_id = upload_id(client, _png(400, 200), **PNG)
+    thumbnails.max_pixels = 400 * 200 - 1
+
+    def no_decode(self):
+        raise AssertionError("pixel data decoded")
+
+    with monkeypatch.context() as m:
+        m.setattr(ImageFile.ImageFile, "load", no_decode)
+        assert client.get(f"/dashboard/thumbnail/{file_id}?size=64", headers=auth_headers()).status_code == 422
+
+    thumbnails.max_pixels = 400 * 200
+    assert client.get(f"/dashboard/thumbnail/{file_id}?size=64", headers=auth_headers()).status_code == 200
+
+
+def test_concurrent_requests_share_one_render(thumbnails, client, monkeypatch):
+    file_id = upload_id(client, _png(), **PNG)
+    source = SourceRef(File.query.get(file_id))
+
+    release = threading.Event()
+    calls = []
+    real_render = thumbnails._render_to_disk
+
+    def slow_render(src, size):
+        calls.append(size)
+        release.wait(5)
+        return real_render(src, size)
+
+    monkeypatch.setattr(thumbnails, "_render_to_disk", slow_render)
+    futures = [thumbnails.submit(source, 64) for _ in range(5)]
+    release.set()
+
+    assert [joined for _, joined in futures] == [False, True, True, True, True]
+    assert {future.result(timeout=5) for future, _ in futures} == {thumbnails.path(file_id, 64)}
+    assert calls == [64]
+
+
+def test_slow_render_answers_503_and_keeps_rendering(thumbnails, client, monkeypatch):
+    file_id = upload_id(client, _png(), **PNG)
+    release = threading.Event()
+    real_render = thumbnails._render_to_disk
+
+    def slow_render(src, size):
+        release.wait(5)
+        return real_render(src, size)
+
+    monkeypatch.setattr(thumbnails, "_render_to_disk", slow_render)
+    real_get = thumbnails.get_or_create
+    monkeypatch.setattr(thumbnails, "get_or_create", lambda source, size: real_get(source, size, timeout=0.05))
+
+    resp = client.get(f"/dashboard/thumbnail/{file_id}?size=64", headers=auth_headers())
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"]
+
+    release.set()
+    assert client.get(f"/dashboard/thumbnail/{file_id}?size=64", headers=auth_headers()).status_code == 200
+
+
+def test_delete_removes_thumbnails(thumbnails, client):
+    file_id = upload_id(client, _png(), **PNG)
+    for size in (64, 128):
+        client.get(f"/dashboard/thumbnail/{file_id}?size={size}", headers=auth_headers())
+    assert os.path.exists(thumbnails.path(file_id, 64))
+
+    client.post(f"/dashboard/delete/{file_id}", headers=auth_headers())
+    assert not os.path.exists(thumbnails.path(file_id, 64))
+    assert not os.path.exists(thumbnails.path(file_id, 128))
+
+
+def test_eager_mode_renders_at_upload(thumbnails, app, client):
+    app.config["THUMBNAIL_EAGER"] = True
+    file_id = upload_id(client, _png(), **PNG)
+
+    thumbnails._pool().shutdown(wait=True)  # let the queued renders finish
+    assert os.path.exists(thumbnails.path(file_id, 64))
+    assert os.path.exists(thumbnails.path(file_id, 128))
@@ -0,0 +1,186 @@
+import json
+import os
+import pytest
+from sqlalchemy.orm.attributes import set_committed_value
+from app import create_app
+from db import db
+from models import File
+from conftest import auth_headers, upload, upload_id
+import dashboard
+import routes
+import volumes
+from volumes import VolumeSet, parse_volumes
+from purge import reap
+
+
+@pytest.fixture
+def vol_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(volumes, "STATE_CACHE_SECONDS", 0)
+    monkeypatch.setenv("STORAGE_VOLUMES", f"v1={tmp_path / 'disk1'},v2={tmp_path / 'disk2'}")
+    monkeypatch.setenv("STORAGE_PLACEMENT", "round_robin")
+    monkeypatch.setenv("STORAGE_VOLUME_MIN_FREE_BYTES", "0")
+    app = create_app("sqlite:///:memory:")
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_parse_volumes():
+    assert parse_volumes("a=/x, b=/y") == [("a", "/x"), ("b", "/y")]
+    assert parse_volumes("") == []
+    with pytest.raises(ValueError):
+        parse_volumes("/x")
+    with pytest.raises(ValueError):
+        parse_volumes("a=/x,a=/y")
+
+
+def test_owner_hash_is_stable_and_spreads(tmp_path):
+    volume_set = VolumeSet([(f"v{i}", str(tmp_path / f"d{i}")) for i in range(3)], policy="owner_hash")
+    placed = {owner: volume_set.place(owner).name for owner in range(300)}
+    assert placed == {owner: volume_set.place(owner).name for owner in range(300)}
+    assert set(placed.values()) == {"v0", "v1", "v2"}
+
+
+def test_uploads_are_spread_and_record_their_volume(vol_app):
+    client = vol_app.test_client()
+    ids = [upload_id(client) for _ in range(4)]
+
+    rows = [File.query.get(i) for i in ids]
+    assert [r.volume for r in rows] == ["v1", "v2", "v1", "v2"]
+    for r in rows:
+        assert vol_app.extensions["volumes"].get(r.volume).contains(r.storage_path)
+
+
+def test_draining_and_readonly_volumes_take_no_new_files(vol_app, tmp_path):
+    client = vol_app.test_client()
+    (tmp_path / "disk1" / ".draining").touch()
+    assert {File.query.get(upload_id(client)).volume for _ in range(3)} == {"v2"}
+
+    (tmp_path / "disk2" / ".readonly").touch()
+    resp = upload(client)
+    assert resp.status_code == 503
+
+
+def test_delete_on_readonly_volume_defers_the_blob(vol_app, tmp_path):
+    client = vol_app.test_client()
+    file_id = upload_id(client)
+    rec = File.query.get(file_id)
+    path = rec.storage_path
+    marker = tmp_path / ("disk1" if rec.volume == "v1" else "disk2") / ".readonly"
+    marker.touch()
+
+    resp = client.post(f"/dashboard/delete/{file_id}", headers=auth_headers(1))
+    assert resp.status_code == 200
+    assert os.path.exists(path)
+
+    # queued, and reaped only once the volume is writable again
+    assert reap() == 0
+    assert os.path.exists(path)
+    marker.unlink()
+    assert reap() == 1
+    assert not os.path.exists(path)
+
+
+def _blobs(tmp_path):
+    return [n for disk in ("disk1", "disk2") for n in os.listdir(tmp_path / disk) if not n.startswith(".")]
+
+
+def test_delete_racing_a_move_leaves_no_orphan(vol_app, tmp_path, monkeypatch):
+    client = vol_app.test_client()
+    file_id = upload_id(client)
+    real_get = dashboard.get_owned_file_or_none
+    moved = []
+
+    def get_then_move(user_id, fid, use_replica=False):
+        f = real_get(user_id, fid, use_replica)
+        if f is not None and not moved:
+            # the rebalancer runs between delete's read and its row delete
+            seen_path, seen_volume = f.storage_path, f.volume
+            target = vol_app.extensions["volumes"].get("v2" if f.volume == "v1" else "v1")
+            moved.append(volumes.move_file(f.id, f.storage_path, target))
+            # as read by this request before another process moved it
+            set_committed_value(f, "storage_path", seen_path)
+            set_committed_value(f, "volume", seen_volume)
+        return f
+
+    monkeypatch.setattr(dashboard, "get_owned_file_or_none", get_then_move)
+    assert client.post(f"/dashboard/delete/{file_id}", headers=auth_headers(1)).status_code == 200
+
+    assert moved == [True]
+    assert File.query.count() == 0
+    assert _blobs(tmp_path) == []
+
+
+def test_download_of_a_blob_removed_after_the_check_is_404(vol_app, monkeypatch):
+    client = vol_app.test_client()
+    file_id = upload_id(client)
+
+    def gone(*args, **kwargs):
+        raise FileNotFoundError("removed meanwhile")
+
+    monkeypatch.setattr(routes, "send_file", gone)
+    assert client.get(f"/dashboard/download/{file_id}", headers=auth_headers(1)).status_code == 404
+
+
+def test_rebalance_drains_a_volume_online(vol_app, tmp_path):
+    client = vol_app.test_client()
+    ids = [upload_id(client, b"file %d" % i) for i in range(4)]
+    (tmp_path / "disk1" / ".draining").touch()
+
+    runner = vol_app.test_cli_runner()
+    dry = json.loads(runner.invoke(args=["volumes", "rebalance", "--dry-run"]).output)
+    assert dry["planned"] == 2 and {m["to"] for m in dry["moves"]} == {"v2"}
+
+    result = runner.invoke(args=["volumes", "rebalance"])
+    stats = json.loads(result.output)
+    assert stats["moved"] == 2 and stats["failed"] == 0
+
+    db.session.expire_all()
+    assert {File.query.get(i).volume for i in ids} == {"v2"}
+    assert [n for n in os.listdir(tmp_path / "disk1") if not n.startswith(".")] == []
+
+    for i, file_id in enumerate(ids):
+        resp = client.get(f"/dashboard/download/{file_id}", headers=auth_headers())
+        assert resp.status_code == 200
+        assert resp.data == b"file %d" % i
+
+
+def test_rebalance_skips_files_deleted_meanwhile(vol_app, tmp_path):
+    client = vol_app.test_client()
+    file_id = upload_id(client)
+    rec = File.query.get(file_id)
+    src = rec.storage_path
+    target = vol_app.extensions["volumes"].get("v2" if rec.volume == "v1" else "v1")
+    db.session.delete(rec)
+    db.session.commit()
+
+    assert volumes.move_file(file_id, src, target) is False
+    assert os.listdir(target.path) == []
+
+
+def test_balance_moves_only_files_that_fit_the_gap(vol_app, tmp_path, monkeypatch):
+    # v1 at 60/100 bytes, v2 at 40/100: moving the 10-byte file alone balances them
+    sizes = {"v1": [30, 20, 10], "v2": [25, 15]}
+    for name, file_sizes in sizes.items():
+        for size in file_sizes:
+            db.session.add(File(owner_user_id=1, filename=f"{size}.bin", storage_path=str(tmp_path / name / str(size)),
+                                content_type="text/plain", size_bytes=size, volume=name))
+    db.session.commit()
+    monkeypatch.setattr(volumes.Volume, "usage", lambda self: (100, 100 - sum(sizes[self.name])))
+
+    moves = volumes.plan_moves(vol_app.extensions["volumes"], tolerance=0.0)
+    assert [(size, source, target) for _, _, size, source, target in moves] == [(10, "v1", "v2")]
+
+
+def test_backfill_assigns_legacy_rows(vol_app, tmp_path):
+    legacy = File(owner_user_id=1, filename="old.txt", storage_path=str(tmp_path / "disk2" / "old"),
+                  content_type="text/plain", size_bytes=1)
+    db.session.add(legacy)
+    db.session.commit()
+
+    result = vol_app.test_cli_runner().invoke(args=["volumes", "backfill"])
+    assert json.loads(result.output) == {"updated": 1}
+    assert File.query.get(legacy.id).volume == "v2"
@@ -0,0 +1,67 @@
+import jwt
+from datetime import datetime, timedelta, UTC
+from types import SimpleNamespace
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+import auth
+
+def _fake_request(token):
+    return SimpleNamespace(headers={"Authorization": f"Bearer {token}"})
+
+def _write_ed25519_keys(tmp_path):
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    public_path = tmp_path / "ed25519_public.pem"
+    public_path.write_bytes(public_pem)
+    return private_key, public_path
+
+def test_eddsa_token_is_accepted_when_configured(monkeypatch, tmp_path):
+    private_key, public_path = _write_ed25519_keys(tmp_path)
+    monkeypatch.setenv("TESTING", "false")
+    monkeypatch.setenv("JWT_ALGORITHM", "EdDSA")
+    monkeypatch.setenv("JWT_PUBLIC_KEY_PATH", str(public_path))
+
+    token = jwt.encode(
+        {"sub": "7", "exp": datetime.now(UTC) + timedelta(minutes=5)},
+        private_key,
+        algorithm="EdDSA",
+    )
+
+    assert auth.get_authenticated_user_id(_fake_request(token)) == 7
+
+def test_token_signed_with_other_algorithm_is_rejected(monkeypatch, tmp_path):
+    _, public_path = _write_ed25519_keys(tmp_path)
+    monkeypatch.setenv("TESTING", "false")
+    monkeypatch.setenv("JWT_ALGORITHM", "EdDSA")
+    monkeypatch.setenv("JWT_PUBLIC_KEY_PATH", str(public_path))
+
+    token = jwt.encode(
+        {"sub": "7", "exp": datetime.now(UTC) + timedelta(minutes=5)},
+        "test-secret",
+        algorithm="HS256",
+    )
+
+    assert auth.get_authenticated_user_id(_fake_request(token)) is None
+
+def test_unsupported_algorithm_returns_none(monkeypatch):
+    monkeypatch.setenv("TESTING", "false")
+    monkeypatch.setenv("JWT_ALGORITHM", "none")
+
+    assert auth.get_authenticated_user_id(_fake_request("abc.def.ghi")) is None
+
+def test_hs256_without_secret_rejects_outside_tests(monkeypatch):
+    monkeypatch.setenv("TESTING", "false")
+    monkeypatch.setenv("JWT_ALGORITHM", "HS256")
+    monkeypatch.delenv("JWT_SECRET", raising=False)
+
+    token = jwt.encode(
+        {"sub": "7", "exp": datetime.now(UTC) + timedelta(minutes=5)},
+        "test-secret",
+        algorithm="HS256",
+    )
+
+    assert auth.get_authenticated_user_id(_fake_request(token)) is None
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from prometheus_client import REGISTRY
+
+from db_pool import (
+    TimedQueuePool, engine_options_from_env, track_engine_pool, POOL_CHECKOUT_TIMEOUTS,
+)
+
+PG_URL = "postgresql+psycopg2://u:p@localhost:5432/db"
+
+def test_postgres_options_come_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "5")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "2.5")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "300")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "5000")
+
+    opts = engine_options_from_env(PG_URL, timed_pool=True)
+
+    assert opts["pool_size"] == 20
+    assert opts["max_overflow"] == 5
+    assert opts["pool_timeout"] == 2.5
+    assert opts["pool_recycle"] == 300
+    assert opts["pool_pre_ping"] is True
+    assert opts["poolclass"] is TimedQueuePool
+    assert opts["connect_args"]["options"] == "-c statement_timeout=5000"
+
+def test_pgbouncer_mode_sends_no_startup_options(monkeypatch):
+    monkeypatch.setenv("DB_PGBOUNCER", "true")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "5000")
+
+    assert "connect_args" not in engine_options_from_env(PG_URL)
+    opts = engine_options_from_env("postgresql+psycopg://u:p@localhost/db")
+    assert opts["connect_args"] == {"prepare_threshold": None}
+
+def test_sqlite_gets_no_pool_sizing():
+    assert engine_options_from_env("sqlite:///:memory:") == {}
+
+def test_pool_metrics_and_timeouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05,
+    )
+    track_engine_pool(engine, "test")
+    before = POOL_CHECKOUT_TIMEOUTS.labels(pool="test")._value.get()
+
+    held = engine.connect()
+    held.execute(text("SELECT 1"))
+    assert REGISTRY.get_sample_value("db_pool_checked_out", {"pool": "test"}) == 1
+
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+
+    held.close()
+    assert POOL_CHECKOUT_TIMEOUTS.labels(pool="test")._value.get() == before + 1
+    assert REGISTRY.get_sample_value("db_pool_checked_out", {"pool": "test"}) == 0
+    assert REGISTRY.get_sample_value("db_pool_checkout_seconds_count", {"pool": "test"}) >= 2
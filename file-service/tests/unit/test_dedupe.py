@@ -0,0 +1,89 @@
+import multiprocessing
+import pytest
+
+import metrics
+from dedupe import MemoryDedupeStore, SQLiteDedupeStore, RedisDedupeStore
+from metrics import NOTIFY_DEDUPE_EVICTIONS
+
+def _evictions(reason):
+    return NOTIFY_DEDUPE_EVICTIONS.labels(reason=reason)._value.get()
+
+def test_memory_store_rate_limits_within_window():
+    store = MemoryDedupeStore()
+
+    assert store.should_send("k", 60, now=1000) is True
+    assert store.should_send("k", 60, now=1030) is False
+    assert store.should_send("k", 60, now=1061) is True
+
+def test_memory_store_expires_old_keys():
+    store = MemoryDedupeStore()
+    before = _evictions("expired")
+
+    for i in range(100):
+        store.should_send(f"ip:{i}", 60, now=1000)
+    store.should_send("late", 60, now=2000)
+
+    assert len(store) == 1
+    assert _evictions("expired") - before == 100
+
+def test_memory_store_is_bounded_under_key_scan():
+    store = MemoryDedupeStore(max_keys=50)
+    before = _evictions("capacity")
+
+    for i in range(1000):
+        store.should_send(f"ip:{i}", 60, now=1000 + i * 0.001)
+
+    assert len(store) == 50
+    assert _evictions("capacity") - before == 950
+
+def test_evictions_are_not_counted_with_metrics_disabled():
+    store = MemoryDedupeStore(max_keys=1)
+    before = _evictions("capacity")
+    metrics.set_enabled(False)
+    try:
+        store.should_send("a", 60, now=1000)
+        store.should_send("b", 60, now=1001)
+    finally:
+        metrics.set_enabled(True)
+    assert len(store) == 1
+    assert _evictions("capacity") == before
+
+def test_sqlite_store_rate_limits_and_prunes(tmp_path):
+    store = SQLiteDedupeStore(str(tmp_path / "dedupe.db"), max_keys=10)
+
+    assert store.should_send("k", 60, now=1000) is True
+    assert store.should_send("k", 60, now=1010) is False
+    assert store.should_send("k", 60, now=1070) is True
+
+    for i in range(30):
+        store.should_send(f"ip:{i}", 60, now=1070)
+    store.prune(now=1080)
+
+    assert len(store) == 10
+
+def _worker_should_send(path, results):
+    store = SQLiteDedupeStore(path)
+    results.put(store.should_send("server_error:GET:/x", 60))
+
+def test_sqlite_store_dedupes_across_processes(tmp_path):
+    path = str(tmp_path / "dedupe.db")
+    SQLiteDedupeStore(path)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker_should_send, args=(path, results)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=30)
+
+    outcomes = [results.get(timeout=5) for _ in procs]
+    assert outcomes.count(True) == 1
+
+def test_redis_store_with_fake_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    store = RedisDedupeStore(fakeredis.FakeRedis())
+
+    assert store.should_send("k", 60) is True
+    assert store.should_send("k", 60) is False
+    assert store.should_send("k", 0) is True
@@ -0,0 +1,91 @@
+import time
+import notify
+from digest import DigestAggregator, format_digest, OVERFLOW_KEY
+
+def test_counts_per_event_and_key_with_first_and_last():
+    agg = DigestAggregator(window_s=60)
+
+    for i in range(10000):
+        agg.record("upload_invalid", "10.0.0.1", now=1000 + i * 0.01)
+    agg.record("download_not_found", "10.0.0.2", now=1050)
+
+    entries = agg.take_if_due(now=1200, force=True)
+
+    assert entries[("upload_invalid", "10.0.0.1")] == [10000, 1000, 1000 + 9999 * 0.01]
+    assert entries[("download_not_found", "10.0.0.2")][0] == 1
+
+def test_memory_is_bounded_by_overflow_bucket():
+    agg = DigestAggregator(window_s=60, max_keys=10)
+
+    for i in range(1000):
+        agg.record("upload_invalid", f"ip:{i}", now=1000)
+
+    entries = agg.take_if_due(now=1100, force=True)
+    assert len(entries) == 11
+    assert entries[("upload_invalid", OVERFLOW_KEY)][0] == 990
+    assert sum(e[0] for e in entries.values()) == 1000
+
+def test_nothing_taken_until_window_elapses():
+    agg = DigestAggregator(window_s=60)
+    start = agg._window_start
+    agg.record("server_error", "GET:/x", now=start)
+
+    assert agg.take_if_due(now=start + 30) is None
+    assert agg.take_if_due(now=start + 61) is not None
+    assert agg.take_if_due(now=start + 200) is None  # reset after flush
+
+def test_format_digest_summarises_busiest_first():
+    subject, body = format_digest({
+        ("a", "k1"): [5, 1000, 1010],
+        ("b", "k2"): [500, 1000, 1020],
+    })
+
+    assert "505 suppressed events" in subject
+    lines = body.splitlines()
+    assert "event=b" in lines[1]
+    assert "count=500" in lines[1]
+
+def test_suppressed_events_are_sent_as_one_digest(client, monkeypatch):
+    monkeypatch.setenv("ENABLE_RUNTIME_EMAILS", "true")
+    monkeypatch.setenv("EMAIL_RATE_LIMIT_SECONDS", "60")
+    monkeypatch.setattr(notify, "_DEDUPE", None)
+    monkeypatch.setattr(notify, "_DIGEST", DigestAggregator(window_s=3600))
+
+    sent = []
+    monkeypatch.setattr(notify, "deliver_batch", lambda msgs: sent.extend(msgs))
+
+    for _ in range(20):
+        assert client.post("/dashboard/upload").status_code == 401
+
+    assert notify.flush(timeout=5)
+    assert len(sent) == 1  # first event only; the rest are suppressed
+
+    assert notify.flush_digest(force=True)
+    assert notify.flush(timeout=5)
+
+    assert len(sent) == 2
+    subject, body = sent[1]
+    assert "19 suppressed events" in subject
+    assert "event=upload_unauthorized" in body
+
+def test_digest_is_flushed_when_this_process_never_sent(monkeypatch):
+    # e.g. a shared dedupe store already let another worker send the first event
+    class AlreadySent:
+        def should_send(self, key, rate_limit_s):
+            return False
+
+    monkeypatch.setenv("ENABLE_RUNTIME_EMAILS", "true")
+    monkeypatch.setattr(notify, "_DEDUPE", AlreadySent())
+    monkeypatch.setattr(notify, "_DIGEST", DigestAggregator(window_s=0.05))
+    monkeypatch.setattr(notify, "_WORKER", notify.NotificationWorker(batch_wait_s=0.01, on_tick=notify.flush_digest))
+
+    sent = []
+    monkeypatch.setattr(notify, "deliver_batch", lambda msgs: sent.extend(msgs))
+
+    notify.notify_event("upload_unauthorized", "s", "b", dedupe_key="1.2.3.4")
+
+    deadline = time.monotonic() + 5
+    while not sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(sent) == 1
+    assert "1 suppressed event" in sent[0][0]
@@ -0,0 +1,48 @@
+import runpy
+import multiprocessing
+from pathlib import Path
+
+CONF_PATH = str(Path(__file__).resolve().parents[2] / "gunicorn.conf.py")
+
+def test_defaults_scale_with_cpu_count(monkeypatch):
+    for name in ("GUNICORN_WORKERS", "GUNICORN_THREADS", "GUNICORN_WORKER_CLASS"):
+        monkeypatch.delenv(name, raising=False)
+
+    conf = runpy.run_path(CONF_PATH)
+
+    assert conf["worker_class"] == "gthread"
+    assert conf["workers"] == multiprocessing.cpu_count() * 2 + 1
+    assert conf["threads"] == 4
+    assert conf["preload_app"] is True
+    assert conf["max_requests"] > 0
+
+def test_env_overrides(monkeypatch):
+    monkeypatch.setenv("GUNICORN_WORKER_CLASS", "gevent")
+    monkeypatch.setenv("GUNICORN_WORKERS", "3")
+
+    conf = runpy.run_path(CONF_PATH)
+
+    assert conf["worker_class"] == "gevent"
+    assert conf["workers"] == 3
+    assert conf["threads"] == 1
+
+def test_several_workers_share_replica_write_markers(monkeypatch):
+    monkeypatch.delenv("DB_REPLICA_STICKY_BACKEND", raising=False)
+    monkeypatch.setenv("GUNICORN_WORKERS", "3")
+    assert runpy.run_path(CONF_PATH)["raw_env"] == ["DB_REPLICA_STICKY_BACKEND=sqlite"]
+
+    monkeypatch.setenv("GUNICORN_WORKERS", "1")
+    assert runpy.run_path(CONF_PATH)["raw_env"] == []
+
+def test_post_fork_disposes_inherited_pool(app, monkeypatch):
+    from db import db
+
+    disposed = []
+    engine = db.engine
+    monkeypatch.setattr(type(engine), "dispose", lambda self, close=True: disposed.append(close))
+    monkeypatch.setattr("app.app", app)
+
+    conf = runpy.run_path(CONF_PATH)
+    conf["post_fork"](server=None, worker=None)
+
+    assert disposed == [False]
@@ -0,0 +1,117 @@
+import socket
+import time
+import threading
+import pytest
+
+import notify
+from notify import NotificationWorker
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """Local stand-in SMTP server (aiosmtpd) that records received messages."""
+    controller_mod = pytest.importorskip("aiosmtpd.controller")
+
+    received = []
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            received.append(envelope.content.decode("utf-8", "replace"))
+            return "250 OK"
+
+    port = _free_port()
+    controller = controller_mod.Controller(Handler(), hostname="127.0.0.1", port=port)
+    controller.start()
+
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    monkeypatch.setenv("SMTP_STARTTLS", "false")
+    monkeypatch.delenv("SMTP_USERNAME", raising=False)
+    monkeypatch.delenv("SMTP_PASSWORD", raising=False)
+    monkeypatch.setenv("RUNTIME_EMAIL_TO", "ops@example.com")
+    monkeypatch.setenv("EMAIL_FROM", "file-service@example.com")
+
+    yield received
+
+    notify._CONNECTION.close()
+    controller.stop()
+
+def test_worker_delivers_batch_over_local_smtp(smtp_server):
+    worker = NotificationWorker(batch_wait_s=0.05)
+
+    for i in range(3):
+        assert worker.submit(f"subject {i}", f"body {i}")
+
+    assert worker.flush(timeout=5)
+    assert len(smtp_server) == 3
+    assert "subject 0" in smtp_server[0]
+    assert worker.stats["sent"] == 3
+
+def test_submit_does_not_wait_for_slow_delivery(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(notify, "deliver_batch", lambda msgs: release.wait(5))
+    worker = NotificationWorker(batch_wait_s=0.01)
+
+    start = time.monotonic()
+    worker.submit("s", "b")
+    assert time.monotonic() - start < 0.1
+
+    release.set()
+    assert worker.flush(timeout=5)
+
+def test_full_queue_drops_and_counts(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(notify, "deliver_batch", lambda msgs: release.wait(5))
+    worker = NotificationWorker(max_queue=2, batch_size=1, batch_wait_s=0.01)
+
+    results = [worker.submit("s", str(i)) for i in range(10)]
+
+    assert results.count(False) >= 1
+    assert worker.stats["dropped"] == results.count(False)
+    release.set()
+    assert worker.flush(timeout=5)
+
+def test_failed_batch_is_retried_with_backoff(monkeypatch):
+    calls = []
+
+    def flaky(messages):
+        calls.append(len(messages))
+        if len(calls) < 3:
+            raise OSError("connection refused")
+
+    monkeypatch.setattr(notify, "deliver_batch", flaky)
+    worker = NotificationWorker(batch_wait_s=0.01, max_retries=3, backoff_s=0.01)
+
+    worker.submit("s", "b")
+    assert worker.flush(timeout=5)
+
+    assert len(calls) == 3
+    assert worker.stats["retries"] == 2
+    assert worker.stats["sent"] == 1
+    assert worker.stats["failed"] == 0
+
+def test_retry_resends_only_undelivered_messages(monkeypatch):
+    delivered = []
+    attempts = []
+
+    def fails_at_third(messages):
+        attempts.append([m[0] for m in messages])
+        for i, message in enumerate(messages):
+            if len(attempts) == 1 and i == 2:
+                raise notify.PartialDelivery(i, OSError("connection reset"))
+            delivered.append(message[0])
+
+    monkeypatch.setattr(notify, "deliver_batch", fails_at_third)
+    worker = NotificationWorker(batch_wait_s=0.05, max_retries=3, backoff_s=0.01)
+
+    for i in range(4):
+        worker.submit(f"s{i}", "b")
+    assert worker.flush(timeout=5)
+
+    assert attempts == [["s0", "s1", "s2", "s3"], ["s2", "s3"]]
+    assert delivered == ["s0", "s1", "s2", "s3"]
+    assert worker.stats["sent"] == 4
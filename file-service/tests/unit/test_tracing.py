@@ -0,0 +1,167 @@
+import json
+from pathlib import Path
+import pytest
+from flask import Flask
+import tracing
+from tracing import Tracer, parse_traceparent, format_traceparent, otlp_payload, start_span
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+class ListExporter:
+    def __init__(self, service_name="test"):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+@pytest.fixture
+def exporter():
+    exp = ListExporter()
+    tracing.configure("test", exporter=exp, sample_ratio=1.0)
+    yield exp
+    tracing.configure("test", exporter=None, sample_ratio=0.0)
+
+@pytest.mark.parametrize("value,expected", [
+    (f"00-{TRACE_ID}-{SPAN_ID}-01", (TRACE_ID, SPAN_ID, True)),
+    (f"00-{TRACE_ID.upper()}-{SPAN_ID}-00", (TRACE_ID, SPAN_ID, False)),
+    (f"01-{TRACE_ID}-{SPAN_ID}-01-future", (TRACE_ID, SPAN_ID, True)),  # newer versions may append fields
+    (f"00-{TRACE_ID}-{SPAN_ID}-01-extra", None),
+    (f"ff-{TRACE_ID}-{SPAN_ID}-01", None),
+    (f"00-{'0' * 32}-{SPAN_ID}-01", None),
+    (f"00-{TRACE_ID}-{'0' * 16}-01", None),
+    (f"00-{TRACE_ID[:-1]}x-{SPAN_ID}-01", None),
+    ("garbage", None),
+    (None, None),
+])
+def test_parse_traceparent(value, expected):
+    assert parse_traceparent(value) == expected
+
+def test_format_round_trips():
+    assert parse_traceparent(format_traceparent(TRACE_ID, SPAN_ID, True)) == (TRACE_ID, SPAN_ID, True)
+
+def test_sampling_is_decided_by_trace_id():
+    # Same decision in every service for the same trace, and roughly the configured share
+    a, b = Tracer("a", exporter=ListExporter(), sample_ratio=0.25), Tracer("b", exporter=ListExporter(), sample_ratio=0.25)
+    ids = [f"{i:032x}" for i in range(0, 2 ** 64, 2 ** 64 // 1000)]
+    ids = [TRACE_ID[:16] + i[16:] for i in ids]
+    decisions = [a.should_sample(t) for t in ids]
+    assert decisions == [b.should_sample(t) for t in ids]
+    assert 200 <= sum(decisions) <= 300
+
+def test_remote_sampled_flag_is_honoured():
+    tracer = Tracer("t", exporter=ListExporter(), sample_ratio=0.0)
+    assert tracer.start_span("s", remote=(TRACE_ID, SPAN_ID, True)).sampled is True
+    tracer = Tracer("t", exporter=ListExporter(), sample_ratio=1.0)
+    assert tracer.start_span("s", remote=(TRACE_ID, SPAN_ID, False)).sampled is False
+
+def _server_spans(path):
+    lines = path.read_text().splitlines() if path.exists() else []
+    return [r for r in map(json.loads, lines) if r["kind"] == "server"]
+
+@pytest.mark.parametrize("trust,recorded", [(None, 0), ("false", 0), ("true", 1)])
+def test_client_sampled_flag_does_not_override_sample_ratio(monkeypatch, tmp_path, trust, recorded):
+    # browsers call file-service directly, so "-01" must not force recording unless trusted
+    from app import create_app
+    monkeypatch.setenv("TRACING_EXPORTER", "file")
+    monkeypatch.setenv("TRACING_FILE_PATH", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setenv("TRACING_SAMPLE_RATIO", "0")
+    if trust is not None:
+        monkeypatch.setenv("TRACING_TRUST_UPSTREAM", trust)
+    try:
+        app = create_app("sqlite:///:memory:")
+        app.test_client().get("/dashboard", headers={"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-01"})
+        assert tracing.flush(2)
+    finally:
+        tracing.configure("test", exporter=None, sample_ratio=0.0)
+    assert len(_server_spans(tmp_path / "traces.jsonl")) == recorded
+
+def test_untrusted_upstream_keeps_the_trace_id(monkeypatch, tmp_path):
+    monkeypatch.setenv("TRACING_EXPORTER", "file")
+    monkeypatch.setenv("TRACING_FILE_PATH", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setenv("TRACING_SAMPLE_RATIO", "1")
+    app = Flask(__name__)
+    app.add_url_rule("/", "index", lambda: "ok")
+    tracing.init_tracing(app, "edge-test", trust_upstream=False)
+    try:
+        app.test_client().get("/", headers={"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-00"})
+        assert tracing.flush(2)
+    finally:
+        tracing.configure("test", exporter=None, sample_ratio=0.0)
+    (span,) = _server_spans(tmp_path / "traces.jsonl")
+    assert (span["trace_id"], span["parent_id"]) == (TRACE_ID, SPAN_ID)
+
+@pytest.mark.parametrize("module", ["tracing.py", "workers.py"])
+def test_shared_module_is_identical_in_every_service(module):
+    # each service is its own Docker build context, so shared modules are copied, not shared
+    root = Path(__file__).resolve().parents[3]
+    copies = [root / service / module for service in ("auth-service", "file-service", "ui-gateway")]
+    if not all(p.exists() for p in copies):
+        pytest.skip("not a full checkout")
+    assert len({p.read_bytes() for p in copies}) == 1, f"edit {module} in one service and copy it to the others"
+
+def test_child_spans_share_the_trace(exporter):
+    with start_span("root", new_trace=True) as root:
+        with start_span("child", kind="client", bytes=3) as child:
+            pass
+    assert tracing.flush(2)
+
+    by_name = {s.name: s for s in exporter.spans}
+    assert by_name["child"].trace_id == root.trace_id
+    assert by_name["child"].parent_id == root.span_id
+    assert by_name["child"].attributes == {"bytes": 3}
+    assert child.end_ns >= child.start_ns
+
+def test_spans_are_noops_outside_a_trace(exporter):
+    with start_span("orphan") as span:
+        assert span is tracing.NOOP_SPAN
+    assert tracing.flush(2)
+    assert exporter.spans == []
+
+def test_errors_mark_the_span(exporter):
+    with pytest.raises(ValueError):
+        with start_span("boom", new_trace=True):
+            raise ValueError("x")
+    assert tracing.flush(2)
+    assert exporter.spans[0].status == "error"
+    assert exporter.spans[0].attributes["error.type"] == "ValueError"
+
+def test_disabled_tracer_records_nothing():
+    tracing.configure("test", exporter=None, sample_ratio=1.0)
+    with start_span("root", new_trace=True) as span:
+        assert span is tracing.NOOP_SPAN
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.configure("file-test", exporter=tracing.FileExporter("file-test", str(path)), sample_ratio=1.0)
+    try:
+        with start_span("root", new_trace=True):
+            pass
+        assert tracing.flush(2)
+    finally:
+        tracing.configure("test", exporter=None, sample_ratio=0.0)
+
+    (record,) = [json.loads(line) for line in path.read_text().splitlines()]
+    assert record["name"] == "root"
+    assert record["service"] == "file-test"
+
+def test_otlp_payload_shape():
+    tracer = Tracer("svc", exporter=ListExporter(), sample_ratio=1.0)
+    span = tracer.start_span("GET /x", kind="server", remote=(TRACE_ID, SPAN_ID, True), attributes={"http.status_code": 200})
+    span.end_ns = span.start_ns + 1000
+
+    body = otlp_payload([span], "svc")
+    resource = body["resourceSpans"][0]
+    (otlp_span,) = resource["scopeSpans"][0]["spans"]
+    assert resource["resource"]["attributes"][0]["value"] == {"stringValue": "svc"}
+    assert otlp_span["traceId"] == TRACE_ID
+    assert otlp_span["parentSpanId"] == SPAN_ID
+    assert otlp_span["kind"] == 2
+    assert otlp_span["attributes"] == [{"key": "http.status_code", "value": {"intValue": "200"}}]
+
+def test_custom_exporter_from_dotted_path():
+    exp = tracing.create_exporter("tracing:StdoutExporter", "svc")
+    assert isinstance(exp, tracing.StdoutExporter)
+    assert tracing.create_exporter("none", "svc") is None
+    with pytest.raises(RuntimeError):
+        tracing.create_exporter("carrier-pigeon", "svc")
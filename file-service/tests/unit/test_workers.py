@@ -0,0 +1,119 @@
+import os
+import threading
+
+import workers
+from app import create_app
+from workers import PeriodicWorker, ProcessThread, run_in_each_worker
+
+def _counting_worker(**kwargs):
+    calls = []
+    ran = threading.Event()
+
+    def fn():
+        calls.append(1)
+        ran.set()
+
+    return PeriodicWorker("test", 0.01, fn, **kwargs), calls, ran
+
+def test_periodic_worker_calls_fn_until_stopped():
+    worker, calls, ran = _counting_worker()
+    worker.ensure_running()
+    assert ran.wait(5)
+
+    worker.stop()
+    assert not worker.is_running()
+    seen = len(calls)
+    worker.ensure_running()  # a stopped worker stays stopped
+    assert not worker.is_running()
+    assert len(calls) == seen
+
+def test_delay_first_false_runs_before_the_first_interval():
+    calls = []
+    worker = PeriodicWorker("test", 60, lambda: calls.append(1), delay_first=False)
+    worker.ensure_running()
+    try:
+        for _ in range(500):
+            if calls:
+                break
+            threading.Event().wait(0.01)
+        assert calls == [1]
+    finally:
+        worker.stop()
+
+def test_errors_are_printed_and_the_loop_goes_on(capsys):
+    results = iter([RuntimeError("boom")])
+    ran = threading.Event()
+
+    def fn():
+        error = next(results, None)
+        if error:
+            raise error
+        ran.set()
+
+    worker = PeriodicWorker("flaky", 0.01, fn)
+    worker.ensure_running()
+    try:
+        assert ran.wait(5)
+    finally:
+        worker.stop()
+    assert "Background task flaky failed: boom" in capsys.readouterr().out
+
+def test_thread_is_started_again_in_a_forked_process(monkeypatch):
+    release = threading.Event()
+    thread = ProcessThread("test", lambda: release.wait(5))
+    thread.ensure_running()
+    first = thread._thread
+
+    thread.ensure_running()
+    assert thread._thread is first
+
+    # after a fork the inherited Thread object belongs to the parent
+    child_pid = os.getpid() + 1
+    monkeypatch.setattr(workers.os, "getpid", lambda: child_pid)
+    assert not thread.is_running()
+    thread.ensure_running()
+    assert thread._thread is not first
+    release.set()
+
+def test_worker_runs_fn_in_an_app_context():
+    app = create_app("sqlite:///:memory:")
+    seen = []
+    ran = threading.Event()
+
+    def fn():
+        from flask import current_app
+        seen.append(current_app.name)
+        ran.set()
+
+    worker = PeriodicWorker("test", 0.01, fn, app=app)
+    worker.ensure_running()
+    try:
+        assert ran.wait(5)
+    finally:
+        worker.stop()
+    assert seen[0] == app.name
+
+def test_run_in_each_worker_starts_on_first_request():
+    app = create_app("sqlite:///:memory:")
+    worker, _, ran = _counting_worker()
+    run_in_each_worker(app, worker)
+    assert app.extensions["workers"]["test"] is worker
+    assert not worker.is_running()
+
+    try:
+        app.test_client().get("/health")
+        assert worker.is_running()
+        assert ran.wait(5)
+    finally:
+        worker.stop()
+
+def test_background_jobs_are_registered_when_enabled(monkeypatch, tmp_path):
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setenv("PURGE_REAPER_INTERVAL_SECONDS", "5")
+    monkeypatch.setenv("IDEMPOTENCY_PRUNE_INTERVAL_SECONDS", "300")
+    monkeypatch.setenv("STORAGE_STATS_ENABLED", "true")
+    monkeypatch.setenv("PACK_STORAGE_ENABLED", "true")
+    app = create_app("sqlite:///:memory:")
+
+    assert set(app.extensions["workers"]) >= {"blob-reaper", "idempotency-pruner", "storage-stats", "pack-compactor"}
+    assert not any(w.is_running() for w in app.extensions["workers"].values())
@@ -0,0 +1,156 @@
+# thumbnails.py
+# Lazily generated PNG thumbnails, cached on disk as
+# THUMBNAIL_DIR/<file_id % 1000>/<file_id>-<size>.png.
+# Rendering runs in a small per-worker thread pool (Pillow releases the GIL
+# while decoding / resampling), and concurrent requests for the same
+# thumbnail wait on one render instead of starting their own.
+import glob
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, UnidentifiedImageError
+from metrics import inc, timed, THUMBNAIL_REQUESTS, THUMBNAIL_RENDER_SECONDS
+from packs import read_entry
+from storage_codec import decode_bytes, open_decoded
+from tracing import start_span
+
+THUMBNAIL_TYPES = {"image/png"}
+# Pillow only warns between MAX_IMAGE_PIXELS and twice that; a small PNG can
+# still decode to gigabytes, so renders check the header against their own cap
+DEFAULT_MAX_PIXELS = 50_000_000
+
+
+class ThumbnailError(Exception):
+    """The source can't be turned into a thumbnail (not an image, too large, corrupt)."""
+
+
+class SourceRef:
+    """What a render needs to know about a File row (no DB access from pool threads)."""
+
+    def __init__(self, f):
+        self.file_id = f.id
+        self.storage_path = f.storage_path
+        self.storage_codec = f.storage_codec
+        self.pack_id = f.pack_id
+        self.pack_offset = f.pack_offset
+        self.pack_length = f.pack_length
+
+    def open(self):
+        if self.pack_id is not None:
+            data = read_entry(self.storage_path, self.pack_offset, self.pack_length)
+            return io.BytesIO(decode_bytes(data, self.storage_codec))
+        return open_decoded(self.storage_path, self.storage_codec)
+
+
+def render_thumbnail(source, size: int, max_pixels: int = DEFAULT_MAX_PIXELS) -> bytes:
+    """PNG bytes of the image scaled to fit size x size (never enlarged)."""
+    with source.open() as fh:  # FileNotFoundError passes through: the blob is gone, not broken
+        try:
+            with Image.open(fh) as img:
+                # Image.open reads only the header: refuse before anything is decoded
+                if img.width * img.height > max_pixels:
+                    raise ThumbnailError(f"image is {img.width}x{img.height}, over {max_pixels} pixels")
+                img.thumbnail((size, size))
+                if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+                    img = img.convert("RGBA")
+                out = io.BytesIO()
+                img.save(out, format="PNG", optimize=True)
+                return out.getvalue()
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+            raise ThumbnailError(str(e)) from e
+
+
+class ThumbnailService:
+    def __init__(self, thumb_dir: str, sizes=(64, 128, 256), workers: int = 2, max_pixels: int = DEFAULT_MAX_PIXELS):
+        self.thumb_dir = thumb_dir
+        self.sizes = tuple(sorted(sizes))
+        self.workers = workers
+        self.max_pixels = max_pixels
+        self._lock = threading.Lock()
+        self._pending = {}  # (file_id, size) -> Future
+        self._executor = None
+        self._pid = None
+
+    def path(self, file_id: int, size: int) -> str:
+        return os.path.join(self.thumb_dir, f"{file_id % 1000:03d}", f"{file_id}-{size}.png")
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # executor threads don't survive fork, so each worker process makes its own
+        if self._executor is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = {}
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumbnail")
+        return self._executor
+
+    def _render_to_disk(self, source: SourceRef, size: int) -> str:
+        path = self.path(source.file_id, size)
+        if os.path.exists(path):
+            return path  # finished just before this job was queued
+        with timed(THUMBNAIL_RENDER_SECONDS), start_span("thumbnail.render", size=size):
+            data = render_thumbnail(source, size, self.max_pixels)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # temp + rename: other workers never see a half-written thumbnail
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def submit(self, source: SourceRef, size: int):
+        """(future for the thumbnail's path, joined) - joined if a render was already in progress."""
+        key = (source.file_id, size)
+        with self._lock:
+            pool = self._pool()
+            future = self._pending.get(key)
+            if future is not None:
+                return future, True
+            future = pool.submit(self._render_to_disk, source, size)
+            self._pending[key] = future
+
+        def _done(_):
+            with self._lock:
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+
+        future.add_done_callback(_done)
+        return future, False
+
+    def get_or_create(self, source: SourceRef, size: int, timeout: float = 30) -> str:
+        """Path of the cached thumbnail, rendering it first if needed (raises ThumbnailError)."""
+        path = self.path(source.file_id, size)
+        if os.path.exists(path):
+            inc(THUMBNAIL_REQUESTS, result="hit")
+            return path
+        future, joined = self.submit(source, size)
+        inc(THUMBNAIL_REQUESTS, result="coalesced" if joined else "rendered")
+        return future.result(timeout=timeout)
+
+    def generate_all(self, source: SourceRef) -> None:
+        """Eager mode: queue every configured size (errors are only logged)."""
+        for size in self.sizes:
+            self.submit(source, size)[0].add_done_callback(_log_failure)
+
+    def remove(self, file_id: int) -> None:
+        for path in glob.glob(os.path.join(self.thumb_dir, f"{file_id % 1000:03d}", f"{file_id}-*.png")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        print("Thumbnail generation failed:", error)
+
+
+def init_thumbnails(app) -> None:
+    app.extensions["thumbnails"] = ThumbnailService(
+        app.config["THUMBNAIL_DIR"],
+        sizes=app.config["THUMBNAIL_SIZES"],
+        workers=app.config["THUMBNAIL_WORKERS"],
+        max_pixels=app.config["THUMBNAIL_MAX_PIXELS"],
+    )
@@ -2,8 +2,34 @@ import os
 import uuid
 from models import File
 from db import db
+from replicas import mark_write
+from metrics import timed, observe, content_type_label, DISK_WRITE_SECONDS, FSYNC_SECONDS, UPLOAD_BYTES
+from tracing import start_span
+from storage_codec import write_encoded, encode_bytes
 
-def save_upload_for_user(user_id, file_storage, upload_dir, max_size, allowed_types=None):
+def _write_file(storage_path, data, codec, compression, fsync):
+    """Writes one upload to its own file; returns (codec actually used, bytes on disk)."""
+    size = len(data)
+    # Save to disk (fsync so the file survives a crash once we've returned 201)
+    with open(storage_path, "wb") as f:
+        with start_span("disk.write", bytes=size, codec=codec or "none"), timed(DISK_WRITE_SECONDS):
+            if codec:
+                write_encoded(f, data, codec, compression.level)
+                if f.tell() >= size:
+                    # didn't shrink (already compressed data): keep it raw
+                    codec = None
+                    f.seek(0)
+                    f.truncate()
+            if not codec:
+                f.write(data)
+            f.flush()
+        stored_size = f.tell()
+        if fsync:
+            with start_span("disk.fsync"), timed(FSYNC_SECONDS):
+                os.fsync(f.fileno())
+    return codec, stored_size
+
+def save_upload_for_user(user_id, file_storage, upload_dir, max_size, allowed_types=None, compression=None, packs=None, volume=None):
     # basic validation
     if not file_storage or not file_storage.filename:
         raise ValueError("No file provided")
@@ -27,25 +53,40 @@ def save_upload_for_user(user_id, file_storage, upload_dir, max_size, allowed_ty
     # keep original filename only for metadata
     original_name = os.path.basename(file_storage.filename)
 
-    # disk filename is server-generated ONLY (CodeQL-friendly)
-    stored_name = uuid.uuid4().hex
+    # compression: optional CompressionPolicy (storage_codec.py)
+    codec = compression.codec if compression and compression.applies_to(file_storage.content_type, size) else None
+    fsync = os.getenv("UPLOAD_FSYNC", "true").lower() == "true"
 
-    storage_path = os.path.join(upload_dir, stored_name)
-
-    # Save to disk
-    with open(storage_path, "wb") as f:
-        f.write(data)
-
-    # Create DB record
     file = File(
         owner_user_id=user_id,
         filename=original_name,
-        storage_path=storage_path,
         content_type=file_storage.content_type,
         size_bytes=size,
     )
-        
+
+    if packs is not None and packs.accepts(size):
+        # small file: append to the worker's pack (packs.py) instead of a file of its own
+        stored = encode_bytes(data, codec, compression.level) if codec else data
+        if codec and len(stored) >= size:
+            codec, stored = None, data
+        with start_span("pack.append", bytes=len(stored), codec=codec or "none"), timed(DISK_WRITE_SECONDS):
+            pack_id, offset, pack_file = packs.append(stored, fsync=fsync)
+        file.storage_path = pack_file
+        file.pack_id, file.pack_offset, file.pack_length = pack_id, offset, len(stored)
+        stored_size = len(stored)
+    else:
+        # disk filename is server-generated ONLY (CodeQL-friendly)
+        file.storage_path = os.path.join(upload_dir, uuid.uuid4().hex)
+        file.volume = volume
+        codec, stored_size = _write_file(file.storage_path, data, codec, compression, fsync)
+
+    file.storage_codec = codec
+    file.stored_size_bytes = stored_size
+
     db.session.add(file)
     db.session.commit()
+    # user's next reads go to the primary so they see this upload
+    mark_write(user_id)
+    observe(UPLOAD_BYTES, size, content_type=content_type_label(file.content_type))
 
     return file
\ No newline at end of file
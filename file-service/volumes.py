@@ -0,0 +1,362 @@
+# volumes.py
+# Several upload directories (usually one per disk) with a placement policy.
+# STORAGE_VOLUMES="v1=/mnt/disk1,v2=/mnt/disk2" (unset = just UPLOAD_DIR, as before).
+#
+# Maintenance state is a marker file in the volume root, so it can be changed
+# online and is seen by every worker (and host) sharing the volume:
+# - .readonly: no new files, nothing is deleted from it
+# - .draining: no new files; `flask volumes rebalance` moves everything off it
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, update
+from db import db
+from models import File
+from metrics import UPLOAD_VOLUME
+
+POLICIES = ("free_space", "round_robin", "owner_hash")
+STATE_CACHE_SECONDS = 5.0
+
+
+class NoWritableVolume(RuntimeError):
+    pass
+
+
+def parse_volumes(spec: str):
+    """'name=path,name=path' -> [(name, path)]"""
+    volumes = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, path = item.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"STORAGE_VOLUMES entries must be name=path, got {item!r}")
+        volumes.append((name.strip(), path.strip()))
+    if len({name for name, _ in volumes}) != len(volumes):
+        raise ValueError("STORAGE_VOLUMES names must be unique")
+    return volumes
+
+
+class Volume:
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self._state = None
+        self._state_read_at = 0.0
+
+    @property
+    def state(self) -> str:
+        now = time.monotonic()
+        if self._state is None or now - self._state_read_at > STATE_CACHE_SECONDS:
+            if os.path.exists(os.path.join(self.path, ".readonly")):
+                self._state = "readonly"
+            elif os.path.exists(os.path.join(self.path, ".draining")):
+                self._state = "draining"
+            else:
+                self._state = "active"
+            self._state_read_at = now
+        return self._state
+
+    @property
+    def writable(self) -> bool:
+        return self.state == "active"
+
+    def usage(self):
+        """(total, free) bytes of the filesystem holding this volume."""
+        st = os.statvfs(self.path)
+        return st.f_blocks * st.f_frsize, st.f_bavail * st.f_frsize
+
+    def contains(self, storage_path: str) -> bool:
+        root = os.path.abspath(self.path)
+        return os.path.commonpath([root, os.path.abspath(storage_path)]) == root
+
+
+class VolumeSet:
+    """The configured volumes plus the placement policy for new files."""
+    def __init__(self, volumes, policy: str = "free_space", min_free_bytes: int = 0):
+        if policy not in POLICIES:
+            raise ValueError(f"STORAGE_PLACEMENT must be one of {POLICIES}")
+        self.volumes = [Volume(name, path) for name, path in volumes]
+        self.by_name = {v.name: v for v in self.volumes}
+        self.policy = policy
+        self.min_free_bytes = min_free_bytes
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        for v in self.volumes:
+            os.makedirs(v.path, exist_ok=True)
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+    def volume_for_path(self, storage_path: str):
+        return next((v for v in self.volumes if v.contains(storage_path)), None)
+
+    def writable(self):
+        candidates = []
+        for v in self.volumes:
+            if not v.writable:
+                continue
+            try:
+                free = v.usage()[1]
+            except OSError:
+                continue  # unmounted / missing disk
+            if free > self.min_free_bytes:
+                candidates.append((v, free))
+        return candidates
+
+    def place(self, owner_user_id: int) -> Volume:
+        """Volume for a new file of this owner."""
+        candidates = self.writable()
+        if not candidates:
+            raise NoWritableVolume("no storage volume is accepting writes")
+
+        if self.policy == "round_robin":
+            with self._lock:
+                index = next(self._counter)
+            return candidates[index % len(candidates)][0]
+        if self.policy == "owner_hash":
+            # rendezvous hashing: adding a volume only moves ~1/n owners onto it
+            return max(candidates, key=lambda c: _hrw_score(owner_user_id, c[0].name))[0]
+        # free_space: random, weighted by free bytes (fills disks evenly in proportion)
+        return random.choices([v for v, _ in candidates], weights=[free for _, free in candidates])[0]
+
+
+def _hrw_score(owner_user_id: int, volume_name: str) -> int:
+    digest = hashlib.blake2b(f"{owner_user_id}:{volume_name}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def volumes_from_config(config):
+    """VolumeSet from app config, or None when STORAGE_VOLUMES is not set (single UPLOAD_DIR)."""
+    volumes = parse_volumes(config.get("STORAGE_VOLUMES"))
+    if not volumes:
+        return None
+    return VolumeSet(volumes, config["STORAGE_PLACEMENT"], config["STORAGE_VOLUME_MIN_FREE_BYTES"])
+
+
+# ===== Rebalancing =====
+
+def copy_blob(src: str, dst_dir: str) -> str:
+    """Copies src into dst_dir under the same name (via a temp file + rename); returns the new path."""
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    tmp = os.path.join(dst_dir, f".tmp-{uuid.uuid4().hex}")
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return dst
+
+
+def move_file(file_id: int, src_path: str, target: Volume) -> bool:
+    """
+    Moves one blob to target while the service keeps running (needs an app context):
+    copy, then repoint the row only if it still points at src_path, then
+    remove the source. Returns False if the file was deleted or moved meanwhile.
+    """
+    dst_path = copy_blob(src_path, target.path)
+    result = db.session.execute(
+        update(File)
+        .where(File.id == file_id, File.storage_path == src_path)
+        .values(volume=target.name, storage_path=dst_path)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        os.remove(dst_path)
+        return False
+    # readers that looked the row up just before the update re-read it (see routes.download_file)
+    os.remove(src_path)
+    return True
+
+
+def backfill(volume_set: VolumeSet) -> int:
+    """Sets File.volume for rows written before volumes were configured. Returns rows updated."""
+    updated = 0
+    rows = File.query.filter(File.volume.is_(None), File.pack_id.is_(None)).yield_per(1000)
+    for f in rows:
+        volume = volume_set.volume_for_path(f.storage_path)
+        if volume is not None:
+            f.volume = volume.name
+            updated += 1
+    db.session.commit()
+    return updated
+
+
+def _volume_bytes():
+    rows = (
+        db.session.query(File.volume, func.coalesce(func.sum(func.coalesce(File.stored_size_bytes, File.size_bytes)), 0))
+        .filter(File.volume.isnot(None), File.pack_id.is_(None))
+        .group_by(File.volume)
+        .all()
+    )
+    return {name: int(total) for name, total in rows}
+
+
+def plan_moves(volume_set: VolumeSet, balance: bool = True, tolerance: float = 0.05, max_bytes: int = None):
+    """
+    [(file_id, storage_path, size, source, target)] to run next (needs an app context):
+    - every file on a draining volume
+    - with balance=True, files from the fullest active volume to the emptiest
+      until their used fractions are within tolerance
+    Stops once max_bytes of moves are planned.
+    """
+    targets = [v for v, _ in volume_set.writable()]
+    if not targets:
+        return []
+
+    used = {}
+    capacity = {}
+    for v in volume_set.volumes:
+        try:
+            total, free = v.usage()
+        except OSError:
+            continue
+        capacity[v.name] = total
+        used[v.name] = total - free
+
+    def fraction(v):
+        return used[v.name] / capacity[v.name] if capacity.get(v.name) else 0.0
+
+    moves, planned = [], 0
+
+    def add(f, source, target):
+        nonlocal planned
+        size = f.stored_size_bytes or f.size_bytes
+        moves.append((f.id, f.storage_path, size, source.name, target.name))
+        planned += size
+        used[source.name] = used.get(source.name, 0) - size
+        used[target.name] = used.get(target.name, 0) + size
+
+    def budget_left():
+        return max_bytes is None or planned < max_bytes
+
+    for source in volume_set.volumes:
+        if source.state != "draining":
+            continue
+        for f in File.query.filter_by(volume=source.name, pack_id=None).order_by(File.id).yield_per(1000):
+            if not budget_left():
+                return moves
+            add(f, source, min(targets, key=fraction))
+
+    if balance and len(targets) > 1:
+        # largest files that fit first: fewest moves per byte balanced
+        candidates = {}
+        planned_ids = {m[0] for m in moves}
+        while budget_left():
+            fullest = max(targets, key=fraction)
+            emptiest = min(targets, key=fraction)
+            if fraction(fullest) - fraction(emptiest) <= tolerance:
+                break
+            # bytes that leave both at the same fraction; a bigger file would
+            # overshoot and the next round would move something back
+            cap_full, cap_empty = capacity[fullest.name], capacity[emptiest.name]
+            gap = (used[fullest.name] * cap_empty - used[emptiest.name] * cap_full) / (cap_full + cap_empty)
+            if fullest.name not in candidates:
+                candidates[fullest.name] = iter(
+                    File.query.filter(File.volume == fullest.name, File.pack_id.is_(None))
+                    .order_by(File.size_bytes.desc())
+                    .yield_per(1000)
+                )
+            f = next(candidates[fullest.name], None)
+            while f is not None and (f.id in planned_ids or (f.stored_size_bytes or f.size_bytes) > gap):
+                f = next(candidates[fullest.name], None)
+            if f is None:
+                break
+            planned_ids.add(f.id)
+            add(f, fullest, emptiest)
+    return moves
+
+
+def rebalance(volume_set: VolumeSet, balance: bool = True, tolerance: float = 0.05,
+              max_bytes: int = None, dry_run: bool = False) -> dict:
+    stats = {"planned": 0, "moved": 0, "moved_bytes": 0, "skipped": 0, "failed": 0}
+    moves = plan_moves(volume_set, balance, tolerance, max_bytes)
+    stats["planned"] = len(moves)
+    if dry_run:
+        stats["moves"] = [
+            {"file_id": file_id, "bytes": size, "from": source, "to": target}
+            for file_id, _, size, source, target in moves
+        ]
+        return stats
+
+    for file_id, src_path, size, source, target in moves:
+        if volume_set.get(source).state == "readonly":
+            stats["skipped"] += 1
+            continue
+        try:
+            if move_file(file_id, src_path, volume_set.get(target)):
+                stats["moved"] += 1
+                stats["moved_bytes"] += size
+            else:
+                stats["skipped"] += 1
+        except OSError as e:
+            print(f"Moving file {file_id} failed:", e)
+            stats["failed"] += 1
+    return stats
+
+
+def register_cli(app) -> None:
+    """`flask volumes status|backfill|rebalance`"""
+    group = AppGroup("volumes", help="Storage volume maintenance.")
+
+    def _volume_set():
+        volume_set = app.extensions.get("volumes")
+        if volume_set is None:
+            raise click.ClickException("STORAGE_VOLUMES is not set")
+        return volume_set
+
+    @group.command("status")
+    def status():
+        volume_set = _volume_set()
+        stored = _volume_bytes()
+        out = []
+        for v in volume_set.volumes:
+            try:
+                total, free = v.usage()
+            except OSError:
+                total = free = None
+            out.append({
+                "name": v.name, "path": v.path, "state": v.state,
+                "total_bytes": total, "free_bytes": free, "file_bytes": stored.get(v.name, 0),
+            })
+        click.echo(json.dumps({"policy": volume_set.policy, "volumes": out}, indent=2))
+
+    @group.command("backfill")
+    def backfill_cmd():
+        """Assign files stored before volumes were configured."""
+        click.echo(json.dumps({"updated": backfill(_volume_set())}))
+
+    @group.command("rebalance")
+    @click.option("--no-balance", is_flag=True, help="Only drain volumes marked .draining")
+    @click.option("--tolerance", default=0.05, show_default=True, help="Allowed difference in used fraction")
+    @click.option("--max-bytes", type=int, default=None, help="Stop after moving this many bytes")
+    @click.option("--dry-run", is_flag=True)
+    def rebalance_cmd(no_balance, tolerance, max_bytes, dry_run):
+        """Move files off draining volumes and even out the active ones (safe while serving)."""
+        stats = rebalance(_volume_set(), not no_balance, tolerance, max_bytes, dry_run)
+        click.echo(json.dumps(stats, indent=2))
+
+    app.cli.add_command(group)
+
+
+def init_volumes(app) -> None:
+    """Registers the VolumeSet (app.extensions["volumes"]) and the `flask volumes` commands."""
+    volume_set = volumes_from_config(app.config)
+    if volume_set is not None:
+        app.extensions["volumes"] = volume_set
+        UPLOAD_VOLUME.volumes = [(v.name, v.path) for v in volume_set.volumes]
+    register_cli(app)
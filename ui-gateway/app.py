@@ -1,7 +1,18 @@
+import os
 from flask import Flask, render_template, redirect
+from tracing import init_tracing, current_traceparent
 
 app = Flask(__name__)
 
+# Each page gets a span; its traceparent is put in a <meta> tag so the page's
+# calls to auth-service / file-service continue the same trace. This is the
+# public edge, so a client-sent sampled flag is never trusted
+init_tracing(app, os.getenv("SERVICE_NAME", "ui-gateway"), trust_upstream=False)
+
+@app.context_processor
+def inject_traceparent():
+    return {"traceparent": current_traceparent()}
+
 @app.route("/")
 def home():
     return redirect("/api/login")
@@ -15,8 +15,12 @@ function buildAuthHeaders(extraHeaders = {}){
         throw new Error("Unauthorised: no access token found.");
     }
 
+    // Continue the page's trace (meta tag is only rendered when ui-gateway tracing is on)
+    const traceparent = document.querySelector('meta[name="traceparent"]')?.content;
+
     return{
         "Authorization" : `Bearer ${token}`,
+        ...(traceparent ? { traceparent } : {}),
         ...extraHeaders,
     };
 }
@@ -1,5 +1,11 @@
 const token = localStorage.getItem("access_token");
 
+// Continue the page's trace (meta tag is only rendered when ui-gateway tracing is on)
+function traceHeaders() {
+  const traceparent = document.querySelector('meta[name="traceparent"]')?.content;
+  return traceparent ? { traceparent } : {};
+}
+
 if (!token) {
   alert("Unauthorized");
   window.location.href = "/api/login";
@@ -8,7 +14,8 @@ if (!token) {
 function loadUsers() {
   fetch("http://localhost:5000/api/admin/users", {
     headers: {
-      Authorization: `Bearer ${token}`
+      Authorization: `Bearer ${token}`,
+      ...traceHeaders()
     }
   })
     .then(res => {
@@ -73,7 +80,8 @@ function addUser() {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
-      Authorization: `Bearer ${token}`
+      Authorization: `Bearer ${token}`,
+      ...traceHeaders()
     },
     body: JSON.stringify({
       username,
@@ -101,7 +109,8 @@ function deleteUser(id) {
   fetch(`http://localhost:5000/api/admin/users/${id}`, {
     method: "DELETE",
     headers: {
-      Authorization: `Bearer ${token}`
+      Authorization: `Bearer ${token}`,
+      ...traceHeaders()
     }
   })
     .then(res => {
@@ -1,3 +1,9 @@
+// Continue the page's trace (meta tag is only rendered when ui-gateway tracing is on)
+function traceHeaders() {
+  const traceparent = document.querySelector('meta[name="traceparent"]')?.content;
+  return traceparent ? { traceparent } : {};
+}
+
 document.addEventListener("DOMContentLoaded", () => {
   const form = document.getElementById("loginForm");
   const errorText = document.getElementById("error");
@@ -24,7 +30,8 @@ document.addEventListener("DOMContentLoaded", () => {
       const response = await fetch("http://127.0.0.1:5000/api/login", {
         method: "POST",
         headers: {
-          "Content-Type": "application/json"
+          "Content-Type": "application/json",
+          ...traceHeaders()
         },
         body: JSON.stringify({
           username,